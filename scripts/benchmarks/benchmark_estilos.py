@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# --------------------------------------------------------------------------------
+#
+#   Benchmark de los estilos de la hoja del informe. Escribe tablas como las
+#   de los extras TABLA/PERCENTILES/CICLO (titulos y una fila por serie con el
+#   color de la serie) con el metodo anterior (Font/PatternFill/Border/
+#   Alignment asignados celda a celda) y con los NamedStyle de estilos.py, y
+#   compara el tiempo de creacion y guardado y el tamano del xlsx y de su
+#   styles.xml. Las celdas no se combinan: merge_cells cuesta lo mismo con
+#   los dos metodos y en openpyxl crece con el numero de rangos, asi que
+#   taparia la diferencia de los estilos.
+#
+#   Uso: python3 benchmark_estilos.py [num_tablas] [series_por_tabla]
+#
+#   Autor: Marc Llobera Villalonga
+#
+# --------------------------------------------------------------------------------
+
+import os
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), "..", "sample"))
+from openpyxl import Workbook  # noqa: E402
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side  # noqa: E402
+import estilos  # noqa: E402
+
+COLUMNAS = [("J", "O"), ("P", "U"), ("V", "AA"), ("AB", "AG")]
+
+# Estilos del metodo anterior (globales de informe.py)
+border_style = Side(style='thin')
+border = Border(left=border_style, right=border_style,
+                top=border_style, bottom=border_style)
+font_style = Font(size=8)
+alignment_style = Alignment(horizontal='center', vertical='center')
+
+
+def apply_style_to_range(sheet, cell_range):
+    # Copia de la funcion original
+    for row in sheet[cell_range]:
+        for cell in row:
+            cell.font = font_style
+            cell.alignment = alignment_style
+            cell.border = border
+        # endfor
+    # endfor
+# endfunction
+
+
+def tablaAnterior(ws, pos, num_series):
+    # Copia del bloque TABLA original (sin combinar celdas)
+    for inicio, _ in COLUMNAS:
+        ws[f"{inicio}{pos}"] = "Titulo"
+    # endfor
+    apply_style_to_range(ws, f"J{pos}:AG{pos}")
+    pos += 1
+    colores = estilos.COLORES_TABLA
+    for x in range(num_series):
+        fill = PatternFill(start_color=colores[x % len(colores)],
+                           end_color=colores[x % len(colores)], fill_type='solid')
+        ws[f"A{pos}"] = f"serie_{x}"
+        ws[f"A{pos}"].border = border
+        ws[f"A{pos}"].fill = fill
+        for inicio, _ in COLUMNAS:
+            ws[f"{inicio}{pos}"] = "12.34"
+            ws[f"{inicio}{pos}"].border = border
+            ws[f"{inicio}{pos}"].fill = fill
+        # endfor
+        apply_style_to_range(ws, f"A{pos}:AG{pos}")
+        pos += 1
+    # endfor
+    return pos
+# endfunction
+
+
+def tablaRegistro(ws, pos, num_series):
+    # Mismo bloque con los estilos registrados (como crearTablaExtra)
+    for inicio, _ in COLUMNAS:
+        ws[f"{inicio}{pos}"] = "Titulo"
+    # endfor
+    estilos.aplicarEstiloRango(ws, f"J{pos}:AG{pos}", estilos.ESTILO_TABLA)
+    pos += 1
+    colores = estilos.COLORES_TABLA
+    for x in range(num_series):
+        ws[f"A{pos}"] = f"serie_{x}"
+        for inicio, _ in COLUMNAS:
+            ws[f"{inicio}{pos}"] = "12.34"
+        # endfor
+        estilos.aplicarEstiloRango(
+            ws, f"A{pos}:AG{pos}", estilos.estiloTabla(colores[x % len(colores)]))
+        pos += 1
+    # endfor
+    return pos
+# endfunction
+
+
+def medir(nombre, tabla, registrar, num_tablas, num_series, directorio):
+    ruta = os.path.join(directorio, nombre + ".xlsx")
+    inicio = time.perf_counter()
+    wb = Workbook()
+    if registrar:
+        estilos.registrarEstilos(wb)
+    # endif
+    ws = wb.active
+    pos = 1
+    for _ in range(num_tablas):
+        pos = tabla(ws, pos, num_series) + 1
+    # endfor
+    creacion = time.perf_counter() - inicio
+    wb.save(ruta)
+    total = time.perf_counter() - inicio
+    with zipfile.ZipFile(ruta) as archivo:
+        styles = len(archivo.read("xl/styles.xml"))
+    # endwith
+    print(f"{nombre:<10} creacion {creacion:7.3f} s  total {total:7.3f} s  "
+          f"xlsx {os.path.getsize(ruta) / 1024:8.1f} KB  styles.xml {styles / 1024:6.1f} KB")
+# endfunction
+
+
+def main():
+    num_tablas = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    num_series = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+    print(f"Tablas: {num_tablas}, series por tabla: {num_series}")
+    with tempfile.TemporaryDirectory() as directorio:
+        medir("Anterior", tablaAnterior, False,
+              num_tablas, num_series, directorio)
+        medir("Registro", tablaRegistro, True,
+              num_tablas, num_series, directorio)
+    # endwith
+# endfunction
+
+
+if __name__ == "__main__":
+    main()
+# endif
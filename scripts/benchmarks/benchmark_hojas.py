@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# --------------------------------------------------------------------------------
+#
+#   Benchmark de memoria de las hojas de datos. Crea un libro con una hoja
+#   "Informe" y una hoja de datos por panel (un mes de datos por minuto) con
+#   hojas normales de openpyxl o con las hojas en streaming de
+#   libro_streaming.py, y mide el pico de memoria (RSS) de cada modo en un
+#   proceso aparte.
+#
+#   Uso: python3 benchmark_hojas.py [num_paneles] [num_filas]
+#
+#   Autor: Marc Llobera Villalonga
+#
+# --------------------------------------------------------------------------------
+
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), "..", "sample"))
+
+
+def crearLibro(streaming, num_paneles, num_filas, ruta):
+    from openpyxl import Workbook
+    from libro_streaming import crearHojaStreaming, guardarLibro
+
+    wb = Workbook()
+    wb.active.title = "Informe"
+    for panel in range(num_paneles):
+        if streaming:
+            hoja = crearHojaStreaming(wb, f"Raw Data {panel}")
+        else:
+            hoja = wb.create_sheet(f"Raw Data {panel}")
+        # endif
+        hoja.append(["Time", "a", "b", "c"])
+        for i in range(num_filas):
+            hoja.append([f"{i // 1440 + 1:02d}-10-2026 {i // 60 % 24:02d}:{i % 60:02d}",
+                         float(i % 97), float(i % 13), float(i % 2)])
+        # endfor
+    # endfor
+    guardarLibro(wb, ruta)
+# endfunction
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--modo":
+        # Proceso hijo: crea el libro y devuelve el pico de RSS en KB
+        inicio = time.perf_counter()
+        crearLibro(sys.argv[2] == "streaming", int(
+            sys.argv[3]), int(sys.argv[4]), sys.argv[5])
+        print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+              time.perf_counter() - inicio)
+        return
+    # endif
+    num_paneles = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    num_filas = int(sys.argv[2]) if len(sys.argv) > 2 else 31*24*60
+    print(f"Paneles: {num_paneles}, filas por panel: {num_filas}")
+    with tempfile.TemporaryDirectory() as directorio:
+        for modo in ("normal", "streaming"):
+            salida = subprocess.run([sys.executable, __file__, "--modo", modo, str(num_paneles),
+                                     str(num_filas), os.path.join(directorio, modo + ".xlsx")],
+                                    capture_output=True, text=True, check=True).stdout.split()
+            print(f"{modo:<10} pico RSS {int(salida[0]) / 1024:8.1f} MB {float(salida[1]):8.1f} s")
+        # endfor
+    # endwith
+# endfunction
+
+
+if __name__ == "__main__":
+    main()
+# endif
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# --------------------------------------------------------------------------------
+#
+#   Benchmark de la agrupacion por minutos de excelDeDatos. Compara el metodo
+#   anterior (utcfromtimestamp + strftime + strptime + strftime por punto) con
+#   la agrupacion en bloque de minutos.py sobre un frame de 1M de puntos.
+#
+#   Uso: python3 benchmark_minutos.py [num_puntos]
+#
+#   Autor: Marc Llobera Villalonga
+#
+# --------------------------------------------------------------------------------
+
+import os
+import sys
+import time
+from array import array
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), "..", "sample"))
+import minutos  # noqa: E402
+
+
+def metodoAnterior(tiempos, valores):
+    # Copia del bucle original de excelDeDatos
+    all_data = {}
+    for time_ms, value in zip(tiempos, valores):
+        if value is not None:
+            converted_time = datetime.utcfromtimestamp(
+                int(time_ms) / 1000).strftime("%Y-%m-%d %H:%M:%S")
+            aux = datetime.strptime(converted_time, "%Y-%m-%d %H:%M:%S")
+            all_data[aux.strftime("%d-%m-%Y %H:%M")] = int(value)
+        # endif
+    # endfor
+    return all_data
+# endfunction
+
+
+def metodoNuevo(tiempos, valores):
+    lista_minutos, enteros = minutos.columnaPorMinuto(tiempos, valores)
+    return {minutos.etiquetaMinuto(minuto): valor for minuto, valor in zip(lista_minutos, enteros)}
+# endfunction
+
+
+def medir(nombre, funcion, *argumentos):
+    inicio = time.perf_counter()
+    resultado = funcion(*argumentos)
+    segundos = time.perf_counter() - inicio
+    print(f"{nombre:<28} {segundos:8.3f} s")
+    return resultado, segundos
+# endfunction
+
+
+def main():
+    num_puntos = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    # Un punto cada 10 s, como aggregateWindow(every: 10s)
+    inicio_ms = 1727740800000
+    tiempos = array("q", range(inicio_ms, inicio_ms + num_puntos * 10000, 10000))
+    valores = array("d", ((i * 7919) % 97 + 0.5 for i in range(num_puntos)))
+    print(f"Puntos: {num_puntos} (numpy: {'si' if minutos.np is not None else 'no'})")
+
+    anterior, t_anterior = medir("Anterior", metodoAnterior, tiempos, valores)
+    nuevo, t_nuevo = medir("En bloque", metodoNuevo, tiempos, valores)
+    assert anterior == nuevo, "Los resultados no coinciden"
+    if minutos.np is not None:
+        np = minutos.np
+        minutos.np = None
+        puro, t_puro = medir("En bloque (Python puro)",
+                             metodoNuevo, tiempos, valores)
+        minutos.np = np
+        assert anterior == puro, "Los resultados no coinciden"
+    # endif
+    print(f"Mejora: x{t_anterior / t_nuevo:.1f}")
+# endfunction
+
+
+if __name__ == "__main__":
+    main()
+# endif
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# --------------------------------------------------------------------------------
+#
+#   Cache de informes generados por la API Flask. Cada informe se identifica
+#   por el id del dashboard, el rango de tiempo (alineado para que peticiones
+#   cercanas coincidan) y el hash del config.py del script, y se guarda en su
+#   propio directorio dentro de la cache. Los informes generados se anotan en
+#   el catalogo (catalogo_informes.py), que es donde se buscan y el que aplica
+#   la retencion; mientras un informe tenga menos de ttl segundos se devuelve
+#   sin volver a generarlo.
+#
+#   Autor: Marc Llobera Villalonga
+#
+# --------------------------------------------------------------------------------
+
+import hashlib
+import json
+import os
+import time
+from catalogo_informes import CatalogoInformes
+
+
+def hashArchivo(ruta):
+    # sha256 del contenido de un archivo ("" si no existe)
+    try:
+        with open(ruta, "rb") as archivo:
+            return hashlib.sha256(archivo.read()).hexdigest()
+        # endwith
+    except OSError:
+        return ""
+    # endtry
+# endfunction
+
+
+def claveInforme(dashboard_id, inicio, fin, hash_config):
+    # Clave de un informe: dashboard, rango de tiempo y configuracion
+    contenido = json.dumps([dashboard_id, inicio, fin, hash_config])
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+# endfunction
+
+
+class CacheInformes:
+    def __init__(self, directorio, ttl=300, max_por_dashboard=0, max_bytes=0, retencion_s=0):
+        # ttl: segundos durante los que un informe se considera reciente; el
+        # resto de parametros son las politicas de retencion del catalogo
+        self.directorio = directorio
+        self.ttl = ttl
+        self.catalogo = CatalogoInformes(
+            directorio, max_por_dashboard, max_bytes, retencion_s)
+        self.aciertos = 0
+        self.fallos = 0
+    # endfunction
+
+    def ruta(self, clave):
+        # Directorio donde se genera el informe de la clave
+        return os.path.join(self.directorio, clave)
+    # endfunction
+
+    def obtener(self, clave):
+        # Ruta del informe si se genero hace menos de ttl segundos, si no None
+        informe = self.catalogo.obtener(clave)
+        if informe is not None and informe["creado"] >= time.time() - self.ttl:
+            self.aciertos += 1
+            return informe["ruta"]
+        # endif
+        self.fallos += 1
+        return None
+    # endfunction
+
+    def registrar(self, clave, ruta, dashboard, ventana):
+        # Anota en el catalogo el informe recien generado de la clave
+        self.catalogo.registrar(clave, ruta, dashboard, ventana[0], ventana[1])
+    # endfunction
+
+    def resumen(self):
+        total = self.aciertos + self.fallos
+        return dict(self.catalogo.resumen(), aciertos=self.aciertos, fallos=self.fallos,
+                    tasa_aciertos=self.aciertos / total if total else 0.0)
+    # endfunction
+# endclass
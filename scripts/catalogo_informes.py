@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# --------------------------------------------------------------------------------
+#
+#   Catalogo de los informes generados por la API Flask. Un manifiesto JSON
+#   (catalogo.json) guarda de cada excel su ruta, el dashboard, el rango de
+#   tiempo, el tamano y cuando se genero, de forma que encontrar un informe
+#   es una consulta a un diccionario en vez de recorrer INFORMES_DIR.
+#
+#   Las politicas de retencion (informes por dashboard, tamano total y
+#   antiguedad maxima) se aplican en un hilo en segundo plano despues de
+#   cada informe nuevo y cada cierto tiempo: los informes mas antiguos salen
+#   del catalogo y se borran del disco (solo los que estan dentro del
+#   directorio del catalogo).
+#
+#   Autor: Marc Llobera Villalonga
+#
+# --------------------------------------------------------------------------------
+
+import json
+import os
+import threading
+import time
+
+# Segundos entre dos limpiezas aunque no haya informes nuevos
+INTERVALO_LIMPIEZA = 600
+
+
+class CatalogoInformes:
+    def __init__(self, directorio, max_por_dashboard=0, max_bytes=0, retencion_s=0):
+        # max_por_dashboard: informes que se conservan de cada dashboard;
+        # max_bytes: tamano total maximo; retencion_s: antiguedad maxima.
+        # Con 0 no se aplica el limite correspondiente
+        self.directorio = directorio
+        self.ruta = os.path.join(directorio, "catalogo.json")
+        self.max_por_dashboard = max_por_dashboard
+        self.max_bytes = max_bytes
+        self.retencion_s = retencion_s
+        self.expulsados = 0
+        self._lock = threading.Lock()
+        # clave -> {"ruta", "dashboard", "inicio", "fin", "bytes", "creado"}
+        self._informes = self._leer()
+        self._bytes = sum(informe["bytes"]
+                          for informe in self._informes.values())
+        self._evento = threading.Event()
+        self._hilo = None
+    # endfunction
+
+    def _leer(self):
+        try:
+            with open(self.ruta, "r") as archivo:
+                return json.load(archivo)
+            # endwith
+        except (OSError, ValueError):
+            return {}
+        # endtry
+    # endfunction
+
+    def _guardar(self):
+        # Con el lock cogido
+        os.makedirs(self.directorio, exist_ok=True)
+        with open(self.ruta + ".tmp", "w") as archivo:
+            json.dump(self._informes, archivo)
+        # endwith
+        os.replace(self.ruta + ".tmp", self.ruta)
+    # endfunction
+
+    def registrar(self, clave, ruta, dashboard, inicio, fin):
+        # Anade (o sustituye) el informe de la clave recien generado
+        informe = {"ruta": ruta, "dashboard": dashboard, "inicio": inicio, "fin": fin,
+                   "bytes": os.path.getsize(ruta), "creado": time.time()}
+        with self._lock:
+            anterior = self._informes.get(clave)
+            if anterior is not None:
+                self._bytes -= anterior["bytes"]
+            # endif
+            self._informes[clave] = informe
+            self._bytes += informe["bytes"]
+            self._guardar()
+        # endwith
+        self.limpiarEnSegundoPlano()
+        return informe
+    # endfunction
+
+    def obtener(self, clave):
+        # Informe de la clave (copia) o None si no esta o ya no existe
+        with self._lock:
+            informe = self._informes.get(clave)
+            if informe is None:
+                return None
+            # endif
+            if not os.path.exists(informe["ruta"]):
+                self._bytes -= informe["bytes"]
+                del self._informes[clave]
+                self._guardar()
+                return None
+            # endif
+            return dict(informe)
+        # endwith
+    # endfunction
+
+    def _seleccionarExpulsados(self):
+        # Saca del catalogo los informes que no cumplen las politicas y
+        # devuelve su lista (con el lock cogido)
+        por_antiguedad = sorted(self._informes.items(),
+                                key=lambda elemento: elemento[1]["creado"])
+        expulsar = set()
+        if self.retencion_s > 0:
+            limite = time.time() - self.retencion_s
+            expulsar.update(clave for clave, informe in por_antiguedad
+                            if informe["creado"] < limite)
+        # endif
+        if self.max_por_dashboard > 0:
+            por_dashboard = {}
+            for clave, informe in reversed(por_antiguedad):
+                por_dashboard.setdefault(
+                    informe["dashboard"], []).append(clave)
+            # endfor
+            for claves in por_dashboard.values():
+                expulsar.update(claves[self.max_por_dashboard:])
+            # endfor
+        # endif
+        if self.max_bytes > 0:
+            total = sum(informe["bytes"] for clave, informe in por_antiguedad
+                        if clave not in expulsar)
+            for clave, informe in por_antiguedad:
+                if total <= self.max_bytes:
+                    break
+                # endif
+                if clave not in expulsar:
+                    expulsar.add(clave)
+                    total -= informe["bytes"]
+                # endif
+            # endfor
+        # endif
+        expulsados = []
+        for clave in expulsar:
+            informe = self._informes.pop(clave)
+            self._bytes -= informe["bytes"]
+            expulsados.append(informe)
+        # endfor
+        if expulsados:
+            self._guardar()
+        # endif
+        return expulsados
+    # endfunction
+
+    def limpiar(self):
+        # Aplica las politicas de retencion y borra los archivos expulsados
+        with self._lock:
+            expulsados = self._seleccionarExpulsados()
+        # endwith
+        base = os.path.abspath(self.directorio) + os.sep
+        for informe in expulsados:
+            ruta = os.path.abspath(informe["ruta"])
+            if not ruta.startswith(base):
+                # Informes guardados fuera del catalogo: solo se olvidan
+                continue
+            # endif
+            try:
+                if os.path.getmtime(ruta) > informe["creado"]:
+                    # El archivo se ha vuelto a generar despues
+                    continue
+                # endif
+                os.remove(ruta)
+                os.rmdir(os.path.dirname(ruta))
+            except OSError:
+                pass
+            # endtry
+        # endfor
+        self.expulsados += len(expulsados)
+        return len(expulsados)
+    # endfunction
+
+    def limpiarEnSegundoPlano(self):
+        # Pide una limpieza al hilo de limpieza (que se crea la primera vez)
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._bucleLimpieza, daemon=True,
+                                              name="catalogo-informes")
+                self._hilo.start()
+            # endif
+        # endwith
+        self._evento.set()
+    # endfunction
+
+    def _bucleLimpieza(self):
+        while True:
+            self._evento.wait(INTERVALO_LIMPIEZA)
+            self._evento.clear()
+            try:
+                self.limpiar()
+            except Exception as e:
+                print(f"Error limpiando el catalogo de informes: {e}")
+            # endtry
+        # endwhile
+    # endfunction
+
+    def resumen(self):
+        with self._lock:
+            return {"informes": len(self._informes), "bytes": self._bytes,
+                    "expulsados": self.expulsados}
+        # endwith
+    # endfunction
+# endclass
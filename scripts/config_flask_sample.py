@@ -13,4 +13,32 @@
 INFORMES_DIR = "/[root]/Grafana-Data-Report/informes/"
 
 # INFORMES_DICT = {"dashboard_id":"/absolute/route/to/script.py", "dashboard_id2":"/absolute/route/to/script2.py", ...}
-INFORMES_DICT = {"[sample]":"/[root]/Grafana-Data-Report/scripts/[sample]/informe.py"}
\ No newline at end of file
+INFORMES_DICT = {"[sample]":"/[root]/Grafana-Data-Report/scripts/[sample]/informe.py"}
+
+# Informes que se generan a la vez y trabajos que pueden esperar turno (con la cola llena se responde 429)
+TRABAJOS_MAX_HILOS = 2
+TRABAJOS_MAX_COLA = 10
+# Segundos que se indican en Retry-After al rechazar un trabajo
+TRABAJOS_REINTENTAR_S = 30
+# Segundos que se guardan el estado y el archivo de los trabajos terminados
+TRABAJOS_RETENCION_S = 3600
+
+# Cache de informes: segundos durante los que se reutiliza un informe generado y
+# segundos a los que se alinea su rango de tiempo (INFORMES_CACHE_DIR por defecto
+# es INFORMES_DIR/cache)
+INFORMES_CACHE_TTL = 300
+INFORMES_CACHE_ALINEACION = 300
+
+# Retencion de los informes generados: informes por dashboard, tamano total (MB)
+# y antiguedad maxima (dias). Con 0 no se aplica el limite
+INFORMES_MAX_POR_DASHBOARD = 30
+INFORMES_MAX_MB = 1024
+INFORMES_RETENCION_DIAS = 0
+
+# Enviar el excel de la peticion original a medida que se genera (tambien con
+# ?stream=1) y guardar ademas una copia en la cache de informes
+INFORMES_STREAMING = False
+INFORMES_STREAMING_GUARDAR = True
+# En streaming no escribir los archivos intermedios del informe (JSON, CSV y
+# tablas) ni sus hojas de datos en temporales (el almacen y las caches si)
+INFORMES_STREAMING_SIN_DISCO = True
@@ -5,102 +5,267 @@
 #
 #   Script para iniciar una API con Flask para poder ejecutar el script para
 #   crear el informe haciendo una petición HTTP. La petición devuelve el archivo
-#   excel creado del informe que se descarga en el dispositivo del usuario
+#   excel creado del informe que se descarga en el dispositivo del usuario.
+#   Los informes también se pueden pedir como trabajos: POST .../<id>/jobs
+#   devuelve el id del trabajo al momento, su estado y avance se consultan en
+#   .../jobs/<job_id> y el excel se descarga en .../jobs/<job_id>/download.
+#   Los informes iguales (mismo dashboard, rango alineado y configuracion) se
+#   generan una sola vez: las peticiones simultaneas comparten el trabajo y las
+#   posteriores reciben el archivo de la cache mientras no caduque.
+#   Con INFORMES_STREAMING (o ?stream=1) la ruta original envia el excel a
+#   medida que se escribe, sin guardarlo antes entero en disco; si se guarda
+#   una copia en la cache (INFORMES_STREAMING_GUARDAR), las peticiones iguales
+#   que llegan mientras tanto esperan a ese mismo trabajo y reciben la copia.
+#   Con INFORMES_STREAMING_SIN_DISCO el informe tampoco escribe sus archivos
+#   intermedios ni hojas temporales (el almacen y las caches si)
 #
 #   Autor: Marc Llobera Villalonga
 #
 # --------------------------------------------------------------------------------
 
-from flask import Flask, send_file
-import sys
+from flask import Flask, Response, request, send_file, jsonify, url_for
 import os
-import subprocess
-import time
 import config_flask
-import importlib
+import threading
+import tempfile
+from trabajos import ColaTrabajos, ColaLlena, TERMINADO, ERROR
+from cache_informes import CacheInformes, claveInforme
+from registro_informes import RegistroInformes
+from flujo_respuesta import FlujoTrozos
 
-def buscar_archivo_en_subcarpetas(directorio, archivo):
-    # Recorre todas las subcarpetas y archivos en el directorio
-    for root, dirs, files in os.walk(directorio):  # Recorre todos los directorios y subdirectorios
-        if archivo in files:  # Si el archivo se encuentra en el directorio actual
-            return os.path.join(root, archivo)  # Retorna la ruta completa del archivo
-    return None  # Si no se encuentra, retorna None
+# Trabajos que generan informes a la vez, trabajos que pueden esperar turno
+# (con la cola llena se responde 429) y segundos que se guardan los terminados
+TRABAJOS_MAX_HILOS = getattr(config_flask, "TRABAJOS_MAX_HILOS", 2)
+TRABAJOS_MAX_COLA = getattr(config_flask, "TRABAJOS_MAX_COLA", 10)
+TRABAJOS_RETENCION_S = getattr(config_flask, "TRABAJOS_RETENCION_S", 3600)
+# Segundos que se indican en Retry-After al rechazar un trabajo
+TRABAJOS_REINTENTAR_S = getattr(config_flask, "TRABAJOS_REINTENTAR_S", 30)
 
-app = Flask(__name__)
+# Cache de informes: directorio, segundos durante los que un informe generado
+# se reutiliza y segundos a los que se alinea el rango de tiempo del informe
+INFORMES_CACHE_DIR = getattr(config_flask, "INFORMES_CACHE_DIR",
+                             os.path.join(config_flask.INFORMES_DIR, "cache"))
+INFORMES_CACHE_TTL = getattr(config_flask, "INFORMES_CACHE_TTL", 300)
+INFORMES_CACHE_ALINEACION = getattr(config_flask, "INFORMES_CACHE_ALINEACION", 300)
+# Retencion del catalogo de informes: informes por dashboard, tamano total (MB)
+# y antiguedad maxima (dias). Con 0 no se aplica el limite
+INFORMES_MAX_POR_DASHBOARD = getattr(config_flask, "INFORMES_MAX_POR_DASHBOARD", 30)
+INFORMES_MAX_MB = getattr(config_flask, "INFORMES_MAX_MB", 1024)
+INFORMES_RETENCION_DIAS = getattr(config_flask, "INFORMES_RETENCION_DIAS", 0)
+# Enviar el excel de la ruta original a medida que se genera (tambien con
+# ?stream=1) y guardar o no una copia en disco para la cache
+INFORMES_STREAMING = getattr(config_flask, "INFORMES_STREAMING", False)
+INFORMES_STREAMING_GUARDAR = getattr(config_flask, "INFORMES_STREAMING_GUARDAR", True)
+# En streaming, sin archivos intermedios (JSON/CSV/tablas) ni hojas de datos en
+# archivos temporales: main(sin_disco=True)
+INFORMES_STREAMING_SIN_DISCO = getattr(config_flask, "INFORMES_STREAMING_SIN_DISCO", True)
 
-@app.route('/grafana-data-report/<dashboard_id>')
-def ejecutar_script(dashboard_id):
-    informes_dir = config_flask.INFORMES_DIR
-    informes_dict = config_flask.INFORMES_DICT
+MIMETYPE_EXCEL = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+def generar_informe(informe, ventana, clave, trabajo):
+    # Se ejecuta en un hilo de la cola de trabajos. Devuelve la ruta del excel
+    directorio = cache_informes.ruta(clave)
+    print(f"Ejecutando script: {informe.ruta_script}")
+    # Cada informe se genera en el directorio de su clave en la cache. Los
+    # scripts anteriores no admiten avance por etapas, directorio ni rango
+    file_name = informe.generar(progreso=trabajo.progreso, directorio=directorio, ventana=ventana)
+    modulo = informe.modulo
+    # El cliente de Grafana es compartido entre peticiones (mismo pool de
+    # conexiones): sus estadisticas son las de todos los informes del proceso
+    print(f"Peticiones a Grafana (total del proceso): {modulo.obtenerClienteGrafana().resumen()}")
+    # La cache de consultas tambien es compartida: los informes que comparten
+    # paneles y rango de tiempo no repiten consultas
+    cache_consultas = modulo.obtenerCacheConsultas()
+    if cache_consultas is not None:
+        print(f"Cache de consultas: {cache_consultas.resumen()}")
 
-    print(f"Recibido dashboard_id: {dashboard_id}")
-    
-    name=""
-    ruta_script = ""
-    for k, v in informes_dict.items():
-        if k == dashboard_id:
-            name = k
-            ruta_script = v
-            print(f"Script encontrado: {ruta_script}")
-    
-    if ruta_script in [None, ""]:
-        print("Dashboard no reconocido.")
-        return "Dashboard no reconocido", 400
-        
-    # Ejecutar el script de forma asincrona
-    print(f"Ejecutando script: {ruta_script}")
-    # process = subprocess.Popen(['python3', ruta_script],stdout=subprocess.PIPE,stderr=subprocess.STDOUT,text=True)
-    directorio_script = os.path.dirname(ruta_script)
-    nombre_modulo = os.path.splitext(os.path.basename(ruta_script))[0]
-    # Agregar el directorio del script al sys.path si no está ya
-    if directorio_script not in sys.path:
-        sys.path.insert(0, directorio_script)
-    spec = importlib.util.spec_from_file_location(nombre_modulo, ruta_script)
-    modulo = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(modulo)
-    file_name = modulo.main()
-    # print(f"aaaaaaaa")
-    # timeout = 300  # 5 minutos
-    # start_time = time.time()
-    
-    # while time.time() - start_time < timeout:
-    #     print(str(time.time()))
-    #     print(str(process.poll()))
-    #     if process.poll() is not None:  # El proceso ha terminado
-    #         print(f"El proceso ha terminado exitosamente.")
-    #         break
-    #     time.sleep(1)  # Esperar 1 segundo antes de verificar de nuevo
-    
-    # # Verificar si el proceso termino correctamente
-    # if process.poll() is None:
-    #     print("El script tarda demasiado en ejecutarse. Terminando proceso.")
-    #     process.terminate()
-    #     return "El script tarda demasiado en ejecutarse", 504
-    
-    # # Obtener la salida del script
-    # for line in process.stdout:
-    #   print(line, end='')  # Muestra los logs en tiempo real
-    # process.wait()
-
-    # print(f"Salida del script: {stdout}")
-    # print(f"Errores del script (si los hay): {stderr}")
-    
-    # Eliminar espacios en blanco y saltos de linea del nombre del archivo
-    # nombre_archivo = stdout.strip()
     nombre_archivo = file_name
     print(f"Nombre de archivo generado: {nombre_archivo}")
 
-    excel_path = buscar_archivo_en_subcarpetas(informes_dir, nombre_archivo)
-    if excel_path is None:
+    if "directorio" in informe.parametros:
+        excel_path = os.path.join(directorio, nombre_archivo)
+    else:
+        # Los scripts anteriores guardan el excel en su INFORMES_DIR
+        excel_path = os.path.join(modulo.INFORMES_DIR, nombre_archivo)
+    if not os.path.exists(excel_path):
         print(f"El archivo Excel no se ha generado correctamente: {nombre_archivo}")
-        return f"El archivo Excel no se ha generado correctamente: {nombre_archivo}", 404
-        
+        raise FileNotFoundError(f"El archivo Excel no se ha generado correctamente: {nombre_archivo}")
+    # Anotar el informe en el catalogo (busqueda directa y retencion)
+    cache_informes.registrar(clave, excel_path, informe.nombre, ventana)
+    return excel_path
+
+def encolar_informe(dashboard_id):
+    # Devuelve (trabajo, None) o (None, respuesta de error). Si el mismo
+    # informe esta en la cache se devuelve ya terminado y si se esta
+    # generando se devuelve ese mismo trabajo
+    print(f"Recibido dashboard_id: {dashboard_id}")
+    informe = registro_informes.obtener(dashboard_id)
+    if informe is None:
+        print("Dashboard no reconocido.")
+        return None, ("Dashboard no reconocido", 400)
+    # Peticiones cercanas piden el mismo rango y comparten el informe
+    ventana = informe.ventana(INFORMES_CACHE_ALINEACION)
+    clave = claveInforme(dashboard_id, ventana[0], ventana[1], informe.hash_config)
+    with lock_informes:
+        excel_path = cache_informes.obtener(clave)
+        if excel_path is not None:
+            print(f"Informe en cache: {excel_path}")
+            return cola_trabajos.registrarTerminado(dashboard_id, excel_path, clave), None
+        try:
+            trabajo = cola_trabajos.enviar(
+                dashboard_id,
+                lambda trabajo: generar_informe(informe, ventana, clave, trabajo),
+                clave)
+        except ColaLlena as e:
+            print(f"Trabajo rechazado: {e}")
+            return None, (str(e), 429, {"Retry-After": str(TRABAJOS_REINTENTAR_S)})
+    print(f"Trabajo {trabajo.id} para {dashboard_id}: {trabajo.estado}")
+    return trabajo, None
+
+def generar_en_flujo(informe, ventana, clave, trabajo, flujo, excel_path=None):
+    # Como generar_informe pero escribiendo el excel en flujo (la respuesta
+    # HTTP). Con excel_path la copia del flujo se guarda ahi, en la cache
+    print(f"Ejecutando script en streaming: {informe.ruta_script}")
+    guardado = False
+    try:
+        informe.generar(progreso=trabajo.progreso, ventana=ventana, destino=flujo,
+                        sin_disco=INFORMES_STREAMING_SIN_DISCO)
+        if excel_path is not None:
+            flujo.copia.flush()
+            os.replace(flujo.copia.name, excel_path)
+            guardado = True
+            cache_informes.registrar(clave, excel_path, informe.nombre, ventana)
+        flujo.terminar()
+        print(f"Informe enviado: {flujo.bytes} bytes")
+        return excel_path
+    except Exception as e:
+        flujo.terminar(e)
+        raise
+    finally:
+        flujo.close()
+        if flujo.copia is not None and not guardado:
+            os.remove(flujo.copia.name)
+
+def transmitir_informe(dashboard_id):
+    # Ruta original en streaming: el excel se envia mientras se escribe, sin
+    # guardarlo entero en disco (salvo la copia opcional para la cache)
+    print(f"Recibido dashboard_id (streaming): {dashboard_id}")
+    informe = registro_informes.obtener(dashboard_id)
+    if informe is None:
+        print("Dashboard no reconocido.")
+        return "Dashboard no reconocido", 400
+    ventana = informe.ventana(INFORMES_CACHE_ALINEACION)
+    clave = claveInforme(dashboard_id, ventana[0], ventana[1], informe.hash_config)
+    nombre_archivo = informe.modulo.nombreInforme(ventana[1])
+    with lock_informes:
+        excel_path = cache_informes.obtener(clave)
+        if excel_path is not None:
+            print(f"Informe en cache: {excel_path}")
+            return enviar_excel(excel_path)
+        trabajo = cola_trabajos.enVuelo(clave)
+        if trabajo is None:
+            copia = None
+            if INFORMES_STREAMING_GUARDAR:
+                copia = os.path.join(cache_informes.ruta(clave), nombre_archivo)
+                os.makedirs(os.path.dirname(copia), exist_ok=True)
+                flujo = FlujoTrozos(tempfile.NamedTemporaryFile(
+                    dir=os.path.dirname(copia), suffix=".tmp", delete=False))
+            else:
+                flujo = FlujoTrozos()
+            try:
+                # Solo con copia otras peticiones iguales pueden compartir el
+                # trabajo (un flujo solo tiene un cliente)
+                trabajo = cola_trabajos.enviar(
+                    dashboard_id, lambda trabajo: generar_en_flujo(informe, ventana, clave, trabajo, flujo, copia),
+                    clave if copia is not None else None)
+            except ColaLlena as e:
+                print(f"Trabajo rechazado: {e}")
+                flujo.close()
+                if copia is not None:
+                    os.remove(flujo.copia.name)
+                return str(e), 429, {"Retry-After": str(TRABAJOS_REINTENTAR_S)}
+            print(f"Trabajo {trabajo.id} para {dashboard_id}: {trabajo.estado}")
+            return Response(flujo.trozos(), mimetype=MIMETYPE_EXCEL,
+                            headers={"Content-Disposition": f"attachment; filename={nombre_archivo}",
+                                     "X-Job-Id": trabajo.id})
+    # El mismo informe ya se esta generando: se espera y se envia su archivo
+    print(f"Esperando al trabajo {trabajo.id} para {dashboard_id}")
+    trabajo.esperar()
+    if trabajo.estado == ERROR:
+        return f"Error al generar el informe: {trabajo.error}", 500
+    return enviar_excel(trabajo.archivo)
+
+def estado_trabajo(trabajo):
+    estado = trabajo.aDict()
+    estado["estado_url"] = url_for("estado", job_id=trabajo.id)
+    if trabajo.estado == TERMINADO and trabajo.archivo is not None:
+        estado["descarga_url"] = url_for("descarga", job_id=trabajo.id)
+    return estado
+
+def enviar_excel(excel_path):
     # Enviar el archivo para descarga
     print(f"Enviando archivo {excel_path} para descarga.")
-    return send_file(excel_path, 
+    return send_file(excel_path,
                      as_attachment=True,
-                     download_name=nombre_archivo,
-                     mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+                     download_name=os.path.basename(excel_path),
+                     mimetype=MIMETYPE_EXCEL)
+
+app = Flask(__name__)
+cola_trabajos = ColaTrabajos(TRABAJOS_MAX_HILOS, TRABAJOS_MAX_COLA, TRABAJOS_RETENCION_S)
+cache_informes = CacheInformes(INFORMES_CACHE_DIR, INFORMES_CACHE_TTL, INFORMES_MAX_POR_DASHBOARD,
+                               INFORMES_MAX_MB*1024*1024, INFORMES_RETENCION_DIAS*24*60*60)
+# Consultar la cache y crear el trabajo es una sola operacion
+lock_informes = threading.Lock()
+# Los scripts de INFORMES_DICT se cargan una vez al arrancar
+registro_informes = RegistroInformes(config_flask.INFORMES_DICT)
+registro_informes.cargarTodos()
+
+@app.route('/grafana-data-report/<dashboard_id>')
+def ejecutar_script(dashboard_id):
+    # Ruta original: crea el trabajo y espera a que termine para devolver el excel
+    if INFORMES_STREAMING or request.args.get("stream") in ["1", "true"]:
+        informe = registro_informes.obtener(dashboard_id)
+        # Los scripts anteriores no pueden escribir en un flujo
+        if informe is not None and "destino" in informe.parametros:
+            return transmitir_informe(dashboard_id)
+    trabajo, error = encolar_informe(dashboard_id)
+    if trabajo is None:
+        return error
+    trabajo.esperar()
+    if trabajo.estado == ERROR:
+        return f"Error al generar el informe: {trabajo.error}", 500
+    return enviar_excel(trabajo.archivo)
+
+@app.route('/grafana-data-report/<dashboard_id>/jobs', methods=['POST'])
+def crear_trabajo(dashboard_id):
+    # Crea el trabajo y responde al momento con su id y la url de su estado
+    trabajo, error = encolar_informe(dashboard_id)
+    if trabajo is None:
+        return error
+    estado = estado_trabajo(trabajo)
+    return jsonify(estado), 202, {"Location": estado["estado_url"]}
+
+@app.route('/grafana-data-report/jobs/<job_id>')
+def estado(job_id):
+    # Estado del trabajo y avance de cada etapa (consultas, datos, informe)
+    trabajo = cola_trabajos.obtener(job_id)
+    if trabajo is None:
+        return "Trabajo no encontrado", 404
+    return jsonify(estado_trabajo(trabajo))
+
+@app.route('/grafana-data-report/jobs/<job_id>/download')
+def descarga(job_id):
+    trabajo = cola_trabajos.obtener(job_id)
+    if trabajo is None:
+        return "Trabajo no encontrado", 404
+    if trabajo.estado == ERROR:
+        return f"Error al generar el informe: {trabajo.error}", 500
+    if trabajo.estado != TERMINADO:
+        return jsonify(estado_trabajo(trabajo)), 409
+    if trabajo.archivo is None or not os.path.exists(trabajo.archivo):
+        # Enviado en streaming sin copia o borrado por la retencion del catalogo
+        return "El informe ya no esta disponible", 410
+    return enviar_excel(trabajo.archivo)
 
 if __name__ == '__main__':
     print("Iniciando servidor Flask...")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# --------------------------------------------------------------------------------
+#
+#   Flujo binario para enviar el excel al cliente HTTP a medida que se genera.
+#   El hilo que genera el informe escribe en FlujoTrozos como en un archivo y
+#   la respuesta de Flask recorre trozos(), que va devolviendo los bytes en
+#   trozos de tamano fijo. La cola entre los dos es limitada: si el cliente
+#   descarga despacio, el informe espera en vez de acumular el excel en
+#   memoria. Si el cliente se desconecta, la siguiente escritura falla y el
+#   informe se interrumpe.
+#
+#   Opcionalmente se escribe a la vez una copia en un archivo (la que se guarda
+#   en la cache de informes). El flujo es el dueno de la copia: la cierra al
+#   cerrarse y, si el cliente se desconecta, el informe sigue hasta completarla
+#   (otras peticiones iguales pueden estar esperandola).
+#
+#   Autor: Marc Llobera Villalonga
+#
+# --------------------------------------------------------------------------------
+
+import io
+import queue
+
+# Tamano de cada trozo enviado y trozos que pueden esperar en la cola
+TAMANO_TROZO = 64 * 1024
+MAX_TROZOS_COLA = 32
+# Segundos entre comprobaciones de si el cliente sigue conectado
+ESPERA_COLA = 1
+
+_FIN = object()
+
+
+class ClienteDesconectado(Exception):
+    pass
+# endclass
+
+
+class FlujoTrozos(io.RawIOBase):
+    def __init__(self, copia=None):
+        # copia: archivo binario abierto donde se escribe tambien el excel (se
+        # cierra con el flujo)
+        self.copia = copia
+        self.bytes = 0
+        self._cola = queue.Queue(MAX_TROZOS_COLA)
+        self._pendiente = bytearray()
+        self._cancelado = False
+    # endfunction
+
+    def writable(self):
+        return True
+    # endfunction
+
+    def write(self, datos):
+        if self.copia is not None:
+            self.copia.write(datos)
+        # endif
+        self._pendiente += datos
+        while len(self._pendiente) >= TAMANO_TROZO:
+            self._poner(bytes(self._pendiente[:TAMANO_TROZO]))
+            del self._pendiente[:TAMANO_TROZO]
+        # endwhile
+        self.bytes += len(datos)
+        return len(datos)
+    # endfunction
+
+    def _poner(self, elemento):
+        while True:
+            if self._cancelado:
+                if self.copia is not None:
+                    # Nadie recoge ya los trozos, pero la copia se completa
+                    return
+                # endif
+                raise ClienteDesconectado(
+                    "El cliente ha cerrado la conexion")
+            # endif
+            try:
+                self._cola.put(elemento, timeout=ESPERA_COLA)
+                return
+            except queue.Full:
+                continue
+            # endtry
+        # endwhile
+    # endfunction
+
+    def terminar(self, error=None):
+        # Lo llama el hilo del informe al acabar (con la excepcion si fallo)
+        try:
+            if error is None and self._pendiente:
+                self._poner(bytes(self._pendiente))
+            # endif
+            self._pendiente = bytearray()
+            self._poner(_FIN if error is None else error)
+        except ClienteDesconectado:
+            pass
+        # endtry
+    # endfunction
+
+    def close(self):
+        if self.copia is not None:
+            self.copia.close()
+        # endif
+        super().close()
+    # endfunction
+
+    def trozos(self):
+        # Generador para la respuesta HTTP
+        try:
+            while True:
+                elemento = self._cola.get()
+                if elemento is _FIN:
+                    return
+                # endif
+                if isinstance(elemento, BaseException):
+                    # La respuesta ya ha empezado: se corta la conexion
+                    raise elemento
+                # endif
+                yield elemento
+            # endwhile
+        finally:
+            self._cancelado = True
+        # endtry
+    # endfunction
+# endclass
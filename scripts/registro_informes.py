@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# --------------------------------------------------------------------------------
+#
+#   Registro de los scripts de informe de la API Flask. Cada script de
+#   INFORMES_DICT (informe.py y el config.py de su directorio) se carga una
+#   sola vez como modulo y se reutiliza en todas las peticiones: el rango de
+#   tiempo se calcula en cada llamada y solo se vuelve a cargar si cambia la
+#   fecha de modificacion de informe.py o de config.py.
+#
+#   Cada script importa "config", asi que durante la carga se pone su propio
+#   config.py en sys.modules; de este modo varios informes con configuraciones
+#   distintas conviven en el mismo servidor. main() guarda el rango en
+#   variables globales del modulo, por lo que las llamadas a un mismo informe
+#   se hacen de una en una (informes distintos si se ejecutan a la vez).
+#
+#   Solo informe.py y config.py son propios de cada informe y se recargan. Los
+#   modulos auxiliares que importan (tabla, almacen, resolucion...) se cargan
+#   una vez por proceso, desde el directorio del primer informe que los
+#   importa, y los comparten todos los informes: asi tambien comparten el
+#   cliente de Grafana, la cache de consultas y la de maquetacion. Un cambio
+#   en un modulo auxiliar necesita reiniciar el servidor, y si el directorio
+#   de un informe tiene una version distinta de un modulo ya cargado se avisa
+#   al cargarlo (se usa la ya cargada).
+#
+#   Autor: Marc Llobera Villalonga
+#
+# --------------------------------------------------------------------------------
+
+import importlib.util
+import inspect
+import os
+import sys
+import threading
+from cache_informes import hashArchivo
+
+# Las cargas cambian sys.modules["config"] y sys.path: de una en una
+_lock_carga = threading.Lock()
+
+
+def _firma(rutas):
+    # Fechas de modificacion de los archivos (None si no existe)
+    firma = []
+    for ruta in rutas:
+        try:
+            firma.append(os.stat(ruta).st_mtime_ns)
+        except OSError:
+            firma.append(None)
+        # endtry
+    # endfor
+    return tuple(firma)
+# endfunction
+
+
+def _cargarModulo(nombre, ruta):
+    spec = importlib.util.spec_from_file_location(nombre, ruta)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+# endfunction
+
+
+def _auxiliaresDistintos(directorio, propios):
+    # [(modulo, ruta cargada)] de los .py del directorio ya cargados en
+    # sys.modules desde otro archivo con contenido distinto
+    distintos = []
+    propios = [os.path.realpath(ruta) for ruta in propios]
+    try:
+        archivos = sorted(os.listdir(directorio))
+    except OSError:
+        return distintos
+    # endtry
+    for archivo in archivos:
+        ruta = os.path.realpath(os.path.join(directorio, archivo))
+        if not archivo.endswith(".py") or ruta in propios:
+            continue
+        # endif
+        cargado = getattr(sys.modules.get(archivo[:-3]), "__file__", None)
+        if cargado is None or os.path.realpath(cargado) == ruta:
+            continue
+        # endif
+        if hashArchivo(cargado) != hashArchivo(ruta):
+            distintos.append((archivo[:-3], cargado))
+        # endif
+    # endfor
+    return distintos
+# endfunction
+
+
+class InformeCargado:
+    def __init__(self, nombre, ruta_script):
+        self.nombre = nombre
+        self.ruta_script = ruta_script
+        self.ruta_config = os.path.join(
+            os.path.dirname(ruta_script), "config.py")
+        self.firma = _firma([self.ruta_script, self.ruta_config])
+        self.hash_config = hashArchivo(self.ruta_config)
+        directorio = os.path.dirname(ruta_script)
+        nombre_modulo = os.path.splitext(os.path.basename(ruta_script))[0]
+        with _lock_carga:
+            # Agregar el directorio del script al sys.path si no esta ya
+            if directorio not in sys.path:
+                sys.path.insert(0, directorio)
+            # endif
+            anterior = sys.modules.get("config")
+            try:
+                if os.path.exists(self.ruta_config):
+                    sys.modules["config"] = _cargarModulo(
+                        "config", self.ruta_config)
+                # endif
+                self.modulo = _cargarModulo(nombre_modulo, ruta_script)
+            finally:
+                if anterior is not None:
+                    sys.modules["config"] = anterior
+                else:
+                    sys.modules.pop("config", None)
+                # endif
+            # endtry
+        # endwith
+        self.auxiliares_distintos = _auxiliaresDistintos(directorio, [ruta_script, self.ruta_config])
+        for nombre_auxiliar, ruta_cargada in self.auxiliares_distintos:
+            print(f"Aviso: el informe {nombre} usa {nombre_auxiliar} de {ruta_cargada}, distinto "
+                  f"del de su directorio (los modulos auxiliares no se recargan)")
+        # endfor
+        self.parametros = inspect.signature(self.modulo.main).parameters
+        # Los scripts anteriores fijan el rango al importarse: se recargan
+        # en cada peticion como antes
+        self.reutilizable = hasattr(self.modulo, "ventanaInforme")
+        self._lock = threading.Lock()
+    # endfunction
+
+    def modificado(self):
+        return _firma([self.ruta_script, self.ruta_config]) != self.firma
+    # endfunction
+
+    def ventana(self, alineacion=0):
+        # (TIME_START, TIME_FINISH) que usaria un informe lanzado ahora
+        if self.reutilizable:
+            return self.modulo.ventanaInforme(alineacion)
+        # endif
+        if hasattr(self.modulo, "alinearVentana"):
+            self.modulo.alinearVentana(alineacion)
+        # endif
+        return self.modulo.TIME_START, self.modulo.TIME_FINISH
+    # endfunction
+
+    def generar(self, **argumentos):
+        # Llama a main() con los argumentos que admita el script
+        argumentos = {clave: valor for clave, valor in argumentos.items()
+                      if clave in self.parametros}
+        with self._lock:
+            return self.modulo.main(**argumentos)
+        # endwith
+    # endfunction
+# endclass
+
+
+class RegistroInformes:
+    def __init__(self, informes_dict):
+        # informes_dict: {id: ruta de informe.py} (INFORMES_DICT)
+        self.rutas = dict(informes_dict)
+        self._informes = {}
+        self._lock = threading.Lock()
+        self.cargas = 0
+    # endfunction
+
+    def cargarTodos(self):
+        # Carga todos los scripts al arrancar; los que fallen se reintentan
+        # en su primera peticion
+        for nombre in self.rutas:
+            try:
+                self.obtener(nombre)
+            except Exception as e:
+                print(f"No se ha podido cargar el informe {nombre}: {e}")
+            # endtry
+        # endfor
+    # endfunction
+
+    def obtener(self, nombre):
+        # InformeCargado del id (None si no esta en INFORMES_DICT), cargandolo
+        # de nuevo si sus archivos han cambiado
+        if nombre not in self.rutas:
+            return None
+        # endif
+        with self._lock:
+            informe = self._informes.get(nombre)
+            if informe is None or informe.modificado() or not informe.reutilizable:
+                if informe is not None and informe.reutilizable:
+                    print(f"Recargando informe {nombre}: {self.rutas[nombre]}")
+                # endif
+                # Las llamadas en curso siguen con el modulo anterior
+                informe = InformeCargado(nombre, self.rutas[nombre])
+                self._informes[nombre] = informe
+                self.cargas += 1
+            # endif
+            return informe
+        # endwith
+    # endfunction
+# endclass
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# --------------------------------------------------------------------------------
+#
+#   Almacen local de series temporales para no volver a descargar de Grafana
+#   los datos que ya se tienen. Los datos se guardan por (UID del dashboard,
+#   id del panel, firma de la consulta, measurement) en archivos binarios en
+#   los que solo se anade al final, y un indice por consulta recuerda que
+#   rangos de tiempo estan ya cubiertos. Cada ejecucion solo consulta los
+#   huecos que faltan.
+#
+#   La firma identifica la consulta (resolucion, funcion de agregacion...):
+#   un mismo panel pedido con consultas distintas, por ejemplo a dos tamanos
+#   o desde dos informes, tiene un almacen para cada una. Los almacenes de
+#   consultas que no se actualizan durante todo el periodo de retencion se
+#   borran.
+#
+#   Los archivos se compactan (ordenar, quitar duplicados y datos fuera del
+#   periodo de retencion) cuando acumulan demasiados segmentos.
+#
+#   Junto a los datos se guardan los resumenes (percentiles y ciclo de
+#   trabajo, ver resumenes.py) de cada dia completo ya consultado, de modo que
+#   el resumen de un rango se obtiene uniendo los de sus dias y solo se leen
+#   los puntos de los dias incompletos de los extremos.
+#
+#   Autor: Marc Llobera Villalonga
+#
+# --------------------------------------------------------------------------------
+
+import os
+import json
+import time
+import fcntl
+import shutil
+from array import array
+from bisect import bisect_left, bisect_right
+from urllib.parse import quote
+from resumenes import ResumenSerie, resumirPuntos
+
+MS_DIA = 24*60*60*1000
+
+
+def unirRangos(rangos):
+    # Une rangos [inicio, fin] solapados o contiguos y los devuelve ordenados
+    resultado = []
+    for inicio, fin in sorted(rangos):
+        if resultado and inicio <= resultado[-1][1]:
+            resultado[-1][1] = max(resultado[-1][1], fin)
+        else:
+            resultado.append([inicio, fin])
+        # endif
+    # endfor
+    return resultado
+# endfunction
+
+
+def restarRangos(inicio, fin, cubiertos):
+    # Devuelve las partes de [inicio, fin] que no estan en los rangos cubiertos
+    huecos = []
+    actual = inicio
+    for c_inicio, c_fin in unirRangos(cubiertos):
+        if c_fin <= actual:
+            continue
+        # endif
+        if c_inicio >= fin:
+            break
+        # endif
+        if c_inicio > actual:
+            huecos.append((actual, c_inicio))
+        # endif
+        actual = max(actual, c_fin)
+    # endfor
+    if actual < fin:
+        huecos.append((actual, fin))
+    # endif
+    return huecos
+# endfunction
+
+
+def leerSegmentos(ruta):
+    # Un segmento es: n (int64) + n tiempos (int64) + n valores (float64)
+    tiempos = array("q")
+    valores = array("d")
+    segmentos = 0
+    if not os.path.exists(ruta):
+        return tiempos, valores, segmentos
+    # endif
+    with open(ruta, "rb") as archivo:
+        while True:
+            cabecera = array("q")
+            try:
+                cabecera.fromfile(archivo, 1)
+            except EOFError:
+                break
+            # endtry
+            n = cabecera[0]
+            antes = len(tiempos)
+            try:
+                tiempos.fromfile(archivo, n)
+                valores.fromfile(archivo, n)
+            except EOFError:
+                # Segmento incompleto (escritura interrumpida): se descarta
+                del tiempos[antes:]
+                del valores[antes:]
+                break
+            # endtry
+            segmentos += 1
+        # endwhile
+    # endwith
+    return tiempos, valores, segmentos
+# endfunction
+
+
+def diaDe(t):
+    # Dia (desde epoch) al que pertenece un punto. Como en leer, cada dia es
+    # (inicio, fin]: el punto de las 00:00 es el ultimo del dia anterior
+    return (t - 1) // MS_DIA
+# endfunction
+
+
+def escribirSegmento(archivo, tiempos, valores):
+    array("q", [len(tiempos)]).tofile(archivo)
+    array("q", tiempos).tofile(archivo)
+    array("d", valores).tofile(archivo)
+# endfunction
+
+
+def ordenarSinDuplicados(tiempos, valores):
+    # Ordena por tiempo; si un tiempo se repite gana el ultimo escrito
+    ultimo = {}
+    for i, t in enumerate(tiempos):
+        ultimo[t] = i
+    # endfor
+    orden = sorted(ultimo.keys())
+    return array("q", orden), array("d", (valores[ultimo[t]] for t in orden))
+# endfunction
+
+
+class AlmacenSeries:
+    def __init__(self, directorio, retencion_dias=90, max_segmentos=16, solape_ms=10*60*1000):
+        self.directorio = directorio
+        self.retencion_ms = retencion_dias * MS_DIA
+        self.max_segmentos = max_segmentos
+        # Margen que se vuelve a pedir antes de cada hueco para refrescar el
+        # ultimo intervalo, que pudo guardarse incompleto en la ejecucion anterior
+        self.solape_ms = solape_ms
+        os.makedirs(self.directorio, exist_ok=True)
+    # endfunction
+
+    def _dirConsultas(self, dashboard_uid, panel_id):
+        return os.path.join(self.directorio, quote(str(dashboard_uid), safe=""), str(panel_id))
+    # endfunction
+
+    def _dirPanel(self, dashboard_uid, panel_id, firma):
+        # Un directorio por consulta del panel
+        return os.path.join(self._dirConsultas(dashboard_uid, panel_id), quote(str(firma), safe=""))
+    # endfunction
+
+    def _rutaMedida(self, dir_panel, medida):
+        return os.path.join(dir_panel, quote(medida, safe="") + ".dat")
+    # endfunction
+
+    def _leerIndice(self, dir_panel):
+        try:
+            with open(os.path.join(dir_panel, "indice.json"), "r") as archivo:
+                return json.load(archivo)
+            # endwith
+        except (OSError, ValueError):
+            return {"rangos": [], "medidas": []}
+        # endtry
+    # endfunction
+
+    def _guardarIndice(self, dir_panel, indice):
+        ruta = os.path.join(dir_panel, "indice.json")
+        with open(ruta + ".tmp", "w") as archivo:
+            json.dump(indice, archivo)
+        # endwith
+        os.replace(ruta + ".tmp", ruta)
+    # endfunction
+
+    def _leerResumenes(self, dir_panel):
+        # {medida: {dia: ResumenSerie.aDict()}} de los dias completos
+        try:
+            with open(os.path.join(dir_panel, "resumenes.json"), "r") as archivo:
+                return json.load(archivo)
+            # endwith
+        except (OSError, ValueError):
+            return {}
+        # endtry
+    # endfunction
+
+    def _guardarResumenes(self, dir_panel, resumenes):
+        ruta = os.path.join(dir_panel, "resumenes.json")
+        with open(ruta + ".tmp", "w") as archivo:
+            json.dump(resumenes, archivo)
+        # endwith
+        os.replace(ruta + ".tmp", ruta)
+    # endfunction
+
+    def _bloquear(self, dir_panel):
+        os.makedirs(dir_panel, exist_ok=True)
+        candado = open(os.path.join(dir_panel, ".lock"), "w")
+        fcntl.flock(candado, fcntl.LOCK_EX)
+        return candado
+    # endfunction
+
+    def huecos(self, dashboard_uid, panel_id, firma, inicio_ms, fin_ms):
+        # Rangos de [inicio_ms, fin_ms] que hay que pedir a Grafana
+        indice = self._leerIndice(
+            self._dirPanel(dashboard_uid, panel_id, firma))
+        huecos = []
+        for h_inicio, h_fin in restarRangos(inicio_ms, fin_ms, indice.get("rangos", [])):
+            if h_inicio > inicio_ms:
+                h_inicio = max(inicio_ms, h_inicio - self.solape_ms)
+            # endif
+            huecos.append((h_inicio, h_fin))
+        # endfor
+        return huecos
+    # endfunction
+
+    def anadir(self, dashboard_uid, panel_id, firma, rango, series):
+        # series: lista de (medida, tiempos, valores); los valores None/NaN se descartan
+        dir_panel = self._dirPanel(dashboard_uid, panel_id, firma)
+        candado = self._bloquear(dir_panel)
+        try:
+            indice = self._leerIndice(dir_panel)
+            indice["firma"] = firma
+
+            por_medida = {}
+            for medida, tiempos, valores in series:
+                t_medida, v_medida = por_medida.setdefault(
+                    medida, (array("q"), array("d")))
+                for t, v in zip(tiempos, valores):
+                    if v is not None and v == v:
+                        t_medida.append(int(t))
+                        v_medida.append(float(v))
+                    # endif
+                # endfor
+            # endfor
+
+            resumenes = self._leerResumenes(dir_panel)
+            invalidados = False
+            for medida, (tiempos, valores) in por_medida.items():
+                with open(self._rutaMedida(dir_panel, medida), "ab") as archivo:
+                    escribirSegmento(archivo, tiempos, valores)
+                # endwith
+                if medida not in indice["medidas"]:
+                    indice["medidas"].append(medida)
+                # endif
+                # Los resumenes de los dias que reciben puntos nuevos ya no valen
+                dias = resumenes.get(medida, {})
+                for dia in {str(diaDe(t)) for t in tiempos} & dias.keys():
+                    del dias[dia]
+                    invalidados = True
+                # endfor
+            # endfor
+            if invalidados:
+                self._guardarResumenes(dir_panel, resumenes)
+            # endif
+
+            indice["rangos"] = unirRangos(
+                indice.get("rangos", []) + [list(rango)])
+            indice["actualizado"] = time.time()
+            self._guardarIndice(dir_panel, indice)
+            self._compactarSiHaceFalta(dir_panel, indice)
+        finally:
+            candado.close()
+        # endtry
+        self._borrarConsultasAntiguas(dashboard_uid, panel_id)
+    # endfunction
+
+    def _borrarConsultasAntiguas(self, dashboard_uid, panel_id):
+        # Borra los almacenes de otras consultas del panel que no se han
+        # actualizado en todo el periodo de retencion (sus datos ya no valen)
+        dir_consultas = self._dirConsultas(dashboard_uid, panel_id)
+        limite = time.time() - self.retencion_ms / 1000
+        for nombre in os.listdir(dir_consultas):
+            dir_panel = os.path.join(dir_consultas, nombre)
+            if not os.path.isdir(dir_panel):
+                continue
+            # endif
+            actualizado = self._leerIndice(dir_panel).get("actualizado")
+            if actualizado is not None and actualizado < limite:
+                shutil.rmtree(dir_panel, ignore_errors=True)
+            # endif
+        # endfor
+    # endfunction
+
+    def _compactarSiHaceFalta(self, dir_panel, indice, forzar=False):
+        limite = int(time.time() * 1000) - self.retencion_ms
+        rangos = indice.get("rangos", [])
+        fuera_retencion = bool(rangos) and rangos[0][0] < limite
+        for medida in indice.get("medidas", []):
+            ruta = self._rutaMedida(dir_panel, medida)
+            tiempos, valores, segmentos = leerSegmentos(ruta)
+            if not (forzar or fuera_retencion or segmentos > self.max_segmentos):
+                continue
+            # endif
+            tiempos, valores = ordenarSinDuplicados(tiempos, valores)
+            # Descartar los puntos anteriores al periodo de retencion
+            i = bisect_left(tiempos, limite)
+            with open(ruta + ".tmp", "wb") as archivo:
+                escribirSegmento(archivo, tiempos[i:], valores[i:])
+            # endwith
+            os.replace(ruta + ".tmp", ruta)
+        # endfor
+        if fuera_retencion:
+            indice["rangos"] = [[max(inicio, limite), fin]
+                                for inicio, fin in rangos if fin > limite]
+            self._guardarIndice(dir_panel, indice)
+            resumenes = self._leerResumenes(dir_panel)
+            for dias in resumenes.values():
+                for dia in [dia for dia in dias if int(dia) * MS_DIA < limite]:
+                    del dias[dia]
+                # endfor
+            # endfor
+            self._guardarResumenes(dir_panel, resumenes)
+        # endif
+    # endfunction
+
+    def compactar(self, dashboard_uid, panel_id, firma):
+        dir_panel = self._dirPanel(dashboard_uid, panel_id, firma)
+        candado = self._bloquear(dir_panel)
+        try:
+            self._compactarSiHaceFalta(
+                dir_panel, self._leerIndice(dir_panel), forzar=True)
+        finally:
+            candado.close()
+        # endtry
+    # endfunction
+
+    def leer(self, dashboard_uid, panel_id, firma, inicio_ms, fin_ms):
+        # Devuelve [(medida, tiempos, valores)] con los puntos de (inicio_ms, fin_ms],
+        # ordenados por tiempo y sin duplicados. Grafana marca cada intervalo de
+        # aggregateWindow con su final, asi que el inicio del rango no se incluye
+        dir_panel = self._dirPanel(dashboard_uid, panel_id, firma)
+        indice = self._leerIndice(dir_panel)
+        series = []
+        for medida in indice.get("medidas", []):
+            tiempos, valores, _ = leerSegmentos(
+                self._rutaMedida(dir_panel, medida))
+            tiempos, valores = ordenarSinDuplicados(tiempos, valores)
+            desde = bisect_right(tiempos, inicio_ms)
+            hasta = bisect_right(tiempos, fin_ms)
+            series.append((medida, tiempos[desde:hasta], valores[desde:hasta]))
+        # endfor
+        return series
+    # endfunction
+
+    def resumen(self, dashboard_uid, panel_id, firma, inicio_ms, fin_ms):
+        # Devuelve {medida: ResumenSerie} de los puntos de (inicio_ms, fin_ms].
+        # Los dias completos y ya consultados salen de los resumenes guardados
+        # (si falta alguno se calcula y se guarda); solo se recorren los
+        # puntos de los extremos que no son dias completos
+        dir_panel = self._dirPanel(dashboard_uid, panel_id, firma)
+        candado = self._bloquear(dir_panel)
+        try:
+            indice = self._leerIndice(dir_panel)
+            resumenes = self._leerResumenes(dir_panel)
+            rangos = indice.get("rangos", [])
+            # Partes del rango en orden: ("dia", dia) o ("puntos", desde, hasta)
+            partes = []
+            actual = inicio_ms
+            for dia in range(-(-inicio_ms // MS_DIA), fin_ms // MS_DIA):
+                if restarRangos(dia * MS_DIA, (dia + 1) * MS_DIA, rangos):
+                    # Dia no consultado entero: se resume con sus puntos
+                    continue
+                # endif
+                if actual < dia * MS_DIA:
+                    partes.append(("puntos", actual, dia * MS_DIA))
+                # endif
+                partes.append(("dia", dia))
+                actual = (dia + 1) * MS_DIA
+            # endfor
+            if actual < fin_ms:
+                partes.append(("puntos", actual, fin_ms))
+            # endif
+            resultado = {}
+            cambios = False
+            for medida in indice.get("medidas", []):
+                dias = resumenes.setdefault(medida, {})
+                puntos = None
+                resumen = ResumenSerie()
+                for parte in partes:
+                    if parte[0] == "dia" and str(parte[1]) in dias:
+                        resumen.unir(ResumenSerie.desdeDict(dias[str(parte[1])]))
+                        continue
+                    # endif
+                    if puntos is None:
+                        puntos = ordenarSinDuplicados(*leerSegmentos(
+                            self._rutaMedida(dir_panel, medida))[:2])
+                    # endif
+                    tiempos, valores = puntos
+                    if parte[0] == "dia":
+                        desde, hasta = parte[1] * MS_DIA, (parte[1] + 1) * MS_DIA
+                    else:
+                        desde, hasta = parte[1], parte[2]
+                    # endif
+                    a = bisect_right(tiempos, desde)
+                    b = bisect_right(tiempos, hasta)
+                    parcial = resumirPuntos(zip(tiempos[a:b], valores[a:b]))
+                    if parte[0] == "dia":
+                        dias[str(parte[1])] = parcial.aDict()
+                        cambios = True
+                    # endif
+                    resumen.unir(parcial)
+                # endfor
+                resultado[medida] = resumen
+            # endfor
+            if cambios:
+                self._guardarResumenes(dir_panel, resumenes)
+            # endif
+            return resultado
+        finally:
+            candado.close()
+        # endtry
+    # endfunction
+# endclass
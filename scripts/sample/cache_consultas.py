@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# --------------------------------------------------------------------------------
+#
+#   Cache en disco de los resultados de las consultas a Grafana, direccionada
+#   por contenido: la clave es un hash del datasource, del texto final de las
+#   queries (ya con el rango sustituido) y del rango de tiempo. Asi varios
+#   informes que comparten paneles y ventana de tiempo solo consultan una vez.
+#
+#   El tamano total se limita expulsando las entradas usadas hace mas tiempo
+#   (LRU). Los resultados de rangos que terminan muy cerca del momento en que
+#   se guardaron pueden estar incompletos, por lo que caducan pronto.
+#
+#   Autor: Marc Llobera Villalonga
+#
+# --------------------------------------------------------------------------------
+
+import os
+import json
+import time
+import hashlib
+import threading
+from decodificador import compactarFrame, columnaAJson
+
+
+def claveConsulta(datasource, query_payload, rango):
+    # Hash de (datasource, queries finales, rango de tiempo en ms)
+    contenido = json.dumps({"datasource": datasource, "queries": query_payload["queries"],
+                            "rango": list(rango)}, sort_keys=True)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+# endfunction
+
+
+class CacheConsultas:
+    def __init__(self, directorio, max_bytes=512*1024*1024, omitir=False, margen_reciente_ms=10*60*1000, ttl_reciente=300):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        # Con omitir no se leen las entradas guardadas, pero si se guardan las
+        # nuevas (sirve para forzar que se refresquen)
+        self.omitir = omitir
+        self.margen_reciente_ms = margen_reciente_ms
+        self.ttl_reciente = ttl_reciente
+        self.lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.guardados = 0
+        self.expulsados = 0
+        os.makedirs(self.directorio, exist_ok=True)
+        self.bytes_totales = sum(tamano for _, _, tamano in self._entradas())
+    # endfunction
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, clave[:2], clave + ".json")
+    # endfunction
+
+    def _entradas(self):
+        # [(ultimo uso, ruta, tamano)] de todas las entradas en disco
+        entradas = []
+        for raiz, _, archivos in os.walk(self.directorio):
+            for nombre in archivos:
+                if not nombre.endswith(".json"):
+                    continue
+                # endif
+                ruta = os.path.join(raiz, nombre)
+                try:
+                    estado = os.stat(ruta)
+                except OSError:
+                    continue
+                # endtry
+                entradas.append((estado.st_mtime, ruta, estado.st_size))
+            # endfor
+        # endfor
+        return entradas
+    # endfunction
+
+    def obtener(self, clave):
+        # Devuelve la respuesta guardada o None si no esta (o ha caducado)
+        if self.omitir:
+            with self.lock:
+                self.fallos += 1
+            # endwith
+            return None
+        # endif
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, "r") as archivo:
+                entrada = json.load(archivo)
+            # endwith
+        except (OSError, ValueError):
+            entrada = None
+        # endtry
+        if entrada is not None and entrada.get("reciente") and time.time() - entrada.get("guardado", 0) > self.ttl_reciente:
+            entrada = None
+        # endif
+        with self.lock:
+            if entrada is None:
+                self.fallos += 1
+                return None
+            # endif
+            self.aciertos += 1
+        # endwith
+        try:
+            # La fecha de modificacion marca el ultimo uso para la expulsion LRU
+            os.utime(ruta)
+        except OSError:
+            pass
+        # endtry
+        query_data = entrada["datos"]
+        for resultado in query_data.get("results", {}).values():
+            for frame in resultado.get("frames", []):
+                compactarFrame(frame)
+            # endfor
+        # endfor
+        return query_data
+    # endfunction
+
+    def guardar(self, clave, query_data, fin_ms):
+        ruta = self._ruta(clave)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        ahora = time.time()
+        entrada = {"guardado": ahora,
+                   "reciente": fin_ms > ahora * 1000 - self.margen_reciente_ms,
+                   "datos": query_data}
+        temporal = ruta + ".%d.%d.tmp" % (os.getpid(), threading.get_ident())
+        with open(temporal, "w") as archivo:
+            json.dump(entrada, archivo, default=columnaAJson)
+        # endwith
+        tamano = os.path.getsize(temporal)
+        try:
+            anterior = os.path.getsize(ruta)
+        except OSError:
+            anterior = 0
+        # endtry
+        os.replace(temporal, ruta)
+        with self.lock:
+            self.guardados += 1
+            self.bytes_totales += tamano - anterior
+            if self.bytes_totales <= self.max_bytes:
+                return
+            # endif
+            self._expulsar()
+        # endwith
+    # endfunction
+
+    def _expulsar(self):
+        # Borra las entradas menos usadas hasta bajar del 90% del tamano maximo
+        entradas = sorted(self._entradas())
+        total = sum(tamano for _, _, tamano in entradas)
+        for _, ruta, tamano in entradas:
+            if total <= self.max_bytes * 0.9:
+                break
+            # endif
+            try:
+                os.remove(ruta)
+            except OSError:
+                continue
+            # endtry
+            total -= tamano
+            self.expulsados += 1
+        # endfor
+        self.bytes_totales = total
+    # endfunction
+
+    def resumen(self):
+        with self.lock:
+            consultas = self.aciertos + self.fallos
+            return {"aciertos": self.aciertos, "fallos": self.fallos,
+                    "tasa_aciertos": self.aciertos / consultas if consultas else 0.0,
+                    "guardados": self.guardados, "expulsados": self.expulsados,
+                    "bytes": self.bytes_totales}
+        # endwith
+    # endfunction
+# endclass
+
+
+# Caches compartidas por proceso (tambien entre peticiones del servidor Flask)
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def obtenerCache(directorio, **kwargs):
+    clave = os.path.abspath(directorio)
+    with _caches_lock:
+        if clave not in _caches:
+            _caches[clave] = CacheConsultas(directorio, **kwargs)
+        # endif
+        cache = _caches[clave]
+        # El indicador de omitir puede cambiar entre ejecuciones
+        cache.omitir = kwargs.get("omitir", cache.omitir)
+        return cache
+    # endwith
+# endfunction
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# --------------------------------------------------------------------------------
+#
+#   Cliente HTTP compartido para todas las llamadas a la API de Grafana. Usa
+#   una sesion con un pool de conexiones limitado (keep-alive), timeouts de
+#   conexion y lectura en cada peticion, reintentos con espera exponencial y
+#   jitter ante respuestas 429/5xx, y pide las respuestas comprimidas con gzip.
+#   Cuenta los bytes y la latencia de las peticiones para poder medir la
+#   mejora: el cliente lleva los totales del proceso y cada ejecucion de un
+#   informe los suyos a traves de una vista (ejecucion()), ya que el cliente es
+#   compartido por los informes que el servidor Flask genera a la vez.
+#
+#   Autor: Marc Llobera Villalonga
+#
+# --------------------------------------------------------------------------------
+
+import time
+import random
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+CODIGOS_REINTENTO = (429, 500, 502, 503, 504)
+
+
+class EstadisticasPeticiones:
+    # Totales acumulados de un conjunto de peticiones (memoria constante)
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.peticiones = 0
+        self.reintentos = 0
+        self.bytes_red = 0
+        self.bytes = 0
+        self.latencia_total = 0.0
+        self.latencia_max = 0.0
+    # endfunction
+
+    def anadir(self, bytes_red, bytes_datos, latencia, intentos):
+        with self.lock:
+            self.peticiones += 1
+            self.reintentos += intentos - 1
+            self.bytes_red += bytes_red
+            self.bytes += bytes_datos
+            self.latencia_total += latencia
+            self.latencia_max = max(self.latencia_max, latencia)
+        # endwith
+    # endfunction
+
+    def resumen(self):
+        with self.lock:
+            return {
+                "peticiones": self.peticiones,
+                "reintentos": self.reintentos,
+                "bytes_red": self.bytes_red,
+                "bytes": self.bytes,
+                "latencia_total": self.latencia_total,
+                "latencia_media": self.latencia_total / self.peticiones if self.peticiones else 0.0,
+                "latencia_max": self.latencia_max,
+            }
+        # endwith
+    # endfunction
+# endclass
+
+
+class ClienteGrafana:
+    def __init__(self, grafana_url, api_key, max_conexiones=10, timeout=(5, 120), reintentos=3, espera_base=0.5, espera_max=30):
+        self.grafana_url = grafana_url.rstrip("/")
+        self.timeout = timeout
+        self.reintentos = reintentos
+        self.espera_base = espera_base
+        self.espera_max = espera_max
+
+        self.sesion = requests.Session()
+        self.sesion.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+            "Accept-Encoding": "gzip",
+        })
+        # pool_block hace que nunca haya mas de max_conexiones abiertas a la vez
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=max_conexiones,
+                                pool_block=True, max_retries=0)
+        self.sesion.mount("http://", adaptador)
+        self.sesion.mount("https://", adaptador)
+
+        # Totales de todas las peticiones del proceso
+        self.estadisticas = EstadisticasPeticiones()
+    # endfunction
+
+    def _espera(self, intento, response):
+        # Respetar Retry-After si Grafana lo indica (solo en segundos)
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return min(float(retry_after), self.espera_max)
+            # endif
+        # endif
+        # Espera exponencial con "full jitter"
+        return random.uniform(0, min(self.espera_max, self.espera_base * (2 ** intento)))
+    # endfunction
+
+    def _registrar(self, response, inicio, intentos, estadisticas=None, bytes_datos=None):
+        # estadisticas: las de la ejecucion que hizo la peticion, ademas de
+        # los totales del cliente
+        latencia = time.perf_counter() - inicio
+        bytes_red = 0
+        if response is not None:
+            if bytes_datos is None:
+                bytes_datos = len(response.content)
+            # endif
+            try:
+                # Bytes leidos del socket (comprimidos si la respuesta venia en gzip)
+                bytes_red = response.raw.tell()
+            except (AttributeError, OSError):
+                bytes_red = bytes_datos
+            # endtry
+        # endif
+        self.estadisticas.anadir(bytes_red, bytes_datos or 0, latencia, intentos)
+        if estadisticas is not None:
+            estadisticas.anadir(bytes_red, bytes_datos or 0, latencia, intentos)
+        # endif
+    # endfunction
+
+    def peticion(self, metodo, ruta, estadisticas=None, **kwargs):
+        # Con stream=True el cuerpo no se lee aqui: hay que consumirlo con
+        # trozos(), que es quien registra los bytes y la latencia total
+        kwargs.setdefault("timeout", self.timeout)
+        stream = kwargs.get("stream", False)
+        url = self.grafana_url + ruta
+        inicio = time.perf_counter()
+        response = None
+        for intento in range(self.reintentos + 1):
+            error = None
+            try:
+                response = self.sesion.request(metodo, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                response = None
+                error = e
+            # endtry
+
+            if error is None and response.status_code not in CODIGOS_REINTENTO:
+                break
+            # endif
+            if intento == self.reintentos:
+                if error is not None:
+                    self._registrar(None, inicio, intento + 1, estadisticas)
+                    raise error
+                # endif
+                break
+            # endif
+            espera = self._espera(intento, response)
+            if response is not None:
+                # Devolver la conexion al pool antes de reintentar
+                response.close()
+            # endif
+            time.sleep(espera)
+        # endfor
+        if stream:
+            response.registro_grafana = (inicio, intento + 1, estadisticas)
+        else:
+            self._registrar(response, inicio, intento + 1, estadisticas)
+        # endif
+        return response
+    # endfunction
+
+    def trozos(self, response, tamano=64*1024):
+        # Lee el cuerpo de una respuesta pedida con stream=True por trozos
+        # (ya descomprimidos) y registra sus estadisticas al terminar
+        bytes_datos = 0
+        try:
+            for trozo in response.iter_content(tamano):
+                bytes_datos += len(trozo)
+                yield trozo
+            # endfor
+        finally:
+            response.bytes_leidos = bytes_datos
+            inicio, intentos, estadisticas = response.registro_grafana
+            self._registrar(response, inicio, intentos,
+                            estadisticas, bytes_datos)
+            response.close()
+        # endtry
+    # endfunction
+
+    def get(self, ruta, **kwargs):
+        return self.peticion("GET", ruta, **kwargs)
+    # endfunction
+
+    def post(self, ruta, **kwargs):
+        return self.peticion("POST", ruta, **kwargs)
+    # endfunction
+
+    def resumen(self):
+        # Totales del proceso (todas las ejecuciones)
+        return self.estadisticas.resumen()
+    # endfunction
+
+    def ejecucion(self):
+        # Vista del cliente para una ejecucion de un informe, con sus propias
+        # estadisticas y la misma sesion (y conexiones) que el resto
+        return EjecucionCliente(self)
+    # endfunction
+
+    def cerrar(self):
+        self.sesion.close()
+    # endfunction
+# endclass
+
+
+class EjecucionCliente:
+    def __init__(self, cliente):
+        self.cliente = cliente
+        self.estadisticas = EstadisticasPeticiones()
+    # endfunction
+
+    def peticion(self, metodo, ruta, **kwargs):
+        return self.cliente.peticion(metodo, ruta, estadisticas=self.estadisticas, **kwargs)
+    # endfunction
+
+    def trozos(self, response, tamano=64*1024):
+        return self.cliente.trozos(response, tamano)
+    # endfunction
+
+    def get(self, ruta, **kwargs):
+        return self.peticion("GET", ruta, **kwargs)
+    # endfunction
+
+    def post(self, ruta, **kwargs):
+        return self.peticion("POST", ruta, **kwargs)
+    # endfunction
+
+    def resumen(self):
+        # Solo las peticiones de esta ejecucion
+        return self.estadisticas.resumen()
+    # endfunction
+# endclass
+
+
+# Clientes compartidos por proceso: el mismo Grafana reutiliza siempre la misma
+# sesion (y sus conexiones abiertas), tambien entre peticiones del servidor Flask
+_clientes = {}
+_clientes_lock = threading.Lock()
+
+
+def obtenerCliente(grafana_url, api_key, **kwargs):
+    clave = (grafana_url.rstrip("/"), api_key)
+    with _clientes_lock:
+        if clave not in _clientes:
+            _clientes[clave] = ClienteGrafana(grafana_url, api_key, **kwargs)
+        # endif
+        return _clientes[clave]
+    # endwith
+# endfunction
+
+
+def cerrarClientes():
+    with _clientes_lock:
+        for cliente in _clientes.values():
+            cliente.cerrar()
+        # endfor
+        _clientes.clear()
+    # endwith
+# endfunction
@@ -20,9 +20,55 @@ INFORMES_DIR = "/[root]/Grafana-Data-Report/informes/"+TITULO+"/"
 
 IMG = "/[root]/Grafana-Data-Report/scripts/assets/[sample].png"
 DATA_DIR = "/[root]/Grafana-Data-Report/scripts/"+TITULO+"/data/"
+# Guardar tambien el JSON de cada respuesta de Grafana y el CSV de datos de cada panel en
+# DATA_DIR (archivo/depuracion). El informe se crea igual sin ellos
+GUARDAR_JSON = False
+GUARDAR_CSV = False
+# Guardar en DATA_DIR la tabla binaria de datos de cada panel (output_data_*.tbl) para poder
+# regenerar el informe sin Grafana con: informe.py --sin-grafana
+GUARDAR_TABLAS = True
+# Cache de metadatos de los dashboards (TTL en segundos)
+CACHE_DIR = "/[root]/Grafana-Data-Report/scripts/"+TITULO+"/cache/"
+CACHE_TTL_DASHBOARDS = 3600
+# Cache de resultados de consultas compartida entre informes (tamano maximo en MB, 0 para desactivarla).
+# Su directorio no depende de TITULO para que todos los informes usen la misma.
+# CACHE_CONSULTAS_OMITIR fuerza a repetir las consultas (guardando los resultados nuevos) y
+# CACHE_CONSULTAS_ALINEACION redondea el rango del informe a multiplos de esos segundos
+CACHE_CONSULTAS_DIR = "/[root]/Grafana-Data-Report/scripts/cache_consultas/"
+CACHE_CONSULTAS_MB = 512
+CACHE_CONSULTAS_OMITIR = False
+CACHE_CONSULTAS_ALINEACION = 60
+# Almacen local de series: solo se piden a Grafana los rangos que faltan ("" para desactivarlo)
+ALMACEN_DIR = "/[root]/Grafana-Data-Report/scripts/"+TITULO+"/almacen/"
+ALMACEN_RETENCION_DIAS = 90
 # Informacion de autenticacion y URL base de Grafana
 GRAFANA_URL = "http://[IP]:[PORT]"
 API_KEY = ""
+# Conexiones maximas abiertas con Grafana, timeouts (conexion, lectura) en segundos y reintentos
+GRAFANA_MAX_CONEXIONES = 10
+GRAFANA_TIMEOUT = (5, 120)
+GRAFANA_REINTENTOS = 3
+# Consultas simultaneas a Grafana en total y por cada datasource
+GRAFANA_CONSULTAS_PARALELAS = 8
+GRAFANA_CONSULTAS_POR_DATASOURCE = 4
+# Agrupar las consultas de todos los paneles de un dashboard en una sola peticion
+GRAFANA_AGRUPAR_CONSULTAS = False
+GRAFANA_MAX_CONSULTAS_LOTE = 20
+# Dividir los rangos largos en tramos de estas horas consultados en paralelo (0 para desactivarlo).
+# Con GRAFANA_TRAMO_ADAPTATIVO el tramo de cada datasource se ajusta a los objetivos de tiempo y tamano
+GRAFANA_TRAMO_HORAS = 24
+GRAFANA_TRAMO_ADAPTATIVO = True
+GRAFANA_TRAMO_SEGUNDOS_OBJETIVO = 10
+GRAFANA_TRAMO_MB_OBJETIVO = 20
+# Puntos por serie que se piden a Grafana segun el tamano del grafico (P/M/G); {} para pedir todos
+GRAFANA_PUNTOS_GRAFICO = {"P": 600, "M": 1200, "G": 1200}
+# Puntos maximos de cada grafico del excel segun su tamano ({} para no reducir), metodo de
+# reduccion ("LTTB" o "MINMAX") y si se anade una hoja con todos los datos sin reducir
+GRAFICO_MAX_PUNTOS = {"P": 600, "M": 1200, "G": 1200}
+GRAFICO_REDUCCION = "LTTB"
+GRAFICO_HOJA_COMPLETA = False
+# Escribir las hojas de datos en streaming (las filas van a disco al crearlas)
+HOJAS_DATOS_STREAMING = True
 
 # Indica el rango de dias desde hoy para el que se quieren recoger datos de Grafana
 DAYS = 7
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# --------------------------------------------------------------------------------
+#
+#   Decodificador incremental de las respuestas de /api/ds/query. Lee el cuerpo
+#   de la respuesta por trozos a medida que llega y va extrayendo cada frame en
+#   cuanto se completa, convirtiendo sus columnas en arrays compactos (tiempos
+#   en int64 y valores en float64, con NaN en lugar de null). Como texto solo
+#   se tiene el frame en curso, nunca el documento JSON completo.
+#
+#   Los frames decodificados si se acumulan en el resultado hasta el final de
+#   la respuesta: el almacen solo da un rango por cubierto si la respuesta
+#   entera es correcta, la cache guarda la respuesta completa y la tabla del
+#   panel necesita todas sus series. El pico de memoria es por tanto la
+#   respuesta decodificada (unos 16 bytes por punto en los arrays), no un
+#   frame, pero muy por debajo del JSON y de sus objetos de Python.
+#
+#   El resultado tiene la misma forma que la respuesta original:
+#   {"results": {refId: {"frames": [frame, ...], "status": ..., "error": ...}}}
+#   Los campos de cada refId distintos de frames (status, error...) son
+#   pequenos y se decodifican tal cual; el resto del documento se ignora.
+#
+#   Autor: Marc Llobera Villalonga
+#
+# --------------------------------------------------------------------------------
+
+import re
+import json
+import codecs
+from array import array
+
+NAN = float("nan")
+
+# Caracteres que cambian la estructura del documento
+RE_ESTRUCTURA = re.compile(r'[{}\[\]",:]')
+# Dentro de un valor solo importan la profundidad, las cadenas y las comas
+RE_VALOR = re.compile(r'[{}\[\]",]')
+# Dentro de un frame solo importan la profundidad y las cadenas
+RE_CAPTURA = re.compile(r'[{}\[\]"]')
+# Resto de una cadena JSON (desde despues de la comilla inicial)
+RE_FIN_CADENA = re.compile(r'(?:[^"\\]|\\.)*"', re.DOTALL)
+# Caracteres de una cadena hasta la siguiente comilla o barra invertida
+RE_CUERPO_CADENA = re.compile(r'[^"\\]*')
+
+
+def compactarColumna(columna, es_tiempo):
+    try:
+        if es_tiempo:
+            return array("q", columna)
+        # endif
+        if None not in columna:
+            return array("d", columna)
+        # endif
+        return array("d", [NAN if v is None else v for v in columna])
+    except (TypeError, ValueError, OverflowError):
+        # Columna no numerica (por ejemplo etiquetas): se deja como lista
+        return columna
+    # endtry
+# endfunction
+
+
+def compactarFrame(frame):
+    values = frame.get("data", {}).get("values", [])
+    frame.setdefault("data", {})["values"] = [
+        compactarColumna(columna, i == 0) for i, columna in enumerate(values)]
+    return frame
+# endfunction
+
+
+def columnaAJson(objeto):
+    # Para json.dump de respuestas decodificadas: arrays -> listas, NaN -> null
+    if isinstance(objeto, array):
+        if objeto.typecode == "d":
+            return [None if v != v else v for v in objeto]
+        # endif
+        return list(objeto)
+    # endif
+    raise TypeError(f"Tipo no serializable: {type(objeto).__name__}")
+# endfunction
+
+
+def finValor(texto, i):
+    # Posicion de la coma o llave que cierra el valor JSON que empieza en i
+    # (o None si el valor sigue en el siguiente trozo)
+    profundidad = 0
+    while True:
+        m = RE_VALOR.search(texto, i)
+        if m is None:
+            return None
+        # endif
+        c = m.group()
+        if c == '"':
+            fin = RE_FIN_CADENA.match(texto, m.end())
+            if fin is None:
+                return None
+            # endif
+            i = fin.end()
+            continue
+        # endif
+        if c in "{[":
+            profundidad += 1
+        elif profundidad == 0:
+            return m.start()
+        elif c in "}]":
+            profundidad -= 1
+        # endif
+        i = m.end()
+    # endwhile
+# endfunction
+
+
+class DecodificadorRespuesta:
+    def __init__(self):
+        # Texto pendiente fuera de los frames (pequeno: solo la estructura)
+        self.buffer = ""
+        # Pila de contenedores abiertos: [tipo ("obj"/"arr"), ultima clave, esperando clave]
+        self.pila = []
+        # Trozos del frame que se esta capturando (None si no hay captura)
+        self.piezas = None
+        self.profundidad = 0
+        self.en_cadena = False
+        self.escape = False
+        self.resultado = {"results": {}}
+    # endfunction
+
+    def _enFrames(self):
+        # root["results"][refId]["frames"][i]
+        return (len(self.pila) == 4 and self.pila[0][1] == "results"
+                and self.pila[2][1] == "frames" and self.pila[3][0] == "arr")
+    # endfunction
+
+    def _enCampoResultado(self):
+        # root["results"][refId][clave] con clave distinta de "frames"
+        return (len(self.pila) == 3 and self.pila[0][1] == "results"
+                and self.pila[2][0] == "obj" and self.pila[2][1] != "frames")
+    # endfunction
+
+    def _resultadoRef(self, ref_id):
+        return self.resultado["results"].setdefault(ref_id, {"frames": []})
+    # endfunction
+
+    def _escanearCaptura(self, texto, i):
+        # Avanza por el frame en captura; devuelve la posicion siguiente a su
+        # llave de cierre o None si el frame continua en el siguiente trozo
+        n = len(texto)
+        while i < n:
+            if self.en_cadena:
+                if self.escape:
+                    i += 1
+                    self.escape = False
+                    continue
+                # endif
+                i = RE_CUERPO_CADENA.match(texto, i).end()
+                if i >= n:
+                    break
+                # endif
+                if texto[i] == "\\":
+                    self.escape = True
+                else:
+                    self.en_cadena = False
+                # endif
+                i += 1
+                continue
+            # endif
+            m = RE_CAPTURA.search(texto, i)
+            if m is None:
+                break
+            # endif
+            i = m.end()
+            c = m.group()
+            if c == '"':
+                self.en_cadena = True
+            elif c in "{[":
+                self.profundidad += 1
+            else:
+                self.profundidad -= 1
+                if self.profundidad == 0:
+                    return i
+                # endif
+            # endif
+        # endwhile
+        return None
+    # endfunction
+
+    def _cerrarFrame(self, completados):
+        frame = compactarFrame(json.loads("".join(self.piezas)))
+        self.piezas = None
+        ref_id = self.pila[1][1]
+        self._resultadoRef(ref_id)["frames"].append(frame)
+        completados.append((ref_id, frame))
+    # endfunction
+
+    def alimentar(self, texto):
+        # Procesa un trozo de texto y devuelve los frames completados: [(refId, frame)]
+        completados = []
+        if self.piezas is not None:
+            fin = self._escanearCaptura(texto, 0)
+            if fin is None:
+                self.piezas.append(texto)
+                return completados
+            # endif
+            self.piezas.append(texto[:fin])
+            self._cerrarFrame(completados)
+            texto = texto[fin:]
+        # endif
+
+        buffer = self.buffer + texto
+        pos = 0
+        while True:
+            m = RE_ESTRUCTURA.search(buffer, pos)
+            if m is None:
+                pos = len(buffer)
+                break
+            # endif
+            c = m.group()
+            if c == '"':
+                fin = RE_FIN_CADENA.match(buffer, m.end())
+                if fin is None:
+                    # Cadena incompleta: esperar al siguiente trozo
+                    pos = m.start()
+                    break
+                # endif
+                pos = fin.end()
+                if self.pila and self.pila[-1][0] == "obj" and self.pila[-1][2]:
+                    self.pila[-1][1] = json.loads(buffer[m.start():pos])
+                    self.pila[-1][2] = False
+                # endif
+                continue
+            # endif
+            pos = m.end()
+            if c == ":":
+                if self._enCampoResultado():
+                    # Campo del refId (status, error...): se lee entero
+                    fin = finValor(buffer, pos)
+                    if fin is None:
+                        pos = m.start()
+                        break
+                    # endif
+                    self._resultadoRef(self.pila[1][1])[self.pila[2][1]] = json.loads(buffer[pos:fin])
+                    pos = fin
+                # endif
+            elif c == ",":
+                if self.pila and self.pila[-1][0] == "obj":
+                    self.pila[-1][2] = True
+                # endif
+            elif c == "{" and self._enFrames():
+                # Empieza un frame: se captura entero y se decodifica de golpe
+                self.profundidad = 1
+                self.en_cadena = False
+                self.escape = False
+                fin = self._escanearCaptura(buffer, pos)
+                if fin is None:
+                    self.piezas = [buffer[m.start():]]
+                    self.buffer = ""
+                    return completados
+                # endif
+                self.piezas = [buffer[m.start():fin]]
+                self._cerrarFrame(completados)
+                pos = fin
+            elif c == "{":
+                self.pila.append(["obj", None, True])
+            elif c == "[":
+                self.pila.append(["arr", None, False])
+            else:
+                if len(self.pila) == 3 and self.pila[0][1] == "results" and c == "}":
+                    # Fin del resultado de un refId (puede no tener frames)
+                    self._resultadoRef(self.pila[1][1])
+                # endif
+                if self.pila:
+                    self.pila.pop()
+                # endif
+            # endif
+        # endwhile
+
+        # Descartar lo ya procesado
+        self.buffer = buffer[pos:]
+        return completados
+    # endfunction
+# endclass
+
+
+def decodificarRespuesta(trozos):
+    # trozos: iterable de bytes (por ejemplo response.iter_content)
+    decodificador = DecodificadorRespuesta()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    for trozo in trozos:
+        decodificador.alimentar(utf8.decode(trozo))
+    # endfor
+    decodificador.alimentar(utf8.decode(b"", final=True))
+    return decodificador.resultado
+# endfunction
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# --------------------------------------------------------------------------------
+#
+#   Estadisticas de una serie acumuladas en una sola pasada: numero de puntos,
+#   suma, media, maximo y minimo con su tiempo (primera aparicion) y primer y
+#   ultimo punto. Se rellenan a la vez que se construye la tabla de datos del
+#   panel y los bloques MAXMIN/TABLA del informe las leen directamente. Como
+#   en la hoja de datos, donde se escriben como 0.0, los huecos de una
+#   columna cuentan como 0.
+#
+#   Autor: Marc Llobera Villalonga
+#
+# --------------------------------------------------------------------------------
+
+
+class EstadisticasSerie:
+    __slots__ = ("n", "suma", "maximo", "t_maximo", "minimo", "t_minimo",
+                 "primero", "t_primero", "ultimo", "t_ultimo")
+
+    def __init__(self):
+        self.n = 0
+        self.suma = 0
+        self.maximo = self.t_maximo = None
+        self.minimo = self.t_minimo = None
+        self.primero = self.t_primero = None
+        self.ultimo = self.t_ultimo = None
+    # endfunction
+
+    def anadir(self, t, v):
+        # Punto (tiempo en ms, valor) en orden de tiempo
+        if self.n == 0:
+            self.maximo = self.minimo = self.primero = v
+            self.t_maximo = self.t_minimo = self.t_primero = t
+        elif v > self.maximo:
+            self.maximo = v
+            self.t_maximo = t
+        elif v < self.minimo:
+            self.minimo = v
+            self.t_minimo = t
+        # endif
+        self.ultimo = v
+        self.t_ultimo = t
+        self.n += 1
+        self.suma += v
+    # endfunction
+
+    @property
+    def media(self):
+        return self.suma / self.n if self.n else None
+    # endfunction
+
+    @classmethod
+    def desdeColumna(cls, tiempos, valores, validos):
+        # Estadisticas de una columna de TablaColumnas (los huecos como 0)
+        estadisticas = cls()
+        for t, v, valido in zip(tiempos, valores, validos):
+            estadisticas.anadir(t, v if valido else 0)
+        # endfor
+        return estadisticas
+    # endfunction
+# endclass
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# --------------------------------------------------------------------------------
+#
+#   Registro de estilos de la hoja del informe. Los estilos de las celdas
+#   (cabecera, titulo de dashboard, celdas de las tablas y una variante por
+#   cada color de serie) se registran una sola vez por libro como NamedStyle y
+#   se aplican por nombre, en vez de crear Font/PatternFill/Border/Alignment
+#   y asignarlos por separado en cada celda.
+#
+#   Autor: Marc Llobera Villalonga
+#
+# --------------------------------------------------------------------------------
+
+from copy import copy
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+from openpyxl.styles.fonts import DEFAULT_FONT
+
+# Colores de las filas de las tablas de los extras (uno por serie)
+COLORES_TABLA = ["ff4d4d", "4dff4d", "4d4dff",
+                 "4dffff", "ff4dff", "ffc04d", "cd00cd"]
+
+ESTILO_CABECERA = "cabecera"
+ESTILO_CENTRADO = "centrado"
+ESTILO_TITULO_DASHBOARD = "titulo_dashboard"
+ESTILO_TABLA = "tabla"
+
+
+def _centrado():
+    return Alignment(horizontal="center", vertical="center")
+# endfunction
+
+
+def _estiloTabla(nombre, color=None):
+    # Celda de tabla: fuente de tamano 8, centrada y con borde fino
+    lado = Side(style="thin")
+    estilo = NamedStyle(name=nombre, font=Font(size=8), alignment=_centrado(),
+                        border=Border(left=lado, right=lado, top=lado, bottom=lado))
+    if color is not None:
+        estilo.fill = PatternFill(
+            start_color=color, end_color=color, fill_type="solid")
+    # endif
+    return estilo
+# endfunction
+
+
+def registrarEstilos(wb):
+    # Anade al libro los estilos del informe (NamedStyle nuevos por libro)
+    estilos = [NamedStyle(name=ESTILO_CABECERA, font=Font(bold=True, size=14), alignment=_centrado()),
+               NamedStyle(name=ESTILO_CENTRADO, font=copy(DEFAULT_FONT),
+                          alignment=_centrado()),
+               NamedStyle(name=ESTILO_TITULO_DASHBOARD, font=Font(color="FFFFFF", bold=True),
+                          fill=PatternFill(start_color="6BB9AE", end_color="6BB9AE", fill_type="solid")),
+               _estiloTabla(ESTILO_TABLA)]
+    estilos += [_estiloTabla(estiloTabla(color), color)
+                for color in COLORES_TABLA]
+    for estilo in estilos:
+        if estilo.name not in wb.named_styles:
+            wb.add_named_style(estilo)
+        # endif
+    # endfor
+# endfunction
+
+
+def estiloTabla(color=None):
+    # Nombre del estilo de celda de tabla (con el relleno de un color de serie)
+    if color is None:
+        return ESTILO_TABLA
+    # endif
+    return f"{ESTILO_TABLA}_{color.lower()}"
+# endfunction
+
+
+def aplicarEstiloRango(hoja, rango, estilo):
+    # Aplica un estilo registrado a todas las celdas del rango (una asignacion por celda)
+    for fila in hoja[rango]:
+        for celda in fila:
+            celda.style = estilo
+        # endfor
+    # endfor
+# endfunction
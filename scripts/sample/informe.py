@@ -3,8 +3,8 @@
 
 # --------------------------------------------------------------------------------
 #
-#   Script para crear un informe excel (además de recojer datos en bruto en
-#   archivos .cvs y .json) a partir de los datos monitorizados en Grafana.
+#   Script para crear un informe excel (además de recojer, si se indica, datos
+#   en bruto en archivos .cvs y .json) a partir de los datos monitorizados en Grafana.
 #   El informe se crea a partir de la configuración introducida en el
 #   archivo config.py en el mismo directorio que este script.
 #
@@ -13,10 +13,14 @@
 # --------------------------------------------------------------------------------
 
 import os
-import requests
+import sys
 import json
+import copy
+import hashlib
+import time
 import csv
 import math
+import functools
 from datetime import datetime, timedelta
 import tkinter as tk
 from tkinter import messagebox
@@ -24,7 +28,6 @@ import re
 from openpyxl import Workbook
 from openpyxl.utils import get_column_letter
 from openpyxl.utils.units import pixels_to_EMU
-from openpyxl.styles import Alignment, Font, PatternFill, Border, Side
 from openpyxl.chart import Reference, BarChart, LineChart
 from openpyxl.chart.text import RichText
 from openpyxl.chart.layout import Layout, ManualLayout
@@ -36,6 +39,22 @@ from openpyxl.drawing.colors import ColorChoice
 from openpyxl.drawing.spreadsheet_drawing import AbsoluteAnchor
 from openpyxl.drawing.xdr import XDRPoint2D, XDRPositiveSize2D
 import config
+from metadatos import CacheDashboards
+from cliente_grafana import obtenerCliente
+from planificador import PlanificadorConsultas
+from almacen import AlmacenSeries
+from tramos import TamanoTramos, dividirRango, tramoAlineado, unirRespuestas
+from decodificador import decodificarRespuesta, columnaAJson
+from cache_consultas import claveConsulta, obtenerCache
+from resolucion import ajustarConsulta
+from reduccion import seleccionarIndices
+from tabla import TablaColumnas
+from minutos import MS_MINUTO, etiquetaMinuto
+from resumenes import resumirSeries
+from estilos import COLORES_TABLA, ESTILO_CABECERA, ESTILO_CENTRADO, ESTILO_TITULO_DASHBOARD, ESTILO_TABLA, \
+    registrarEstilos, estiloTabla, aplicarEstiloRango
+from libro_streaming import crearHojaStreaming, guardarLibro
+from maquetacion import EXTRAS_TABLA, planificarInforme
 
 # Importamos la configuracion de config.py
 ACTIVAR_SELECCION_RANGO_DE_FECHAS = config.ACTIVAR_SELECCION_RANGO_DE_FECHAS
@@ -56,8 +75,57 @@ TIEMPO_INICIAL = timedelta(days=config.DAYS)
 TIME_FINISH = datetime.utcnow().isoformat() + "Z"
 TIME_START = (datetime.utcnow() - TIEMPO_INICIAL).isoformat() + "Z"
 
+GRAFANA_MAX_CONEXIONES = getattr(config, "GRAFANA_MAX_CONEXIONES", 10)
+GRAFANA_TIMEOUT = getattr(config, "GRAFANA_TIMEOUT", (5, 120))
+GRAFANA_REINTENTOS = getattr(config, "GRAFANA_REINTENTOS", 3)
+
+GRAFANA_CONSULTAS_PARALELAS = getattr(config, "GRAFANA_CONSULTAS_PARALELAS", 8)
+GRAFANA_CONSULTAS_POR_DATASOURCE = getattr(
+    config, "GRAFANA_CONSULTAS_POR_DATASOURCE", 4)
+GRAFANA_AGRUPAR_CONSULTAS = getattr(config, "GRAFANA_AGRUPAR_CONSULTAS", False)
+GRAFANA_MAX_CONSULTAS_LOTE = getattr(config, "GRAFANA_MAX_CONSULTAS_LOTE", 20)
+GRAFANA_TRAMO_HORAS = getattr(config, "GRAFANA_TRAMO_HORAS", 0)
+GRAFANA_TRAMO_ADAPTATIVO = getattr(config, "GRAFANA_TRAMO_ADAPTATIVO", True)
+GRAFANA_TRAMO_SEGUNDOS_OBJETIVO = getattr(
+    config, "GRAFANA_TRAMO_SEGUNDOS_OBJETIVO", 10)
+GRAFANA_TRAMO_MB_OBJETIVO = getattr(config, "GRAFANA_TRAMO_MB_OBJETIVO", 20)
+GRAFANA_PUNTOS_GRAFICO = getattr(
+    config, "GRAFANA_PUNTOS_GRAFICO", {"P": 600, "M": 1200, "G": 1200})
+
+GRAFICO_MAX_PUNTOS = getattr(config, "GRAFICO_MAX_PUNTOS", {
+                             "P": 600, "M": 1200, "G": 1200})
+GRAFICO_REDUCCION = getattr(config, "GRAFICO_REDUCCION", "LTTB")
+HOJAS_DATOS_STREAMING = getattr(config, "HOJAS_DATOS_STREAMING", True)
+GRAFICO_HOJA_COMPLETA = getattr(config, "GRAFICO_HOJA_COMPLETA", False)
+
+CACHE_DIR = getattr(config, "CACHE_DIR", os.path.join(DATA_DIR, "cache"))
+CACHE_TTL_DASHBOARDS = getattr(config, "CACHE_TTL_DASHBOARDS", 3600)
+
+ALMACEN_DIR = getattr(config, "ALMACEN_DIR", "")
+ALMACEN_RETENCION_DIAS = getattr(config, "ALMACEN_RETENCION_DIAS", 90)
+
+# Por defecto la cache de consultas es una sola para todos los informes (junto
+# a sus directorios) y no una por informe
+CACHE_CONSULTAS_DIR = getattr(config, "CACHE_CONSULTAS_DIR", os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache_consultas"))
+CACHE_CONSULTAS_MB = getattr(config, "CACHE_CONSULTAS_MB", 512)
+CACHE_CONSULTAS_OMITIR = getattr(config, "CACHE_CONSULTAS_OMITIR", False)
+CACHE_CONSULTAS_ALINEACION = getattr(config, "CACHE_CONSULTAS_ALINEACION", 60)
+
+GUARDAR_JSON = getattr(config, "GUARDAR_JSON", False)
+GUARDAR_CSV = getattr(config, "GUARDAR_CSV", False)
+GUARDAR_TABLAS = getattr(config, "GUARDAR_TABLAS", True)
+# Lo fija main(sin_disco=...): sin archivos intermedios (JSON, CSV, tablas) ni
+# hojas de datos en archivos temporales
+SIN_DISCO = False
+
 DATA_JSON_NAME = "query_data_"
 DATA_CSV_NAME = "output_data_"
+DATA_TABLA_NAME = "output_data_"
+DATA_TABLA_EXT = ".tbl"
+
+# Extras que usan los resumenes de las series (percentiles y ciclo de trabajo)
+EXTRAS_RESUMEN = ["PERCENTILES", "CICLO"]
 
 DEBUG_0 = DEBUG_FINAL
 DEBUG_1 = DEBUG_FINAL
@@ -69,6 +137,10 @@ ALTO_CELDA = 0.53  # cm
 ANCHOPX_CELDA = 18  # px
 ALTOPX_CELDA = 20  # px
 
+# Colores de las series de los graficos (rotan un color por panel del dashboard)
+COLORES_SERIES = ["FF0000", "00FF00", "0000FF",
+                  "00FFFF", "FF00FF", "FFA500", "800080"]
+
 ################################################# POP-UP RANGO DE FECHAS #################################################
 
 
@@ -177,26 +249,71 @@ def mostrar_popup():
 ################################################# Obtener datos de Grafana #################################################
 
 
-def obtenerDatosGrafana(data_dir, grafana_url, api_key, dashboard_uid, panels):
-    for panel_id in panels:
-        url = f"{grafana_url}/api/dashboards/uid/{dashboard_uid}"
-        header = {
-            "Authorization": f"Bearer {api_key}",
-            "Accept": "application/json",
-            "Content-Type": "application/json",
-        }
-        query_data = None
-        # Hacer la solicitud para obtener la metadata del dashboard
-        response = requests.get(url, headers=header)
+def obtenerClienteGrafana(grafana_url=GRAFANA_URL, api_key=API_KEY):
+    # Cliente compartido por toda la ejecucion (y entre peticiones del servidor Flask)
+    return obtenerCliente(grafana_url, api_key, max_conexiones=GRAFANA_MAX_CONEXIONES,
+                          timeout=GRAFANA_TIMEOUT, reintentos=GRAFANA_REINTENTOS)
+# endfunction
 
-        # Verificar la respuesta
-        if response.status_code == 200:
-            data = response.json()
 
-            # Buscar el panel con el PANEL_ID indicado
-            dashboard_panels = data.get("dashboard", {}).get("panels", [])
-            panel_metadata = next(
-                (panel for panel in dashboard_panels if panel.get("id") == panel_id), None,)
+def obtenerCacheConsultas():
+    # Cache de resultados compartida por todos los informes del proceso (None si esta desactivada)
+    if CACHE_CONSULTAS_MB <= 0:
+        return None
+    # endif
+    return obtenerCache(CACHE_CONSULTAS_DIR, max_bytes=CACHE_CONSULTAS_MB*1024*1024,
+                        omitir=CACHE_CONSULTAS_OMITIR)
+# endfunction
+
+
+def alinearRango(inicio, fin, segundos):
+    # Redondea hacia abajo los extremos (ISO) a multiplos de segundos
+    if segundos <= 0:
+        return inicio, fin
+    # endif
+    paso = segundos * 1000
+    return msAIso(isoAMs(inicio) // paso * paso), msAIso(isoAMs(fin) // paso * paso)
+# endfunction
+
+
+def alinearVentana(segundos):
+    # Redondea hacia abajo el rango del informe a multiplos de segundos para
+    # que informes lanzados en momentos distintos hagan las mismas consultas
+    global TIME_FINISH, TIME_START
+    TIME_START, TIME_FINISH = alinearRango(TIME_START, TIME_FINISH, segundos)
+# endfunction
+
+
+def ventanaInforme(alineacion=0):
+    # (TIME_START, TIME_FINISH) de un informe lanzado ahora: los ultimos
+    # config.DAYS dias, alineados a multiplos de alineacion segundos
+    ahora = datetime.utcnow()
+    return alinearRango((ahora - TIEMPO_INICIAL).isoformat() + "Z", ahora.isoformat() + "Z", alineacion)
+# endfunction
+
+
+def claveDatasource(datasource):
+    # Grafana guarda el datasource como {"type": ..., "uid": ...} o, en
+    # dashboards antiguos, solo con su nombre
+    if isinstance(datasource, dict):
+        return datasource.get("uid") or datasource.get("type")
+    # endif
+    return str(datasource)
+# endfunction
+
+
+def prepararConsultas(dashboard_uid, panels, cache_dashboards):
+    # Devuelve una lista de (panel_id, datasource, query_payload) con las
+    # consultas de los paneles configurados del dashboard
+    consultas = []
+    # Obtener la metadata del dashboard una sola vez para todos sus paneles
+    dashboard = cache_dashboards.obtener(dashboard_uid)
+
+    for panel_id in panels:
+        # Verificar la respuesta
+        if dashboard is not None:
+            # Buscar el panel con el PANEL_ID indicado (tambien dentro de filas)
+            panel_metadata = cache_dashboards.panel(dashboard_uid, panel_id)
 
             if panel_metadata:
                 if DEBUG_0:
@@ -206,23 +323,33 @@ def obtenerDatosGrafana(data_dir, grafana_url, api_key, dashboard_uid, panels):
 
                 # Extraer la fuente de datos y las consultas del panel
                 datasource = panel_metadata.get("datasource", None)
-                targets = panel_metadata.get("targets", None)
+                # Copia para no modificar la metadata guardada en la cache
+                targets = copy.deepcopy(panel_metadata.get("targets", None))
 
                 if datasource and targets:
-                    # Ahora ejecutar la consulta contra el datasource usando la API de Grafana
-                    datasource_URL = f"{grafana_url}/api/ds/query"
-
                     # Construir el payload para la consulta
                     query_payload = {
                         "queries": targets
                     }
 
+                    # Puntos que caben en el grafico del panel segun su tamano
+                    puntos = None
+                    if GRAFANA_PUNTOS_GRAFICO:
+                        puntos = GRAFANA_PUNTOS_GRAFICO.get(
+                            panels.get(panel_id)[2])
+                    # endif
+
                     for query in query_payload["queries"]:
-                        if "query" in query:
-                            # Reemplazar el rango de tiempo en la query
-                            query["query"] = str(query["query"]).replace(
-                                "range(start: v.timeRangeStart, stop:v.timeRangeStop)", f"range(start: {TIME_START}, stop:{TIME_FINISH})"
-                            )
+                        if puntos:
+                            # Grafana devuelve los datos ya reducidos a la resolucion del grafico
+                            if "query" in query:
+                                query["query"] = str(query["query"])
+                            # endif
+                            ajustarConsulta(query, isoAMs(TIME_FINISH) - isoAMs(TIME_START), puntos,
+                                            binario=panels.get(panel_id)[3])
+                        elif "query" in query:
+                            # El rango de tiempo se sustituye al lanzar la consulta
+                            query["query"] = str(query["query"])
                             if DAYS != 0:
                                 frc = math.ceil((DAYS*24*60)/1001)
                                 # No son datos binarios
@@ -239,39 +366,8 @@ def obtenerDatosGrafana(data_dir, grafana_url, api_key, dashboard_uid, panels):
                         print(f"\Query: {str(query)}")
                     # endif
 
-                    # Ejecutar la consulta
-                    query_response = requests.post(
-                        datasource_URL, headers=header, json=query_payload)
-
-                    # Verificar la respuesta de la consulta
-                    if query_response.status_code == 200 or query_response.status_code == 400:
-                        query_data = query_response.json()
-
-                        # Guardar el JSON en un archivo
-                        file_path_data_json = os.path.join(
-                            data_dir, DATA_JSON_NAME + panels.get(panel_id)[0]+".json")
-                        with open(file_path_data_json, "w") as archivo:
-                            json.dump(query_data, archivo)
-                        if DEBUG_1:
-                            print("\nRespuesta obtenida correctamente")
-                            # El json obtenido
-                            # Convertir el JSON a una cadena formateada
-                            json_str = json.dumps(query_data, indent=2)
-
-                            # Dividir la cadena en lineas
-                            lines = json_str.splitlines()
-
-                            # Tomar las primeras 50 lineas
-                            first_50_lines = lines[:50]
-
-                            # Unir las lineas de nuevo en una cadena
-                            result = "\n".join(first_50_lines)
-                            print("\nDatos obtenidos de la consulta:", result)
-                        # endif
-                    else:
-                        print(
-                            f"\nError {query_response.status_code}: {query_response.text}")
-                    # endif
+                    consultas.append(
+                        (panel_id, claveDatasource(datasource), query_payload))
                 else:
                     print(
                         "\nNo se encontro el datasource o las consultas asociadas al panel.")
@@ -281,8 +377,345 @@ def obtenerDatosGrafana(data_dir, grafana_url, api_key, dashboard_uid, panels):
             # endif
         else:
             print(
-                f"\nError {response.status_code}: No se pudieron obtener los datos del dashboard")
+                f"\nNo se pudieron obtener los datos del dashboard {dashboard_uid}")
+        # endif
+    # endfor
+    return consultas
+# endfunction
+
+
+def aplicarRango(query_payload, time_start, time_finish):
+    # Copia del payload con el rango de tiempo de Grafana sustituido
+    queries = []
+    for query in query_payload["queries"]:
+        query = dict(query)
+        if "query" in query:
+            # Reemplazar el rango de tiempo en la query
+            query["query"] = query["query"].replace(
+                "range(start: v.timeRangeStart, stop:v.timeRangeStop)", f"range(start: {time_start}, stop:{time_finish})"
+            )
+        # endif
+        queries.append(query)
+    # endfor
+    return {"queries": queries}
+# endfunction
+
+
+def isoAMs(fecha_iso):
+    return int(datetime.fromisoformat(fecha_iso.replace("Z", "+00:00")).timestamp() * 1000)
+# endfunction
+
+
+def msAIso(ms):
+    return datetime.utcfromtimestamp(ms / 1000).isoformat() + "Z"
+# endfunction
+
+
+def firmaConsulta(query_payload):
+    # Identifica la consulta de un panel independientemente del rango de tiempo
+    return hashlib.sha1(json.dumps(query_payload, sort_keys=True).encode("utf-8")).hexdigest()
+# endfunction
+
+
+def ejecutarConsulta(cliente, query_payload):
+    # Ahora ejecutar la consulta contra el datasource usando la API de Grafana.
+    # La respuesta se decodifica por trozos a medida que llega, sin tener nunca
+    # el texto JSON entero en memoria (si la respuesta decodificada completa)
+    inicio = time.perf_counter()
+    query_response = cliente.post(
+        "/api/ds/query", json=query_payload, stream=True)
+    resultado = {"status": query_response.status_code,
+                 "datos": None, "texto": ""}
+    if query_response.status_code == 200 or query_response.status_code == 400:
+        resultado["datos"] = decodificarRespuesta(
+            cliente.trozos(query_response))
+    else:
+        resultado["texto"] = b"".join(cliente.trozos(
+            query_response)).decode("utf-8", errors="replace")
+    # endif
+    resultado["segundos"] = time.perf_counter() - inicio
+    resultado["bytes"] = query_response.bytes_leidos
+    return resultado
+# endfunction
+
+
+def respuestaCompleta(status_code, query_data):
+    # True si la respuesta trae todas sus consultas: ni error HTTP ni refIds
+    # con error, que dejarian sin datos parte del rango
+    if status_code != 200 or query_data is None:
+        return False
+    # endif
+    for resultado in query_data.get("results", {}).values():
+        if resultado.get("error") or resultado.get("status", 200) != 200:
+            return False
+        # endif
+    # endfor
+    return True
+# endfunction
+
+
+def guardarRespuesta(data_dir, panels, panel_id, status_code, query_data, texto=""):
+    # Verificar la respuesta de la consulta
+    if status_code == 200 or status_code == 400:
+
+        if GUARDAR_JSON and not SIN_DISCO:
+            # Guardar el JSON en un archivo (solo para archivo/depuracion)
+            file_path_data_json = os.path.join(
+                data_dir, DATA_JSON_NAME + panels.get(panel_id)[0]+".json")
+            with open(file_path_data_json, "w") as archivo:
+                json.dump(query_data, archivo, default=columnaAJson)
+            # endwith
+        # endif
+        if DEBUG_1:
+            print("\nRespuesta obtenida correctamente")
+            # El json obtenido
+            # Convertir el JSON a una cadena formateada
+            json_str = json.dumps(query_data, indent=2, default=columnaAJson)
+
+            # Dividir la cadena en lineas
+            lines = json_str.splitlines()
+
+            # Tomar las primeras 50 lineas
+            first_50_lines = lines[:50]
+
+            # Unir las lineas de nuevo en una cadena
+            result = "\n".join(first_50_lines)
+            print("\nDatos obtenidos de la consulta:", result)
+        # endif
+    else:
+        print(
+            f"\nError {status_code}: {texto}")
+    # endif
+# endfunction
+
+
+def agruparConsultas(pendientes, max_consultas):
+    # Agrupa las consultas pendientes en lotes de un mismo dashboard y
+    # datasource sin superar max_consultas queries por lote. Las consultas de
+    # un panel nunca se separan en lotes distintos
+    lotes = []
+    abiertos = {}
+    for pendiente in pendientes:
+        clave = (pendiente["data_dir"], pendiente["datasource"])
+        n = len(pendiente["payload"]["queries"])
+        lote = abiertos.get(clave)
+        if lote is None or lote[1] + n > max_consultas:
+            lote = [[], 0]
+            abiertos[clave] = lote
+            lotes.append(lote[0])
+        # endif
+        lote[0].append(pendiente)
+        lote[1] += n
+    # endfor
+    return lotes
+# endfunction
+
+
+def combinarLote(lote):
+    # Une las queries de todos los paneles del lote en un unico payload. Cada
+    # query recibe un refId unico que apunta a su (panel, refId original)
+    if len(lote) == 1:
+        return lote[0]["payload"], None
+    # endif
+    queries = []
+    mapeo = {}
+    for i, pendiente in enumerate(lote):
+        for query in pendiente["payload"]["queries"]:
+            query = dict(query)
+            ref_id = f"P{i}_{query.get('refId', '')}"
+            mapeo[ref_id] = (i, query.get("refId", ""))
+            query["refId"] = ref_id
+            queries.append(query)
+        # endfor
+    # endfor
+    return {"queries": queries}, mapeo
+# endfunction
+
+
+def repartirLote(lote, mapeo, query_data):
+    # Separa la respuesta combinada en una respuesta por panel con los refId
+    # originales, tal y como la habria devuelto una consulta individual
+    if mapeo is None:
+        return [query_data]
+    # endif
+    por_panel = [{"results": {}} for _ in lote]
+    for ref_id, resultado in query_data.get("results", {}).items():
+        if ref_id not in mapeo:
+            continue
+        # endif
+        i, ref_original = mapeo[ref_id]
+        for frame in resultado.get("frames", []):
+            if frame.get("schema", {}).get("refId") == ref_id:
+                frame["schema"]["refId"] = ref_original
+            # endif
+        # endfor
+        por_panel[i]["results"][ref_original] = resultado
+    # endfor
+    return por_panel
+# endfunction
+
+
+def obtenerDatosDashboards(trabajos, cliente, cache_dashboards, planificador, almacen=None, tamano_tramos=None, cache_consultas=None, progreso=None, firmas=None):
+    # trabajos: lista de (data_dir, dashboard_uid, panels). Las consultas de
+    # todos los paneles de todos los dashboards se lanzan a la vez. Con un
+    # almacen de series solo se piden los rangos que aun no estan guardados
+    # (firmas se rellena con la firma de la consulta de cada (data_dir,
+    # panel_id), con la que despues se leen del almacen),
+    # con tamano_tramos los rangos largos se dividen en tramos paralelos y con
+    # cache_consultas no se repiten consultas ya hechas por otros informes.
+    # progreso(etapa, hechos, total): avance de las peticiones a Grafana
+    paneles = []
+    pendientes = []
+    inicio_ms = isoAMs(TIME_START)
+    fin_ms = isoAMs(TIME_FINISH)
+    for data_dir, dashboard_uid, panels in trabajos:
+        for panel_id, datasource, query_payload in prepararConsultas(dashboard_uid, panels, cache_dashboards):
+            pendiente = {"data_dir": data_dir, "panels": panels, "panel_id": panel_id,
+                         "datasource": datasource, "dashboard_uid": dashboard_uid,
+                         "grupo": len(paneles)}
+            paneles.append(pendiente)
+            if almacen is None:
+                huecos = [(inicio_ms, fin_ms)]
+            else:
+                pendiente["firma"] = firmaConsulta(query_payload)
+                if firmas is not None:
+                    firmas[(data_dir, panel_id)] = pendiente["firma"]
+                # endif
+                huecos = almacen.huecos(
+                    dashboard_uid, panel_id, pendiente["firma"], inicio_ms, fin_ms)
+            # endif
+            tramo = 0
+            if tamano_tramos is not None:
+                # Multiplo del intervalo de agregacion planificado (intervalMs)
+                # para no partir ventanas de aggregateWindow entre tramos
+                intervalo = max([q.get("intervalMs") or 0 for q in query_payload["queries"]] + [0])
+                tramo = tramoAlineado(tamano_tramos.tramo(datasource), intervalo)
+            # endif
+            for hueco_inicio, hueco_fin in huecos:
+                for inicio, fin in dividirRango(hueco_inicio, hueco_fin, tramo):
+                    if (inicio, fin) == (inicio_ms, fin_ms):
+                        # Rango completo: se usan las fechas tal cual
+                        payload = aplicarRango(
+                            query_payload, TIME_START, TIME_FINISH)
+                    else:
+                        payload = aplicarRango(
+                            query_payload, msAIso(inicio), msAIso(fin))
+                    # endif
+                    pendientes.append(
+                        dict(pendiente, rango=(inicio, fin), payload=payload))
+                # endfor
+            # endfor
+        # endfor
+    # endfor
+
+    # Resultado de cada consulta pendiente: (status, query_data, texto)
+    resultados = [None] * len(pendientes)
+    a_consultar = []
+    for i, pendiente in enumerate(pendientes):
+        pendiente["indice"] = i
+        if cache_consultas is not None:
+            pendiente["clave_cache"] = claveConsulta(
+                pendiente["datasource"], pendiente["payload"], pendiente["rango"])
+            query_data = cache_consultas.obtener(pendiente["clave_cache"])
+            if query_data is not None:
+                resultados[i] = (200, query_data, "")
+                continue
+            # endif
+        # endif
+        a_consultar.append(pendiente)
+    # endfor
+
+    if GRAFANA_AGRUPAR_CONSULTAS:
+        # Una sola peticion por dashboard y datasource (o por lote maximo)
+        lotes = agruparConsultas(a_consultar, GRAFANA_MAX_CONSULTAS_LOTE)
+    else:
+        lotes = [[pendiente] for pendiente in a_consultar]
+    # endif
+    combinados = [combinarLote(lote) for lote in lotes]
+
+    alTerminar = None
+    if progreso is not None:
+        progreso("consultas", 0, len(lotes))
+        alTerminar = functools.partial(progreso, "consultas")
+    # endif
+    respuestas = planificador.ejecutar(
+        [(lote[0]["datasource"], ejecutarConsulta, (cliente, query_payload))
+         for lote, (query_payload, _) in zip(lotes, combinados)], alTerminar)
+
+    for lote, (_, mapeo), respuesta in zip(lotes, combinados, respuestas):
+        if tamano_tramos is not None:
+            tamano_tramos.observar(lote[0]["datasource"], max(p["rango"][1] - p["rango"][0] for p in lote),
+                                   respuesta["segundos"], respuesta["bytes"])
+        # endif
+        if respuesta["datos"] is not None:
+            datos_paneles = repartirLote(lote, mapeo, respuesta["datos"])
+        else:
+            datos_paneles = [None] * len(lote)
+        # endif
+        for pendiente, query_data in zip(lote, datos_paneles):
+            resultados[pendiente["indice"]] = (
+                respuesta["status"], query_data, respuesta["texto"])
+            if cache_consultas is not None and respuestaCompleta(respuesta["status"], query_data):
+                cache_consultas.guardar(
+                    pendiente["clave_cache"], query_data, pendiente["rango"][1])
+            # endif
+        # endfor
+    # endfor
+
+    # Los resultados se recorren en el mismo orden que una ejecucion secuencial
+    respuestas_panel = [[] for _ in paneles]
+    for pendiente, (status_code, query_data, texto) in zip(pendientes, resultados):
+        if almacen is not None and respuestaCompleta(status_code, query_data):
+            # El rango queda cubierto en el almacen; el CSV se genera desde alli.
+            # Un tramo fallido (o con algun refId fallido) no se anade y se
+            # vuelve a pedir en la siguiente ejecucion
+            almacen.anadir(pendiente["dashboard_uid"], pendiente["panel_id"], pendiente["firma"],
+                           pendiente["rango"], seriesDeRespuesta(query_data))
+            continue
+        # endif
+        respuestas_panel[pendiente["grupo"]].append(
+            (status_code, query_data, texto))
+    # endfor
+
+    # Respuestas ya decodificadas por (data_dir, panel_id), para el CSV
+    datos = {}
+    for panel, respuestas_tramos in zip(paneles, respuestas_panel):
+        if not respuestas_tramos:
+            continue
         # endif
+        fallidas = [r for r in respuestas_tramos if r[0] != 200 or r[1] is None]
+        if fallidas or almacen is not None:
+            status_code, query_data, texto = (fallidas or respuestas_tramos)[0]
+        else:
+            # Unir los tramos en orden quitando los puntos repetidos en las fronteras
+            status_code = respuestas_tramos[0][0]
+            query_data = unirRespuestas([r[1] for r in respuestas_tramos])
+            texto = ""
+        # endif
+        guardarRespuesta(panel["data_dir"], panel["panels"], panel["panel_id"],
+                         status_code, query_data, texto)
+        if query_data is not None:
+            datos[(panel["data_dir"], panel["panel_id"])] = query_data
+        # endif
+    # endfor
+    return datos
+# endfunction
+
+
+def obtenerDatosGrafana(data_dir, grafana_url, api_key, dashboard_uid, panels, cache_dashboards=None, planificador=None, almacen=None, tamano_tramos=None, cache_consultas=None):
+    cliente = obtenerClienteGrafana(grafana_url, api_key)
+    if cache_dashboards is None:
+        cache_dashboards = CacheDashboards(cliente, None)
+    # endif
+    if planificador is None:
+        planificador = PlanificadorConsultas(
+            GRAFANA_CONSULTAS_PARALELAS, GRAFANA_CONSULTAS_POR_DATASOURCE)
+    # endif
+    if cache_consultas is None:
+        cache_consultas = obtenerCacheConsultas()
+    # endif
+    return obtenerDatosDashboards(
+        [(data_dir, dashboard_uid, panels)], cliente, cache_dashboards, planificador, almacen, tamano_tramos, cache_consultas)
 # endfunction
 ##################################################################################################
 
@@ -299,82 +732,114 @@ def convert_timestamp(timestamp):
 # endfunction
 
 
-def excelDeDatos(data_dir, panels):
+def nombreMedida(frame):
+    return frame["schema"]["meta"]["executedQueryString"].split(
+        'r._measurement == ')[1].split(')')[0].replace('"', '')
+# endfunction
+
+
+def seriesDeRespuesta(query_data):
+    # Devuelve [(measurement, tiempos, valores)] de todos los frames de la respuesta
+    series = []
+    # Procesar cada conjunto de datos: "A", "B", "C", etc.
+    for query_key in query_data["results"].keys():
+        frames = query_data["results"][query_key].get("frames", [])
+
+        if frames:
+            for frame in frames:
+                values = frame["data"]["values"]
+                series.append((nombreMedida(frame), values[0], values[1]))
+            # endfor
+
+            if DEBUG_2:
+                print(f"\nDatos procesados para el conjunto {query_key}.")
+            # endif
+        else:
+            print(f"\nNo se encontraron datos en el conjunto {query_key}.")
+        # endif
+    # endfor
+    return series
+# endfunction
+
+
+def escribirCSV(file_path_data_csv, tabla):
+    # Escribir los datos en el CSV
+    with open(file_path_data_csv, mode="w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file, delimiter=";", quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(["Time"] + tabla.medidas)
+        writer.writerows(tabla.filasTexto())
+    # endwith
+# endfunction
+
+
+def excelDeDatos(data_dir, panels, dashboard_uid=None, almacen=None, datos=None, firmas=None):
+    # Devuelve {panel_id: tabla} con los datos de cada panel listos para la hoja
+    tablas = {}
     for panel_id in panels.keys():
-        file_path_data_json = os.path.join(
-            data_dir, DATA_JSON_NAME + panels.get(panel_id)[0]+".json")
-
-        # Abrir y leer el archivo JSON
-        with open(file_path_data_json, "r") as archivo:
-            query_data = json.load(archivo)
-        # endwith
-
-        # Definir el archivo CSV donde guardar todos los datos
-        file_path_data_csv = os.path.join(
-            data_dir, DATA_CSV_NAME + panels.get(panel_id)[0] + ".csv")
-
-        # Diccionario para almacenar los datos de todas las mediciones
-        all_data = {}
-        measurements = set()
-
-        # Procesar cada conjunto de datos: "A", "B", "C", etc.
-        for query_key in query_data["results"].keys():
-            frames = query_data["results"][query_key].get("frames", [])
-
-            if frames:
-                for frame in frames:
-                    values = frame["data"]["values"]
-                    measurement_name = frame["schema"]["meta"]["executedQueryString"].split(
-                        'r._measurement == ')[1].split(')')[0].replace('"', '')
-                    measurements.add(measurement_name)
-
-                    for time, value in zip(values[0], values[1]):
-                        if value is not None:
-                            converted_time = convert_timestamp(time)
-                            aux = datetime.strptime(
-                                converted_time, "%Y-%m-%d %H:%M:%S")
-                            converted_time_aux = aux.strftime("%d-%m-%Y %H:%M")
-
-                            if converted_time_aux not in all_data:
-                                all_data[converted_time_aux] = {}
-                            # endif
-                            all_data[converted_time_aux][measurement_name] = int(
-                                value)
-                        # endif
-                    # endfor
-                # endfor
+        # Sin firma el panel no tiene consulta ni, por tanto, datos en el almacen
+        firma = (firmas or {}).get((data_dir, panel_id))
+        if almacen is not None and firma is not None:
+            # Los datos salen del almacen local (ya completado con los huecos)
+            series = almacen.leer(dashboard_uid, panel_id, firma,
+                                  isoAMs(TIME_START), isoAMs(TIME_FINISH))
+        elif datos is not None and (data_dir, panel_id) in datos:
+            # Respuesta ya decodificada en memoria al descargarla
+            series = seriesDeRespuesta(datos[(data_dir, panel_id)])
+        else:
+            # La consulta fallo o el panel no esta en el dashboard: la hoja
+            # queda vacia (un JSON de otra ejecucion no corresponde al rango)
+            print(f"\nNo se encontraron datos del panel {panel_id}.")
+            series = []
+        # endif
 
-                if DEBUG_2:
-                    print(f"\nDatos procesados para el conjunto {query_key}.")
-                # endif
+        tablas[panel_id] = TablaColumnas.desdeSeries(series)
+        tablas[panel_id].rango = (isoAMs(TIME_START), isoAMs(TIME_FINISH))
+        if panels.get(panel_id)[5] in EXTRAS_RESUMEN:
+            # Percentiles/ciclo de trabajo con los puntos originales, en una pasada
+            if almacen is not None and firma is not None:
+                tablas[panel_id].resumenes = almacen.resumen(dashboard_uid, panel_id, firma,
+                                                             isoAMs(TIME_START), isoAMs(TIME_FINISH))
             else:
-                print(f"\nNo se encontraron datos en el conjunto {query_key}.")
+                tablas[panel_id].resumenes = resumirSeries(series)
             # endif
-        # endfor
-
-        # Escribir los datos en el CSV
-        with open(file_path_data_csv, mode="w", newline="", encoding="utf-8") as file:
-            writer = csv.writer(file, delimiter=";", quoting=csv.QUOTE_MINIMAL)
+        # endif
 
-            # Escribir encabezado
-            header = ["Time"] + list(measurements)
-            writer.writerow(header)
+        if GUARDAR_TABLAS and not SIN_DISCO:
+            # Intermedio binario para regenerar el informe sin Grafana
+            tablas[panel_id].guardarBinario(os.path.join(
+                data_dir, DATA_TABLA_NAME + panels.get(panel_id)[0] + DATA_TABLA_EXT))
+        # endif
 
-            # Escribir datos
-            for time in sorted(all_data.keys()):
-                row = [time]
-                for measurement in measurements:
-                    row.append(all_data[time].get(measurement, ""))
-                # endfor
-                writer.writerow(row)
-            # endfor
-        # endwith
+        if GUARDAR_CSV and not SIN_DISCO:
+            # Definir el archivo CSV donde guardar todos los datos
+            file_path_data_csv = os.path.join(
+                data_dir, DATA_CSV_NAME + panels.get(panel_id)[0] + ".csv")
+            escribirCSV(file_path_data_csv, tablas[panel_id])
 
-        if DEBUG_2:
-            print(
-                f"\nDatos exportados al CSV para el conjunto {query_key}.")
+            if DEBUG_2:
+                print(
+                    f"\nDatos exportados al CSV del panel {panel_id}.")
+            # endif
         # endif
     # endfor
+    return tablas
+# endfunction
+
+
+def cargarTablas(trabajos):
+    # Tablas guardadas por excelDeDatos, para regenerar el informe sin
+    # consultar Grafana. Devuelve {(data_dir, panel_id): tabla}
+    tablas = {}
+    for data_dir, _, panels in trabajos:
+        for panel_id, valores in panels.items():
+            ruta = os.path.join(
+                data_dir, DATA_TABLA_NAME + valores[0] + DATA_TABLA_EXT)
+            if os.path.exists(ruta):
+                tablas[(data_dir, panel_id)] = TablaColumnas.desdeBinario(ruta)
+            # endif
+        # endfor
+    # endfor
+    return tablas
 # endfunction
 ##################################################################################################
 
@@ -398,65 +863,58 @@ def insert_header(worksheet, text, row, start_col, end_col):
 
     # Establecer el valor y el estilo
     cell.value = text
-    cell.font = Font(bold=True, size=14)
-    cell.alignment = Alignment(horizontal="center", vertical="center")
+    cell.style = ESTILO_CABECERA
 # endfunction
 
 
-def nuevaHoja(wb, data_path, name, evitarDatosVacios=True):
+def nuevaHoja(wb, tabla, name, evitarDatosVacios=True, max_puntos=None, binario=False, nombre_completa=None):
+    # tabla: TablaColumnas del panel (o ruta a una tabla binaria o un CSV guardados).
+    # Devuelve la hoja, la tabla con las filas filtradas (para las
+    # estadisticas) y la tabla con las filas escritas en la hoja (para el grafico)
+    if isinstance(tabla, str) and tabla.endswith(".csv"):
+        tabla = TablaColumnas.desdeCSV(tabla)
+    elif isinstance(tabla, str):
+        tabla = TablaColumnas.desdeBinario(tabla)
+    # endif
     ### Introducir Datos ###
-    # Crear una nueva hoja para los datos filtrados
-    ws_filtered = wb.create_sheet(name)
-    with open(data_path, mode="r", newline="", encoding="utf-8") as archivo_csv:
-        # Crear un objeto lector CSV
-        lector_csv = csv.reader(
-            archivo_csv, delimiter=";", quoting=csv.QUOTE_MINIMAL)
-        # Copiar el encabezado
-        header = next(lector_csv)  # Lee la primera linea como encabezado
-        ws_filtered.append(header)
-        # Filtrar y copiar los datos
-        rows_to_include = set()
-        # Start with row index 2 for filtering
-        for i, row in enumerate(lector_csv):
-            if (evitarDatosVacios):
-                add = True
-                for j in range(1, len(row)):
-                    if row[j] == '0' or row[j] == '' or row[j] == None or row[j] == 0 or row[j] == ' ':
-                        add = False
-                    # endif
-                # endfor
-                if (add):
-                    rows_to_include.add(i - 1)  # Fila anterior
-                    rows_to_include.add(i)       # Fila actual
-                    rows_to_include.add(i + 1)   # Fila siguiente
-                # endif
-            else:
-                rows_to_include.add(i)       # Fila actual
-            # endif
-        # endfor
+    # Crear una nueva hoja para los datos filtrados. En modo streaming las
+    # filas se escriben a disco a medida que se anaden
+    if HOJAS_DATOS_STREAMING and not SIN_DISCO:
+        crearHoja = crearHojaStreaming
+    else:
+        crearHoja = Workbook.create_sheet
+    # endif
+    ws_filtered = crearHoja(wb, name)
+    # Copiar el encabezado
+    header = ["Time"] + tabla.medidas
+    ws_filtered.append(header)
+    # Filtrar los datos
+    if (evitarDatosVacios):
+        # Las estadisticas (MAXMIN/TABLA) se acumulan en la misma pasada
+        filtrada = tabla.seleccionar(tabla.filasSinHuecos(), estadisticas=True)
+    else:
+        filtrada = tabla
+    # endif
 
-        # Volver a leer el archivo para copiar las filas seleccionadas a la nueva hoja
-        archivo_csv.seek(0)  # Volver al inicio del archivo
-        next(lector_csv)  # Saltar el encabezado
-        for i, row in enumerate(lector_csv):
-            if i in rows_to_include:
-                # Convertir a float
-                for j in range(1, len(row)):
-                    try:
-                        if row[j] == '' or row[j] == '' or row[j] == None or row[j] == ' ':
-                            row[j] = float(0)
-                            break
-                        # endif
-                        row[j] = float(int(row[j]))
-                    except ValueError:
-                        row[j] = 0  # Or any default value you prefer
-                    # endtry
-                # endfor
-                ws_filtered.append(row)
-            # endif
+    if nombre_completa not in [None, ""]:
+        # Hoja aparte con todos los datos sin reducir
+        ws_completa = crearHoja(wb, nombre_completa)
+        ws_completa.append(header)
+        for row in filtrada.filasHoja():
+            ws_completa.append(row)
         # endfor
-    # endwith
-    return ws_filtered
+    # endif
+    # El grafico solo necesita los puntos que caben en su tamano
+    escrita = filtrada
+    if max_puntos and len(filtrada) > max_puntos:
+        escrita = filtrada.seleccionar(seleccionarIndices(
+            [filtrada.columnaNumerica(j) for j in range(len(filtrada.medidas))],
+            len(filtrada), max_puntos, binario, GRAFICO_REDUCCION))
+    # endif
+    for row in escrita.filasHoja():
+        ws_filtered.append(row)
+    # endfor
+    return ws_filtered, filtrada, escrita
     ######
 # endfunction
 
@@ -465,16 +923,26 @@ def nuevaHoja(wb, data_path, name, evitarDatosVacios=True):
 anchura_linea = 9000
 
 
-def crear_grafico(chart, hoja, name, pos_x, pos_y, ancho, alto, binario=False, leyenda=False, series_colors=["ff0000", "000000", "a95700", "27fc00", "003dfc", "df00fc"]):
+def crear_grafico(chart, hoja, name, pos_x, pos_y, ancho, alto, binario=False, leyenda=False, series_colors=["ff0000", "000000", "a95700", "27fc00", "003dfc", "df00fc"], tabla=None):
+    # tabla: TablaColumnas con las filas escritas en la hoja (si no, se leen de la hoja)
     ###### Crear el grafico ######
     # Anadir series de datos al grafico
     color_i = -1
-    max_row = hoja.max_row
-    max_col = hoja.max_column
+    if tabla is not None:
+        max_row = len(tabla) + 1
+        max_col = len(tabla.medidas) + 1
+    else:
+        max_row = hoja.max_row
+        max_col = hoja.max_column
+    # endif
 
     for j in range(2, max_col+1):
         # Obtener el nombre del conjunto (measurement)
-        measurement = hoja.cell(row=1, column=j).value
+        if tabla is not None:
+            measurement = tabla.medidas[j-2]
+        else:
+            measurement = hoja.cell(row=1, column=j).value
+        # endif
 
         # Rango de datos de este conjunto
         data_range = Reference(hoja, min_col=j,
@@ -484,7 +952,7 @@ def crear_grafico(chart, hoja, name, pos_x, pos_y, ancho, alto, binario=False, l
 
         # Anadir serie de datos al grafico
         chart.add_data(data_range, titles_from_data=False)
-        if hoja.max_row > 1:
+        if max_row > 1:
             chart.set_categories(categories)
         # endif
 
@@ -581,74 +1049,295 @@ row_height = 14.58
 global NUM_ROWS_SHEET
 NUM_ROWS_SHEET = 48
 
-# Definir el estilo del borde
-border_style = Side(style='thin')
-# Crear el objeto Border con el estilo en todos los lados
-border = Border(left=border_style,
-                right=border_style,
-                top=border_style,
-                bottom=border_style)
-font_style = Font(size=8)  # Tamano de fuente 8
-alignment_style = Alignment(horizontal='center', vertical='center')
-
-
-def apply_style_to_range(sheet, cell_range):
-    for row in sheet[cell_range]:
-        for cell in row:
-            cell.font = font_style
-            cell.alignment = alignment_style
-            cell.border = border
-        # endfor
-    # endfor
+# Los estilos de las celdas (fuente 8, centrado, borde fino y rellenos de
+# las tablas) estan registrados como NamedStyle en estilos.py
+
+
+def apply_style_to_range(sheet, cell_range, estilo=ESTILO_TABLA):
+    aplicarEstiloRango(sheet, cell_range, estilo)
 # endfunction
 
 
-def createMAXMIN(ws_source, ws_destination, idx):
-    i = idx
-    for col_idx, col in enumerate(ws_source.iter_cols(min_col=2)):
-        max_value = float('-inf')
-        min_value = float('inf')
-        max_time = None
-        min_time = None
-
-        for row_idx, row in enumerate(ws_source.iter_rows(min_row=2)):
-            time = row[0].value
-            value = col[row_idx].value
-            if isinstance(value, (int, float)):
-                if value > max_value:
-                    max_value = value
-                    max_time = time
-                # endif
-                if value < min_value:
-                    min_value = value
-                    min_time = time
-                # endif
-            # endif
-        # endfor
+def textosMaxMin(tabla, j):
+    # [maximo, fecha del maximo, minimo, fecha del minimo] de la measurement j
+    # de la tabla, como se muestran en el informe (None si no existe)
+    if j >= len(tabla.medidas):
+        return [None, None, None, None]
+    # endif
+    serie = tabla.estadisticas()[j]
+    if serie.n == 0:
+        return ["N/A", "None", "N/A", "None"]
+    # endif
+    return [f"{float(serie.maximo):.2f}", etiquetaMinuto(serie.t_maximo // MS_MINUTO),
+            f"{float(serie.minimo):.2f}", etiquetaMinuto(serie.t_minimo // MS_MINUTO)]
+# endfunction
 
-        # Formatear los valores con dos decimales
-        max_value_formatted = f"{max_value:.2f}" if max_value != float(
-            '-inf') else "N/A"
-        min_value_formatted = f"{min_value:.2f}" if min_value != float(
-            'inf') else "N/A"
+
+def createMAXMIN(tabla, ws_destination, idx):
+    # Escribe en la hoja DATOS (solo para consulta) el maximo y minimo (con su
+    # fecha) de cada measurement, a partir de las estadisticas de la tabla
+    i = idx
+    for j, medida in enumerate(tabla.medidas):
+        max_value, max_time, min_value, min_time = textosMaxMin(tabla, j)
 
         ws_destination[f"A{str(i)}"] = "MAX_" + \
-            str(col[0].value)
-        ws_destination[f"A{str(i+1)}"] = str(max_value_formatted)
-        ws_destination[f"A{str(i+2)}"] = str(max_time)
+            str(medida)
+        ws_destination[f"A{str(i+1)}"] = max_value
+        ws_destination[f"A{str(i+2)}"] = max_time
         ws_destination[f"B{str(i)}"] = "MIN_" + \
-            str(col[0].value)
-        ws_destination[f"B{str(i+1)}"] = str(min_value_formatted)
-        ws_destination[f"B{str(i+2)}"] = str(min_time)
+            str(medida)
+        ws_destination[f"B{str(i+1)}"] = min_value
+        ws_destination[f"B{str(i+2)}"] = min_time
 
         i += 4
     # endfor
 # endfunction
 
 
-def informe(titulo, dashboards):
+def resumenesTabla(tabla):
+    # Resumenes (percentiles y ciclo de trabajo) de cada measurement. Si no se
+    # calcularon con los puntos originales (p. ej. datos leidos de un CSV), se
+    # calculan con las columnas de la tabla
+    if tabla.resumenes is None:
+        tabla.resumenes = resumirSeries([(medida, tabla.tiempos, [v if valido else None for v, valido in zip(valores, validos)])
+                                         for medida, valores, validos in zip(tabla.medidas, tabla.valores, tabla.validos)])
+    # endif
+    return tabla.resumenes
+# endfunction
+
+
+def textosPercentiles(resumen):
+    # [P50, P95, P99, media] como se muestran en el informe
+    if resumen is None or resumen.cuantiles.n == 0:
+        return ["N/A", "N/A", "N/A", "N/A"]
+    # endif
+    sketch = resumen.cuantiles
+    return [f"{sketch.cuantil(q):.2f}" for q in (0.50, 0.95, 0.99)] + [f"{sketch.media:.2f}"]
+# endfunction
+
+
+def textosCiclo(resumen):
+    # [% de tiempo activo, tiempo activo, cambios de estado, activaciones]
+    if resumen is None or resumen.ciclo.porcentaje_activo is None:
+        return ["N/A", "N/A", "N/A", "N/A"]
+    # endif
+    ciclo = resumen.ciclo
+    minutos = ciclo.ms_activo // MS_MINUTO
+    return [f"{ciclo.porcentaje_activo:.2f} %", f"{minutos // 60}h {minutos % 60:02d}m",
+            str(ciclo.cambios), str(ciclo.activaciones)]
+# endfunction
+
+
+def crearTablaExtra(ws, pos_actual, titulos, filas, colores):
+    # Tabla de los extras TABLA/PERCENTILES/CICLO: una fila de titulos y una
+    # fila por measurement con cuatro valores. filas: [(medida, [4 textos])].
+    # Devuelve la fila siguiente a la tabla
+    columnas = [("J", "O"), ("P", "U"), ("V", "AA"), ("AB", "AG")]
+    for (inicio, fin), titulo in zip(columnas, titulos):
+        ws.merge_cells(f"{inicio}{str(pos_actual)}:{fin}{str(pos_actual)}")
+        ws[f"{inicio}{pos_actual}"] = titulo
+    # endfor
+
+    apply_style_to_range(
+        ws, f"J{str(pos_actual)}:AG{str(pos_actual)}")
+
+    pos_actual += 1
+    x = 0
+    for medida, textos in filas:
+        ws.merge_cells(
+            f"A{str(pos_actual)}:I{str(pos_actual)}")
+        ws[f"A{str(pos_actual)}"] = str(medida)
+
+        for (inicio, fin), texto in zip(columnas, textos):
+            ws.merge_cells(
+                f"{inicio}{str(pos_actual)}:{fin}{str(pos_actual)}")
+            ws[f"{inicio}{str(pos_actual)}"] = texto
+        # endfor
+
+        # Relleno del color de la serie, borde, fuente y centrado de una vez
+        apply_style_to_range(
+            ws, f"A{str(pos_actual)}:AG{str(pos_actual)}", estiloTabla(colores[x % len(colores)]))
+
+        x += 1
+        pos_actual += 1
+    # endfor
+    return pos_actual
+# endfunction
+
+
+def rotarColores(colores, n):
+    # Lista de colores desplazada n posiciones a la izquierda
+    n = n % len(colores)
+    return list(colores[n:]) + list(colores[:n])
+# endfunction
+
+
+def tablaPanel(nombre, id, valores, tablas=None):
+    # TablaColumnas del panel: la de excelDeDatos si esta en tablas y, si no,
+    # la tabla binaria guardada (o el CSV)
+    directorio = DATA_DIR+"/"+nombre[0]+"/"
+    if tablas is not None and (directorio, id) in tablas:
+        # Datos en memoria, sin pasar por disco
+        return tablas[(directorio, id)]
+    # endif
+    ruta = os.path.join(directorio, DATA_TABLA_NAME+valores[0]+DATA_TABLA_EXT)
+    if os.path.exists(ruta):
+        return TablaColumnas.desdeBinario(ruta)
+    # endif
+    return TablaColumnas.desdeCSV(os.path.join(directorio, DATA_CSV_NAME+valores[0]+".csv"))
+# endfunction
+
+
+def dibujarPanel(wb, ws, ws_datos, registro, valores, tabla):
+    # Dibuja un panel en la posicion del plan (registro de planificarInforme):
+    # hoja de datos, grafico y extra
+    nombre = registro["dashboard"]
+    nombre_completa = None
+    if GRAFICO_HOJA_COMPLETA:
+        nombre_completa = f"Full Data {nombre[0]}"
+    # endif
+    ws_data, tabla_datos, tabla_grafico = nuevaHoja(
+        wb, tabla, f"Raw Data {nombre[0]}", max_puntos=GRAFICO_MAX_PUNTOS.get(valores[2]),
+        binario=valores[3], nombre_completa=nombre_completa)
+
+    # Los colores rotan una posicion por cada panel del dashboard
+    series_colors = rotarColores(COLORES_SERIES, registro["indice"])
+    series_colors_aux = rotarColores(COLORES_TABLA, registro["indice"])
+
+    if valores[1] == "L":
+        tipo = LineChart()
+    elif valores[1] == "B":
+        tipo = BarChart()
+    # endif
+
+    chart = crear_grafico(
+        tipo, ws_data, valores[0], registro["x"], registro["y"], registro["ancho"], registro["alto"], binario=valores[3], leyenda=valores[4], series_colors=series_colors,
+        tabla=tabla_grafico)
+
+    # Anadir el grafico a la hoja de trabajo
+    ws.add_chart(chart)
+
+    indice_datos = 1
+
+    if valores[5] == "INFO":
+        pos_actual = registro["fila_extra"]
+        if len(tabla_datos) == 0:
+            ws.merge_cells(f"C{str(pos_actual)}:AG{str(pos_actual)}")
+            ws[f"C{str(pos_actual)}"] = valores[6]
+            ws[f"C{str(pos_actual)}"].style = ESTILO_CENTRADO
+        # endif
+    # endif
+    elif valores[5] == "MAXMIN":
+        createMAXMIN(tabla=tabla_datos,
+                     ws_destination=ws_datos, idx=indice_datos)
+        textos = textosMaxMin(tabla_datos, 0)
+
+        if not registro["derecha"]:
+            pos_actual_aux = registro["fila_extra"]
+            ws.merge_cells(
+                f"A{str(pos_actual_aux)}:G{str(pos_actual_aux)}")
+            ws[f"A{str(pos_actual_aux)}"] = valores[6] + " max.: "
+            ws[f"A{str(pos_actual_aux)}"].style = ESTILO_CENTRADO
+            ws.merge_cells(
+                f"H{str(pos_actual_aux)}:I{str(pos_actual_aux)}")
+            ws[f"H{str(pos_actual_aux)}"] = textos[0]
+            ws[f"J{str(pos_actual_aux)}"] = valores[7]
+            ws.merge_cells(
+                f"K{str(pos_actual_aux)}:P{str(pos_actual_aux)}")
+            ws[f"K{str(pos_actual_aux)}"] = textos[1]
+            ws[f"K{str(pos_actual_aux)}"].style = ESTILO_CENTRADO
+
+            pos_actual_aux += 1
+
+            ws.merge_cells(
+                f"A{str(pos_actual_aux)}:G{str(pos_actual_aux)}")
+            ws[f"A{str(pos_actual_aux)}"] = valores[6] + " min.: "
+            ws[f"A{str(pos_actual_aux)}"].style = ESTILO_CENTRADO
+            ws.merge_cells(
+                f"H{str(pos_actual_aux)}:I{str(pos_actual_aux)}")
+            ws[f"H{str(pos_actual_aux)}"] = textos[2]
+            ws[f"J{str(pos_actual_aux)}"] = valores[7]
+            ws.merge_cells(
+                f"K{str(pos_actual_aux)}:P{str(pos_actual_aux)}")
+            ws[f"K{str(pos_actual_aux)}"] = textos[3]
+            ws[f"K{str(pos_actual_aux)}"].style = ESTILO_CENTRADO
+        else:
+            pos_actual = registro["fila_extra"]
+
+            ws.merge_cells(
+                f"S{str(pos_actual)}:Y{str(pos_actual)}")
+            ws[f"S{str(pos_actual)}"] = valores[6] + " max.: "
+            ws[f"S{str(pos_actual)}"].style = ESTILO_CENTRADO
+            ws.merge_cells(
+                f"Z{str(pos_actual)}:AA{str(pos_actual)}")
+            ws[f"Z{str(pos_actual)}"] = textos[0]
+            ws[f"AB{str(pos_actual)}"] = valores[7]
+            ws.merge_cells(
+                f"AC{str(pos_actual)}:AH{str(pos_actual)}")
+            ws[f"AC{str(pos_actual)}"] = textos[1]
+            ws[f"AC{str(pos_actual)}"].style = ESTILO_CENTRADO
+
+            pos_actual += 1
+
+            ws.merge_cells(
+                f"S{str(pos_actual)}:Y{str(pos_actual)}")
+            ws[f"S{str(pos_actual)}"] = valores[6] + " min.: "
+            ws[f"S{str(pos_actual)}"].style = ESTILO_CENTRADO
+            ws.merge_cells(
+                f"Z{str(pos_actual)}:AA{str(pos_actual)}")
+            ws[f"Z{str(pos_actual)}"] = textos[2]
+            ws[f"AB{str(pos_actual)}"] = valores[7]
+            ws.merge_cells(
+                f"AC{str(pos_actual)}:AH{str(pos_actual)}")
+            ws[f"AC{str(pos_actual)}"] = textos[3]
+            ws[f"AC{str(pos_actual)}"].style = ESTILO_CENTRADO
+        # endif
+    elif valores[5] == "TABLA":
+        pos_actual = registro["fila_extra"]
+        createMAXMIN(tabla=tabla_datos,
+                     ws_destination=ws_datos, idx=indice_datos)
+        crearTablaExtra(
+            ws, pos_actual, [valores[6] + " MAX", "Fecha de maxima:", valores[6] + " MIN", "Fecha de minimo:"],
+            [(medida, textosMaxMin(tabla_datos, j))
+             for j, medida in enumerate(tabla_datos.medidas)],
+            series_colors_aux)
+    elif valores[5] == "PERCENTILES":
+        pos_actual = registro["fila_extra"]
+        resumenes = resumenesTabla(tabla_datos)
+        crearTablaExtra(
+            ws, pos_actual, [valores[6] + " P50", valores[6] + " P95", valores[6] + " P99", valores[6] + " media"],
+            [(medida, textosPercentiles(resumenes.get(medida)))
+             for medida in tabla_datos.medidas],
+            series_colors_aux)
+    elif valores[5] == "CICLO":
+        pos_actual = registro["fila_extra"]
+        resumenes = resumenesTabla(tabla_datos)
+        crearTablaExtra(
+            ws, pos_actual, [valores[6] + " % activo", "Tiempo activo:", "Cambios de estado:", "Activaciones:"],
+            [(medida, textosCiclo(resumenes.get(medida)))
+             for medida in tabla_datos.medidas],
+            series_colors_aux)
+    # endif
+# endfunction
+
+
+def nombreInforme(fin=None):
+    # Nombre del excel del informe que termina en fin (ISO, por defecto TIME_FINISH)
+    fin = datetime.fromisoformat((fin or TIME_FINISH).replace("Z", "+00:00"))
+    return f"{str(fin.strftime('%Y-%m-%d'))}_informe_{TITULO}.xlsx"
+# endfunction
+
+
+def informe(titulo, dashboards, tablas=None, progreso=None, directorio=None, destino=None):
+    # tablas: {(data_dir, panel_id): tabla} de excelDeDatos; sin ellas se leen
+    # las tablas binarias guardadas (o, si no hay, los CSV).
+    # progreso(etapa, hechos, total): avance del dibujo de los paneles.
+    # directorio: donde se guarda el excel (por defecto INFORMES_DIR).
+    # destino: flujo binario (buffer en memoria, respuesta HTTP...) donde se
+    # escribe el excel en vez de guardarlo en disco
     # Crear un nuevo libro y hoja
     wb = Workbook()
+    registrarEstilos(wb)
 
     ws = wb.active
     # Cambiar la vista a "Diseno de pagina"
@@ -693,294 +1382,44 @@ def informe(titulo, dashboards):
         IMG.height = 85
         ws.add_image(IMG, "Z1")
 
-    EMU_ANCHO_TOTAL = ANCHOPX_CELDA*34
-    EMU_ANCHO_TOTAL_PEQUEnO = (EMU_ANCHO_TOTAL/2)
-    EMU_ALTURA_PEQUEnO = (ALTOPX_CELDA/2)*16
-    EMU_ALTURA_MEDIANO = (ALTOPX_CELDA/4)*20
-    EMU_ALTURA_GRANDE = EMU_ALTURA_PEQUEnO*2
-    x_offset = pixels_to_EMU(ANCHOPX_CELDA/2)  # Offset horizontal en EMUs
-    x_offset_mitad = x_offset*2*18
-    y_offset = pixels_to_EMU(ALTOPX_CELDA/4)   # Offset vertical en EMUs
-    casella_EMU = pixels_to_EMU(ALTOPX_CELDA)
-
     ws_datos = wb.create_sheet("DATOS")
 
-    pos_actual = 4
-    suma_pequeno = 9
-    suma_mediano = 6
-    suma_grande = 17
-
-    def evitarCorte(l, b):
-        global NUM_ROWS_SHEET
-        if b:
-            x = NUM_ROWS_SHEET - 1
-        else:
-            x = NUM_ROWS_SHEET
-        resto = pos_actual % x
-        if resto > x-l:
-            return x-resto+1
-        # endif
-        if pos_actual > 95 - suma_grande and pos_actual < 130:
-            return 1
-        else:
-            return 0
-        # endif
-    # endfunction
-
-    b = False
+    # Tablas de todos los paneles: el numero de measurements fija las filas
+    # de las tablas de los extras
+    tablas_panel = {}
+    filas_tablas = {}
     for nombre, paneles in dashboards.items():
-
-        z = evitarCorte(2, b)
-        if (z == 0):
-            pos_actual += 1
-        else:
-            pos_actual += zip
-        # endif
-
-        ws[f"C{str(pos_actual)}"] = nombre[1]
-        ws.merge_cells(f"C{str(pos_actual)}:AG{str(pos_actual)}")
-        color_relleno = PatternFill(
-            start_color="6BB9AE", end_color="6BB9AE", fill_type="solid")
-        ws[f"C{str(pos_actual)}"].fill = color_relleno
-        ws[f"C{str(pos_actual)}"].font = Font(color="FFFFFF", bold=True)
-        pos_actual += 1
-
-        pan_p = 0
-        series_colors = ["FF0000", "00FF00", "0000FF",
-                         "00FFFF", "FF00FF", "FFA500", "800080"]
-        series_colors_aux = ["ff4d4d", "4dff4d", "4d4dff",
-                             "4dffff", "ff4dff", "ffc04d", "cd00cd"]
-        # CLAVE:[NOMBRE, TIPO(LINEAS, BARRAS), TAMAnO(PEQUEnO, MEDIANO, GRANDE), BINARIO(True, False), LEYENDA(True, False), EXTRA(MAXMIN, INFO), EXTRA_INFO(mensaje)]
         for id, valores in paneles.items():
-            if (pos_actual > NUM_ROWS_SHEET):
-                b = True
-            # endif
-
-            file_path_data_csv = os.path.join(
-                DATA_DIR+"/"+nombre[0]+"/", DATA_CSV_NAME+valores[0]+".csv")
-            ws_data = nuevaHoja(
-                wb, file_path_data_csv, f"Raw Data {nombre[0]}")
-
-            if valores[1] == "L":
-                tipo = LineChart()
-            elif valores[1] == "B":
-                tipo = BarChart()
+            tablas_panel[(nombre, id)] = tablaPanel(nombre, id, valores, tablas)
+            if valores[5] in EXTRAS_TABLA:
+                filas_tablas[(nombre[0], id)] = len(
+                    tablas_panel[(nombre, id)].medidas)
             # endif
+        # endfor
+    # endfor
 
-            x = x_offset
-            pos_derecha = False
-            if valores[2] == "P":
-                t = 0
-                if valores[5] == "INFO":
-                    t = 1
-                elif valores[5] == "MAXMIN":
-                    t = 2
-                # endif
-                pos_actual += evitarCorte(suma_pequeno+t, b)
-                ancho = EMU_ANCHO_TOTAL_PEQUEnO
-                alto = EMU_ALTURA_PEQUEnO
-                y = y_offset+casella_EMU*pos_actual
-                if pan_p == 0:
-                    pan_p += 1
-                elif pan_p == 1:
-                    x = x_offset_mitad
-                    pan_p = 0
-                    pos_derecha = True
-                    pos_actual += suma_pequeno
-                # endif
-            elif valores[2] == "M":
-                t = 0
-                if valores[5] == "INFO":
-                    t = 1
-                elif valores[5] == "MAXMIN":
-                    t = 2
-                # endif
-                pos_actual += evitarCorte(suma_mediano+t, b)
-                ancho = EMU_ANCHO_TOTAL
-                alto = EMU_ALTURA_MEDIANO
-                if pan_p == 1:
-                    pan_p = 0
-                    pos_actual += suma_pequeno
-                # endif
-                y = y_offset+casella_EMU*pos_actual
-                pos_actual += suma_mediano
-            elif valores[2] == "G":
-                t = 0
-                if valores[5] == "INFO":
-                    t = 1
-                elif valores[5] == "MAXMIN":
-                    t = 2
-                # endif
-                pos_actual += evitarCorte(suma_grande+t, b)
-                ancho = EMU_ANCHO_TOTAL
-                alto = EMU_ALTURA_GRANDE
-                if pan_p == 1:
-                    pan_p = 0
-                    pos_actual += suma_pequeno
-                # endif
-                y = y_offset+casella_EMU*pos_actual
-                pos_actual += suma_grande
-            # endif
-
-            chart = crear_grafico(
-                tipo, ws_data, valores[0], x, y, ancho, alto, binario=valores[3], leyenda=valores[4], series_colors=series_colors)
-
-            # Anadir el grafico a la hoja de trabajo
-            ws.add_chart(chart)
-
-            indice_datos = 1
-
-            if valores[5] == "INFO":
-                pos_actual += 1
-                if ws_data.max_row < 2:
-                    ws.merge_cells(f"C{str(pos_actual)}:AG{str(pos_actual)}")
-                    ws[f"C{str(pos_actual)}"] = valores[6]
-                    ws[f"C{str(pos_actual)}"].alignment = Alignment(
-                        horizontal='center', vertical='center')
-                # endif
-            # endif
-            elif valores[5] == "MAXMIN":
-                createMAXMIN(ws_source=ws_data,
-                             ws_destination=ws_datos, idx=indice_datos)
-
-                if not pos_derecha:
-                    pos_actual_aux = pos_actual + suma_pequeno + 1
-                    ws.merge_cells(
-                        f"A{str(pos_actual_aux)}:G{str(pos_actual_aux)}")
-                    ws[f"A{str(pos_actual_aux)}"] = valores[6] + " max.: "
-                    ws[f"A{str(pos_actual_aux)}"].alignment = Alignment(
-                        horizontal='center', vertical='center')
-                    ws.merge_cells(
-                        f"H{str(pos_actual_aux)}:I{str(pos_actual_aux)}")
-                    ws[f"H{str(pos_actual_aux)}"] = ws_datos[f"A{str(indice_datos+1)}"].value
-                    ws[f"J{str(pos_actual_aux)}"] = valores[7]
-                    ws.merge_cells(
-                        f"K{str(pos_actual_aux)}:P{str(pos_actual_aux)}")
-                    ws[f"K{str(pos_actual_aux)}"] = ws_datos[f"A{str(indice_datos+2)}"].value
-                    ws[f"K{str(pos_actual_aux)}"].alignment = Alignment(
-                        horizontal='center', vertical='center')
-
-                    pos_actual_aux += 1
-
-                    ws.merge_cells(
-                        f"A{str(pos_actual_aux)}:G{str(pos_actual_aux)}")
-                    ws[f"A{str(pos_actual_aux)}"] = valores[6] + " min.: "
-                    ws[f"A{str(pos_actual_aux)}"].alignment = Alignment(
-                        horizontal='center', vertical='center')
-                    ws.merge_cells(
-                        f"H{str(pos_actual_aux)}:I{str(pos_actual_aux)}")
-                    ws[f"H{str(pos_actual_aux)}"] = ws_datos[f"B{str(indice_datos+1)}"].value
-                    ws[f"J{str(pos_actual_aux)}"] = valores[7]
-                    ws.merge_cells(
-                        f"K{str(pos_actual_aux)}:P{str(pos_actual_aux)}")
-                    ws[f"K{str(pos_actual_aux)}"] = ws_datos[f"B{str(indice_datos+2)}"].value
-                    ws[f"K{str(pos_actual_aux)}"].alignment = Alignment(
-                        horizontal='center', vertical='center')
-                else:
-                    pos_derecha = False
-                    pos_actual += 1
-
-                    ws.merge_cells(
-                        f"S{str(pos_actual)}:Y{str(pos_actual)}")
-                    ws[f"S{str(pos_actual)}"] = valores[6] + " max.: "
-                    ws[f"S{str(pos_actual)}"].alignment = Alignment(
-                        horizontal='center', vertical='center')
-                    ws.merge_cells(
-                        f"Z{str(pos_actual)}:AA{str(pos_actual)}")
-                    ws[f"Z{str(pos_actual)}"] = ws_datos[f"A{str(indice_datos+1)}"].value
-                    ws[f"AB{str(pos_actual)}"] = valores[7]
-                    ws.merge_cells(
-                        f"AC{str(pos_actual)}:AH{str(pos_actual)}")
-                    ws[f"AC{str(pos_actual)}"] = ws_datos[f"A{str(indice_datos+2)}"].value
-                    ws[f"AC{str(pos_actual)}"].alignment = Alignment(
-                        horizontal='center', vertical='center')
-
-                    pos_actual += 1
-
-                    ws.merge_cells(
-                        f"S{str(pos_actual)}:Y{str(pos_actual)}")
-                    ws[f"S{str(pos_actual)}"] = valores[6] + " min.: "
-                    ws[f"S{str(pos_actual)}"].alignment = Alignment(
-                        horizontal='center', vertical='center')
-                    ws.merge_cells(
-                        f"Z{str(pos_actual)}:AA{str(pos_actual)}")
-                    ws[f"Z{str(pos_actual)}"] = ws_datos[f"B{str(indice_datos+1)}"].value
-                    ws[f"AB{str(pos_actual)}"] = valores[7]
-                    ws.merge_cells(
-                        f"AC{str(pos_actual)}:AH{str(pos_actual)}")
-                    ws[f"AC{str(pos_actual)}"] = ws_datos[f"B{str(indice_datos+2)}"].value
-                    ws[f"AC{str(pos_actual)}"].alignment = Alignment(
-                        horizontal='center', vertical='center')
-                # endif
-                indice_datos += 4
-            elif valores[5] == "TABLA":
-                pos_actual += 1
-                createMAXMIN(ws_source=ws_data,
-                             ws_destination=ws_datos, idx=indice_datos)
-
-                ws.merge_cells(f"J{str(pos_actual)}:O{str(pos_actual)}")
-                ws[f"J{pos_actual}"] = valores[6] + " MAX"
-
-                ws.merge_cells(f"P{str(pos_actual)}:U{str(pos_actual)}")
-                ws[f"P{pos_actual}"] = "Fecha de maxima:"
-
-                ws.merge_cells(f"V{str(pos_actual)}:AA{str(pos_actual)}")
-                ws[f"V{pos_actual}"] = valores[6] + " MIN"
-
-                ws.merge_cells(f"AB{str(pos_actual)}:AG{str(pos_actual)}")
-                ws[f"AB{pos_actual}"] = "Fecha de minimo:"
-
-                apply_style_to_range(
-                    ws, f"J{str(pos_actual)}:AG{str(pos_actual)}")
-
-                pos_actual += 1
-                x = 0
-                for col_idx, col in enumerate(ws_data.iter_cols(min_col=2)):
-                    fill = PatternFill(start_color=series_colors_aux[(x) % len(
-                        series_colors_aux)], end_color=series_colors_aux[(x) % len(series_colors_aux)], fill_type='solid')
-
-                    ws.merge_cells(
-                        f"A{str(pos_actual)}:I{str(pos_actual)}")
-                    ws[f"A{str(pos_actual)}"] = str(col[0].value)
-                    ws[f"A{str(pos_actual)}"].border = border
-                    ws[f"A{str(pos_actual)}"].fill = fill
-
-                    ws.merge_cells(
-                        f"J{str(pos_actual)}:O{str(pos_actual)}")
-                    ws[f"J{str(pos_actual)}"] = ws_datos[f"A{str(indice_datos+1)}"].value
-                    ws[f"J{str(pos_actual)}"].border = border
-                    ws[f"J{str(pos_actual)}"].fill = fill
-
-                    ws.merge_cells(
-                        f"P{str(pos_actual)}:U{str(pos_actual)}")
-                    ws[f"P{str(pos_actual)}"] = ws_datos[f"A{str(indice_datos+2)}"].value
-                    ws[f"P{str(pos_actual)}"].border = border
-                    ws[f"P{str(pos_actual)}"].fill = fill
-
-                    ws.merge_cells(
-                        f"V{str(pos_actual)}:AA{str(pos_actual)}")
-                    ws[f"V{str(pos_actual)}"] = ws_datos[f"B{str(indice_datos+1)}"].value
-                    ws[f"V{str(pos_actual)}"].border = border
-                    ws[f"V{str(pos_actual)}"].fill = fill
-
-                    ws.merge_cells(
-                        f"AB{str(pos_actual)}:AG{str(pos_actual)}")
-                    ws[f"AB{str(pos_actual)}"] = ws_datos[f"B{str(indice_datos+2)}"].value
-                    ws[f"AB{str(pos_actual)}"].border = border
-                    ws[f"AB{str(pos_actual)}"].fill = fill
-
-                    apply_style_to_range(
-                        ws, f"A{str(pos_actual)}:AG{str(pos_actual)}")
-
-                    x += 1
-                    pos_actual += 1
-                    indice_datos += 4
-                # endfor
-            caca = 10
+    # Maquetacion (calculada una vez por configuracion) y dibujo
+    plan = planificarInforme(dashboards, filas_tablas,
+                             ANCHOPX_CELDA, ALTOPX_CELDA, NUM_ROWS_SHEET)
+    if progreso is not None:
+        progreso("informe", 0, len(tablas_panel))
+    # endif
+    dibujados = 0
+    for registro in plan:
+        nombre = registro["dashboard"]
+        if registro["tipo"] == "dashboard":
+            pos_actual = registro["fila"]
+            ws[f"C{str(pos_actual)}"] = nombre[1]
+            ws.merge_cells(f"C{str(pos_actual)}:AG{str(pos_actual)}")
+            ws[f"C{str(pos_actual)}"].style = ESTILO_TITULO_DASHBOARD
+        else:
+            dibujarPanel(wb, ws, ws_datos, registro, dashboards[nombre][registro["id"]],
+                         tablas_panel[(nombre, registro["id"])])
+            dibujados += 1
+            if progreso is not None:
+                progreso("informe", dibujados, len(tablas_panel))
             # endif
-            series_colors = series_colors[1:] + series_colors[:1]
-            series_colors_aux = series_colors_aux[1:] + series_colors_aux[:1]
-        # endfor
+        # endif
     # endfor
 
     # Anadir pie de pagina
@@ -990,30 +1429,128 @@ def informe(titulo, dashboards):
     ws.evenFooter.center.text = "&[Page]"
 
     # Guardar el archivo como informe_semanal_alamo_v2.xlsx
-    wb.save(
-        f"{INFORMES_DIR}{str(time_finish_aux.strftime('%Y-%m-%d'))}_informe_{TITULO}.xlsx")
-    return str(f"{str(time_finish_aux.strftime('%Y-%m-%d'))}_informe_{TITULO}.xlsx")
+    nombre_archivo = nombreInforme()
+    if destino is None:
+        if directorio is None:
+            directorio = INFORMES_DIR
+        # endif
+        destino = os.path.join(directorio, nombre_archivo)
+    # endif
+    guardarLibro(wb, destino)
+    return nombre_archivo
 # endfunction
 ##################################################################################################
 
-def main():
+def main(sin_grafana=False, progreso=None, directorio=None, ventana=None, destino=None, sin_disco=False):
+    # sin_grafana: regenerar el informe con las tablas binarias guardadas en
+    # la ultima ejecucion, sin consultar Grafana.
+    # progreso(etapa, hechos, total): llamada al avanzar cada etapa
+    # ("consultas", "datos" e "informe"), por ejemplo para la API de trabajos.
+    # directorio: donde se guarda el excel (por defecto INFORMES_DIR).
+    # ventana: (TIME_START, TIME_FINISH) en ISO; por defecto ventanaInforme().
+    # destino: flujo binario donde se escribe el excel en vez de en directorio.
+    # sin_disco: no escribir los archivos intermedios (GUARDAR_JSON/CSV/TABLAS)
+    # ni las hojas de datos en temporales (se quedan en memoria). El almacen
+    # y las caches siguen escribiendo en sus directorios si estan activos.
+    # El rango se calcula en cada llamada para poder reutilizar el modulo
+    # cargado, pero vive en variables globales: no se debe llamar a main() a
+    # la vez desde varios hilos con el mismo modulo
+    global TIME_FINISH, TIME_START, SIN_DISCO
+    SIN_DISCO = sin_disco
+    if directorio is None:
+        directorio = INFORMES_DIR
+    # endif
+    if ventana is None:
+        ventana = ventanaInforme()
+    # endif
+    TIME_START, TIME_FINISH = ventana
+    if sin_grafana:
+        trabajos = []
+        i = 0
+        for clave, valor in DASHBOARDS.items():
+            trabajos.append((DATA_DIR+"/"+clave[0]+"/", UIDS[i], valor))
+            i += 1
+        # endfor
+        tablas = cargarTablas(trabajos)
+        for tabla in tablas.values():
+            if tabla.rango is not None and tabla.rango != (0, 0):
+                # El informe muestra el rango de los datos guardados
+                TIME_START = msAIso(tabla.rango[0])
+                TIME_FINISH = msAIso(tabla.rango[1])
+                break
+            # endif
+        # endfor
+        os.makedirs(directorio, exist_ok=True)
+        file_name = informe("Informe Semanal CT Cristo",
+                            DASHBOARDS, tablas, progreso, directorio, destino)
+        print(file_name)
+        return file_name
+    # endif
     if ACTIVAR_SELECCION_RANGO_DE_FECHAS:
         mostrar_popup()
     # endif
+    # Estadisticas de las peticiones de esta ejecucion (el cliente es compartido)
+    cliente = obtenerClienteGrafana().ejecucion()
+    cache_consultas = obtenerCacheConsultas()
+    if cache_consultas is not None:
+        alinearVentana(CACHE_CONSULTAS_ALINEACION)
+    # endif
+    # Una sola cache de metadatos para todos los dashboards de la ejecucion
+    cache_dashboards = CacheDashboards(
+        cliente, CACHE_DIR, ttl=CACHE_TTL_DASHBOARDS)
+    planificador = PlanificadorConsultas(
+        GRAFANA_CONSULTAS_PARALELAS, GRAFANA_CONSULTAS_POR_DATASOURCE)
+    almacen = None
+    if ALMACEN_DIR not in [None, ""]:
+        almacen = AlmacenSeries(
+            ALMACEN_DIR, retencion_dias=ALMACEN_RETENCION_DIAS)
+    # endif
+    tamano_tramos = None
+    if GRAFANA_TRAMO_HORAS > 0:
+        tamano_tramos = TamanoTramos(GRAFANA_TRAMO_HORAS*60*60*1000, GRAFANA_TRAMO_SEGUNDOS_OBJETIVO,
+                                     GRAFANA_TRAMO_MB_OBJETIVO*1024*1024, os.path.join(
+                                         CACHE_DIR, "tramos.json"),
+                                     adaptativo=GRAFANA_TRAMO_ADAPTATIVO)
+    # endif
+    os.makedirs(directorio, exist_ok=True)
+    trabajos = []
     i = 0
     for clave, valor in DASHBOARDS.items():
         os.makedirs(DATA_DIR+"/" + clave[0]+"/", exist_ok=True)
-        os.makedirs(INFORMES_DIR, exist_ok=True)
-        obtenerDatosGrafana(
-            DATA_DIR+"/"+clave[0]+"/", GRAFANA_URL, API_KEY, UIDS[i], valor)
-        excelDeDatos(DATA_DIR+"/" + clave[0]+"/", valor)
+        trabajos.append((DATA_DIR+"/"+clave[0]+"/", UIDS[i], valor))
         i += 1
     # endfor
-    file_name = informe("Informe Semanal CT Cristo", DASHBOARDS)
+    # Consultar todos los paneles de todos los dashboards a la vez
+    firmas = {}
+    datos = obtenerDatosDashboards(trabajos, cliente, cache_dashboards,
+                                   planificador, almacen, tamano_tramos, cache_consultas, progreso, firmas)
+    if tamano_tramos is not None:
+        tamano_tramos.guardar()
+    # endif
+    tablas = {}
+    for i, (data_dir, dashboard_uid, valor) in enumerate(trabajos):
+        if progreso is not None:
+            progreso("datos", i, len(trabajos))
+        # endif
+        for panel_id, tabla in excelDeDatos(data_dir, valor, dashboard_uid, almacen, datos, firmas).items():
+            tablas[(data_dir, panel_id)] = tabla
+        # endfor
+    # endfor
+    if progreso is not None:
+        progreso("datos", len(trabajos), len(trabajos))
+    # endif
+    if DEBUG_FINAL:
+        print(f"\nPeticiones a Grafana: {cliente.resumen()}")
+        if cache_consultas is not None:
+            print(f"\nCache de consultas: {cache_consultas.resumen()}")
+        # endif
+    # endif
+    file_name = informe("Informe Semanal CT Cristo",
+                        DASHBOARDS, tablas, progreso, directorio, destino)
     print(file_name)
     return file_name
 # endfunction
 
 if __name__ == "__main__":
-    main()
+    main(sin_grafana="--sin-grafana" in sys.argv[1:])
 # endif
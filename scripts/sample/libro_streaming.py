@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# --------------------------------------------------------------------------------
+#
+#   Hojas de datos en streaming dentro de un libro normal de openpyxl. Las
+#   hojas "Raw Data" solo se escriben fila a fila, asi que se crean como hojas
+#   write-only de openpyxl: cada fila se pasa a XML y va a un fichero temporal
+#   en el momento de anadirla, en vez de quedarse como objetos Cell en memoria
+#   hasta guardar el libro. La hoja "Informe" y el resto siguen siendo hojas
+#   normales (con estilos, celdas combinadas, imagenes y graficos), y los
+#   graficos referencian las hojas de datos por su nombre como siempre.
+#
+#   openpyxl solo admite hojas write-only en libros write_only, asi que el
+#   libro se guarda con guardarLibro, que escribe esas hojas igual que lo hace
+#   openpyxl en modo write_only. El archivo se escribe en una ruta temporal y
+#   se renombra al terminar, de modo que quien lo lea nunca ve un xlsx a medias,
+#   o directamente en un flujo binario (por ejemplo la respuesta HTTP).
+#
+#   Autor: Marc Llobera Villalonga
+#
+# --------------------------------------------------------------------------------
+
+import os
+import threading
+from zipfile import ZipFile, ZIP_DEFLATED
+from openpyxl.drawing.spreadsheet_drawing import SpreadsheetDrawing
+from openpyxl.worksheet._write_only import WriteOnlyWorksheet
+from openpyxl.writer.excel import ExcelWriter
+
+
+def crearHojaStreaming(wb, titulo):
+    # Hoja write-only anadida a un libro normal: solo admite append()
+    hoja = WriteOnlyWorksheet(parent=wb, title=titulo)
+    wb._add_sheet(hoja)
+    return hoja
+# endfunction
+
+
+class EscritorLibro(ExcelWriter):
+    def write_worksheet(self, ws):
+        if not isinstance(ws, WriteOnlyWorksheet):
+            return super().write_worksheet(ws)
+        # endif
+        # Las filas ya estan en el fichero temporal de la hoja: se cierra y
+        # se copia al zip
+        ws._drawing = SpreadsheetDrawing()
+        ws._drawing.charts = ws._charts
+        ws._drawing.images = ws._images
+        if not ws.closed:
+            ws.close()
+        # endif
+        writer = ws._writer
+        ws._rels = writer._rels
+        self._archive.write(writer.out, ws.path[1:])
+        self.manifest.append(ws)
+        writer.cleanup()
+    # endfunction
+# endclass
+
+
+def descartarHojasStreaming(wb):
+    # Tras un error al guardar: cierra las hojas write-only que quedaban por
+    # escribir y borra sus ficheros temporales
+    for ws in wb._sheets:
+        if not isinstance(ws, WriteOnlyWorksheet) or getattr(ws, "_writer", None) is None:
+            continue
+        # endif
+        try:
+            if not ws.closed:
+                ws.close()
+            # endif
+        except (OSError, ValueError):
+            pass
+        # endtry
+        try:
+            ws._writer.cleanup()
+        except (OSError, ValueError):
+            pass
+        # endtry
+    # endfor
+# endfunction
+
+
+def guardarLibro(wb, ruta):
+    # Equivalente a wb.save(ruta) para libros con hojas de crearHojaStreaming.
+    # ruta tambien puede ser un flujo binario abierto (no hace falta que admita
+    # seek: el zip se escribe de principio a fin); el flujo no se cierra
+    if not isinstance(ruta, (str, bytes, os.PathLike)):
+        try:
+            with ZipFile(ruta, "w", ZIP_DEFLATED, allowZip64=True) as archivo:
+                EscritorLibro(wb, archivo).save()
+            # endwith
+        except BaseException:
+            descartarHojasStreaming(wb)
+            raise
+        # endtry
+        return
+    # endif
+    # En disco se escribe en un temporal y se renombra (atomico en el mismo directorio)
+    temporal = ruta + ".%d.%d.tmp" % (os.getpid(), threading.get_ident())
+    try:
+        with ZipFile(temporal, "w", ZIP_DEFLATED, allowZip64=True) as archivo:
+            EscritorLibro(wb, archivo).save()
+        # endwith
+        os.replace(temporal, ruta)
+    except BaseException:
+        descartarHojasStreaming(wb)
+        raise
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        # endif
+    # endtry
+# endfunction
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# --------------------------------------------------------------------------------
+#
+#   Planificador de la maquetacion de la hoja "Informe". A partir de la
+#   definicion de los dashboards (DASHBOARDS de config.py) y del numero de
+#   filas de las tablas de los extras de cada panel calcula, sin tocar el
+#   libro, donde va cada cosa: la fila del titulo de cada dashboard y, para
+#   cada panel, la posicion (EMU) y el tamano (px) del grafico, si va en la
+#   mitad derecha, la primera fila de su extra y las filas saltadas para no
+#   cortar el grafico entre paginas.
+#
+#   El plan solo depende de sus entradas, asi que se guarda por el hash de
+#   la configuracion y se reutiliza mientras no cambie. Se guardan como mucho
+#   MAX_PLANES planes (los usados hace mas tiempo salen primero), para que el
+#   servidor Flask no acumule uno por cada cambio de configuracion.
+#
+#   Autor: Marc Llobera Villalonga
+#
+# --------------------------------------------------------------------------------
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from openpyxl.utils.units import pixels_to_EMU
+
+# Filas que ocupa cada tamano de grafico
+FILAS_PEQUENO = 9
+FILAS_MEDIANO = 6
+FILAS_GRANDE = 17
+# Fila en la que empieza el primer dashboard
+FILA_INICIAL = 4
+# Extras que anaden una tabla con una fila por measurement
+EXTRAS_TABLA = ["TABLA", "PERCENTILES", "CICLO"]
+
+# Planes ya calculados por hash de la configuracion (LRU)
+MAX_PLANES = 32
+_planes = OrderedDict()
+_planes_lock = threading.Lock()
+
+
+def claveMaquetacion(dashboards, filas_tablas, anchopx_celda, altopx_celda, filas_pagina):
+    # Hash de todo lo que influye en el plan
+    contenido = {"dashboards": [[list(clave), [[id, valores] for id, valores in paneles.items()]]
+                                for clave, paneles in dashboards.items()],
+                 "filas": sorted([list(clave) + [n] for clave, n in filas_tablas.items()], key=str),
+                 "celda": [anchopx_celda, altopx_celda], "filas_pagina": filas_pagina}
+    return hashlib.sha256(json.dumps(contenido, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+# endfunction
+
+
+def planificarInforme(dashboards, filas_tablas, anchopx_celda=18, altopx_celda=20, filas_pagina=48):
+    # filas_tablas: {(nombre del dashboard, id del panel): measurements} de los
+    # paneles con extra TABLA/PERCENTILES/CICLO. Devuelve la lista (que no se
+    # debe modificar) de registros del plan en orden de dibujo
+    clave = claveMaquetacion(dashboards, filas_tablas,
+                             anchopx_celda, altopx_celda, filas_pagina)
+    with _planes_lock:
+        plan = _planes.get(clave)
+        if plan is not None:
+            _planes.move_to_end(clave)
+            return plan
+        # endif
+    # endwith
+    plan = _planificar(dashboards, filas_tablas, anchopx_celda,
+                       altopx_celda, filas_pagina)
+    with _planes_lock:
+        _planes[clave] = plan
+        _planes.move_to_end(clave)
+        while len(_planes) > MAX_PLANES:
+            _planes.popitem(last=False)
+        # endwhile
+    # endwith
+    return plan
+# endfunction
+
+
+def _planificar(dashboards, filas_tablas, anchopx_celda, altopx_celda, filas_pagina):
+    ancho_total = anchopx_celda*34
+    ancho_pequeno = ancho_total/2
+    alto_pequeno = (altopx_celda/2)*16
+    alto_mediano = (altopx_celda/4)*20
+    alto_grande = alto_pequeno*2
+    x_offset = pixels_to_EMU(anchopx_celda/2)  # Offset horizontal en EMUs
+    x_offset_mitad = x_offset*2*18
+    y_offset = pixels_to_EMU(altopx_celda/4)   # Offset vertical en EMUs
+    fila_emu = pixels_to_EMU(altopx_celda)
+
+    plan = []
+    pos_actual = FILA_INICIAL
+    b = False
+
+    def evitarCorte(l):
+        # Filas a saltar para que un bloque de l filas no quede cortado entre paginas
+        if b:
+            x = filas_pagina - 1
+        else:
+            x = filas_pagina
+        # endif
+        resto = pos_actual % x
+        if resto > x-l:
+            return x-resto+1
+        # endif
+        if pos_actual > 95 - FILAS_GRANDE and pos_actual < 130:
+            return 1
+        else:
+            return 0
+        # endif
+    # endfunction
+
+    for nombre, paneles in dashboards.items():
+        z = evitarCorte(2)
+        if (z == 0):
+            pos_actual += 1
+        else:
+            pos_actual += z
+        # endif
+        plan.append({"tipo": "dashboard", "dashboard": nombre,
+                    "fila": pos_actual, "salto": z})
+        pos_actual += 1
+
+        pan_p = 0
+        for indice, (id, valores) in enumerate(paneles.items()):
+            if (pos_actual > filas_pagina):
+                b = True
+            # endif
+            extra = valores[5]
+            t = 0
+            if extra == "INFO":
+                t = 1
+            elif extra == "MAXMIN":
+                t = 2
+            # endif
+
+            x = x_offset
+            pos_derecha = False
+            if valores[2] == "P":
+                salto = evitarCorte(FILAS_PEQUENO+t)
+                pos_actual += salto
+                ancho = ancho_pequeno
+                alto = alto_pequeno
+                y = y_offset+fila_emu*pos_actual
+                if pan_p == 0:
+                    pan_p += 1
+                elif pan_p == 1:
+                    x = x_offset_mitad
+                    pan_p = 0
+                    pos_derecha = True
+                    pos_actual += FILAS_PEQUENO
+                # endif
+            else:
+                filas = FILAS_MEDIANO if valores[2] == "M" else FILAS_GRANDE
+                salto = evitarCorte(filas+t)
+                pos_actual += salto
+                ancho = ancho_total
+                alto = alto_mediano if valores[2] == "M" else alto_grande
+                if pan_p == 1:
+                    pan_p = 0
+                    pos_actual += FILAS_PEQUENO
+                # endif
+                y = y_offset+fila_emu*pos_actual
+                pos_actual += filas
+            # endif
+
+            # Primera fila del extra y filas que ocupa
+            fila_extra = None
+            if extra == "INFO":
+                pos_actual += 1
+                fila_extra = pos_actual
+            elif extra == "MAXMIN":
+                if not pos_derecha:
+                    # Debajo del grafico de la izquierda, sin mover pos_actual
+                    fila_extra = pos_actual + FILAS_PEQUENO + 1
+                else:
+                    fila_extra = pos_actual + 1
+                    pos_actual += 2
+                # endif
+            elif extra in EXTRAS_TABLA:
+                pos_actual += 1
+                fila_extra = pos_actual
+                # Fila de titulos y una fila por measurement
+                pos_actual += 1 + filas_tablas.get((nombre[0], id), 0)
+            # endif
+
+            plan.append({"tipo": "panel", "dashboard": nombre, "id": id, "indice": indice,
+                         "x": x, "y": y, "ancho": ancho, "alto": alto, "derecha": pos_derecha,
+                         "fila_extra": fila_extra, "salto": salto})
+        # endfor
+    # endfor
+    return plan
+# endfunction
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# --------------------------------------------------------------------------------
+#
+#   Capa de metadatos de los dashboards de Grafana. Descarga cada dashboard una
+#   sola vez por ejecucion y lo guarda en una cache en disco indexada por UID y
+#   version del dashboard, con un tiempo de vida (TTL). Tambien construye un
+#   indice id -> panel que incluye los paneles anidados dentro de filas.
+#
+#   Autor: Marc Llobera Villalonga
+#
+# --------------------------------------------------------------------------------
+
+import os
+import json
+import time
+
+
+def indexarPaneles(dashboard):
+    # Recorre los paneles del dashboard incluyendo los que estan dentro de
+    # filas ("row") plegadas, que Grafana guarda en la clave "panels" de la fila
+    indice = {}
+    pendientes = list(dashboard.get("panels", []))
+    while pendientes:
+        panel = pendientes.pop(0)
+        if panel.get("id") is not None and panel.get("id") not in indice:
+            indice[panel.get("id")] = panel
+        # endif
+        pendientes.extend(panel.get("panels", []))
+    # endwhile
+    return indice
+# endfunction
+
+
+class CacheDashboards:
+    def __init__(self, cliente, directorio, ttl=3600):
+        # cliente: ClienteGrafana compartido (ver cliente_grafana.py)
+        self.cliente = cliente
+        self.directorio = directorio
+        self.ttl = ttl
+        # Dashboards ya resueltos en esta ejecucion: uid -> (dashboard, indice)
+        self.memoria = {}
+        if self.directorio not in [None, ""]:
+            os.makedirs(self.directorio, exist_ok=True)
+        # endif
+    # endfunction
+
+    def _ruta(self, dashboard_uid):
+        return os.path.join(self.directorio, f"dashboard_{dashboard_uid}.json")
+    # endfunction
+
+    def _leerDisco(self, dashboard_uid):
+        if self.directorio in [None, ""]:
+            return None
+        # endif
+        try:
+            with open(self._ruta(dashboard_uid), "r") as archivo:
+                return json.load(archivo)
+            # endwith
+        except (OSError, ValueError):
+            return None
+        # endtry
+    # endfunction
+
+    def _guardarDisco(self, dashboard_uid, version, dashboard):
+        if self.directorio in [None, ""]:
+            return
+        # endif
+        entrada = {"uid": dashboard_uid, "version": version,
+                   "guardado": time.time(), "dashboard": dashboard}
+        ruta = self._ruta(dashboard_uid)
+        # Escribir en un temporal y renombrar para no dejar archivos a medias
+        with open(ruta + ".tmp", "w") as archivo:
+            json.dump(entrada, archivo)
+        # endwith
+        os.replace(ruta + ".tmp", ruta)
+    # endfunction
+
+    def versionActual(self, dashboard_uid):
+        # Consulta barata: solo la ultima version del dashboard, sin el JSON completo
+        response = self.cliente.get(
+            f"/api/dashboards/uid/{dashboard_uid}/versions", params={"limit": 1})
+        if response.status_code != 200:
+            return None
+        # endif
+        versiones = response.json()
+        # Grafana 11+ devuelve {"versions": [...]}, las anteriores una lista
+        if isinstance(versiones, dict):
+            versiones = versiones.get("versions", [])
+        # endif
+        if not versiones:
+            return None
+        # endif
+        return versiones[0].get("version")
+    # endfunction
+
+    def _descargar(self, dashboard_uid):
+        response = self.cliente.get(f"/api/dashboards/uid/{dashboard_uid}")
+        if response.status_code != 200:
+            print(
+                f"\nError {response.status_code}: No se pudieron obtener los datos del dashboard")
+            return None
+        # endif
+        dashboard = response.json().get("dashboard", {})
+        self._guardarDisco(dashboard_uid, dashboard.get("version"), dashboard)
+        return dashboard
+    # endfunction
+
+    def obtener(self, dashboard_uid):
+        if dashboard_uid in self.memoria:
+            return self.memoria[dashboard_uid][0]
+        # endif
+
+        dashboard = None
+        entrada = self._leerDisco(dashboard_uid)
+        if entrada is not None:
+            if time.time() - entrada.get("guardado", 0) < self.ttl:
+                # Dentro del TTL no se hace ninguna peticion
+                dashboard = entrada.get("dashboard")
+            elif self.versionActual(dashboard_uid) == entrada.get("version"):
+                # Caducada pero la version no ha cambiado: se renueva sin descargar
+                dashboard = entrada.get("dashboard")
+                self._guardarDisco(
+                    dashboard_uid, entrada.get("version"), dashboard)
+            # endif
+        # endif
+
+        if dashboard is None:
+            dashboard = self._descargar(dashboard_uid)
+        # endif
+        if dashboard is None:
+            return None
+        # endif
+
+        self.memoria[dashboard_uid] = (dashboard, indexarPaneles(dashboard))
+        return dashboard
+    # endfunction
+
+    def panel(self, dashboard_uid, panel_id):
+        if self.obtener(dashboard_uid) is None:
+            return None
+        # endif
+        return self.memoria[dashboard_uid][1].get(panel_id)
+    # endfunction
+# endclass
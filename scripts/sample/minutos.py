@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# --------------------------------------------------------------------------------
+#
+#   Agrupacion por minutos de las series de Grafana. Los tiempos (epoch en ms)
+#   se pasan a minutos enteros de golpe, sin crear fechas para cada punto, y
+#   el texto de cada minuto ("dd-mm-YYYY HH:MM") solo se genera al escribirlo.
+#   Si numpy esta instalado se usa para vectorizar el calculo; si no, se usa
+#   la version en Python puro, que da el mismo resultado.
+#
+#   Autor: Marc Llobera Villalonga
+#
+# --------------------------------------------------------------------------------
+
+from array import array
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+# endtry
+
+MS_MINUTO = 60*1000
+EPOCH = datetime(1970, 1, 1)
+
+
+def etiquetaMinuto(minuto):
+    # Minuto desde epoch -> "dd-mm-YYYY HH:MM" (UTC)
+    return (EPOCH + timedelta(minutes=minuto)).strftime("%d-%m-%Y %H:%M")
+# endfunction
+
+
+def columnaPorMinuto(tiempos, valores):
+    # Devuelve (minutos, enteros): arrays int64 ordenados por minuto con el
+    # ultimo valor valido de cada minuto truncado a entero, como en el CSV.
+    # Los huecos (None o NaN) se descartan
+    if np is not None and len(tiempos) > 0:
+        try:
+            v = np.asarray(valores, dtype=float)
+        except TypeError:
+            # Lista con None
+            v = np.array([np.nan if x is None else x for x in valores], dtype=float)
+        # endtry
+        validos = ~np.isnan(v)
+        minutos = np.asarray(tiempos, dtype=np.int64)[validos] // MS_MINUTO
+        enteros = v[validos].astype(np.int64)
+        if minutos.size > 1 and (minutos[1:] < minutos[:-1]).any():
+            # Orden estable: entre puntos del mismo minuto sigue ganando el ultimo
+            orden = np.argsort(minutos, kind="stable")
+            minutos = minutos[orden]
+            enteros = enteros[orden]
+        # endif
+        ultimos = np.ones(minutos.size, dtype=bool)
+        ultimos[:-1] = minutos[1:] != minutos[:-1]
+        return array("q", minutos[ultimos].tolist()), array("q", enteros[ultimos].tolist())
+    # endif
+    ultimos = {}
+    for t, v in zip(tiempos, valores):
+        if v is not None and v == v:
+            ultimos[int(t) // MS_MINUTO] = int(v)
+        # endif
+    # endfor
+    minutos = sorted(ultimos)
+    return array("q", minutos), array("q", (ultimos[m] for m in minutos))
+# endfunction
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# --------------------------------------------------------------------------------
+#
+#   Planificador de consultas concurrentes. Ejecuta las consultas de todos los
+#   paneles de todos los dashboards en un pool de hilos con un limite global de
+#   consultas simultaneas y otro limite por datasource. Los resultados se
+#   devuelven siempre en el mismo orden en que se anadieron las tareas, de modo
+#   que el informe sale igual que con una ejecucion secuencial.
+#
+#   Autor: Marc Llobera Villalonga
+#
+# --------------------------------------------------------------------------------
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class PlanificadorConsultas:
+    def __init__(self, max_global=8, max_por_datasource=4):
+        self.max_global = max(1, max_global)
+        self.max_por_datasource = max(1, max_por_datasource)
+    # endfunction
+
+    def ejecutar(self, tareas, alTerminar=None):
+        # tareas: lista de (clave_datasource, funcion, argumentos)
+        # alTerminar(hechas, total): llamada cada vez que termina una tarea
+        # Devuelve la lista de resultados en el orden de las tareas
+        resultados = [None] * len(tareas)
+        if not tareas:
+            return resultados
+        # endif
+
+        # Una cola por datasource conservando el orden de llegada
+        colas = {}
+        for i, (clave, _, _) in enumerate(tareas):
+            colas.setdefault(clave, deque()).append(i)
+        # endfor
+        activas_datasource = {clave: 0 for clave in colas}
+        en_curso = {}
+        hechas = 0
+
+        with ThreadPoolExecutor(max_workers=min(self.max_global, len(tareas))) as pool:
+            while colas or en_curso:
+                # Lanzar tareas mientras haya hueco global y en su datasource
+                lanzada = True
+                while lanzada and len(en_curso) < self.max_global:
+                    lanzada = False
+                    for clave in list(colas.keys()):
+                        if len(en_curso) >= self.max_global:
+                            break
+                        # endif
+                        if activas_datasource[clave] >= self.max_por_datasource:
+                            continue
+                        # endif
+                        i = colas[clave].popleft()
+                        if not colas[clave]:
+                            del colas[clave]
+                        # endif
+                        _, funcion, argumentos = tareas[i]
+                        en_curso[pool.submit(funcion, *argumentos)] = (i, clave)
+                        activas_datasource[clave] += 1
+                        lanzada = True
+                    # endfor
+                # endwhile
+
+                terminadas, _ = wait(list(en_curso), return_when=FIRST_COMPLETED)
+                for futuro in terminadas:
+                    i, clave = en_curso.pop(futuro)
+                    activas_datasource[clave] -= 1
+                    # Si la tarea fallo se propaga la excepcion como en secuencial
+                    resultados[i] = futuro.result()
+                    hechas += 1
+                    if alTerminar is not None:
+                        alTerminar(hechas, len(tareas))
+                    # endif
+                # endfor
+            # endwhile
+        # endwith
+        return resultados
+    # endfunction
+# endclass
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# --------------------------------------------------------------------------------
+#
+#   Reduccion de puntos de las series de los graficos. Excel no puede mostrar
+#   mas puntos que pixeles tiene el grafico, asi que las filas de la hoja de
+#   datos se reducen a un maximo por grafico antes de escribirlas:
+#
+#   - LTTB (Largest-Triangle-Three-Buckets): conserva la forma visual de la
+#     serie eligiendo en cada bloque el punto que forma el triangulo mas grande.
+#   - MINMAX: conserva el minimo y el maximo de cada bloque.
+#
+#   En ambos casos se conservan siempre el primer y ultimo punto y el maximo y
+#   minimo globales de cada serie, y en las series binarias todos los cambios
+#   de estado.
+#
+#   numpy no es una dependencia del proyecto, asi que normalmente se usa la
+#   version en Python puro: un recorrido por bloque con las constantes del
+#   triangulo calculadas una sola vez. Si numpy esta instalado se usa para
+#   vectorizar el calculo de las areas de cada bloque, con el mismo resultado.
+#
+#   Autor: Marc Llobera Villalonga
+#
+# --------------------------------------------------------------------------------
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+# endtry
+
+
+def _bloques(n, puntos):
+    # Limites [inicio, fin) de los puntos-2 bloques interiores (sin el primer y ultimo punto)
+    num_bloques = puntos - 2
+    tamano = (n - 2) / num_bloques
+    return [(int(i * tamano) + 1, int((i + 1) * tamano) + 1) for i in range(num_bloques)]
+# endfunction
+
+
+def lttb(valores, puntos):
+    # Indices elegidos por LTTB (la x es la posicion de la fila)
+    n = len(valores)
+    if puntos >= n or puntos < 3:
+        return list(range(n))
+    # endif
+    bloques = _bloques(n, puntos)
+    if np is not None:
+        y = np.asarray(valores, dtype=float)
+    # endif
+    seleccion = [0]
+    a = 0
+    for b, (inicio, fin) in enumerate(bloques):
+        # Media del bloque siguiente (o el ultimo punto)
+        if b + 1 < len(bloques):
+            sig_inicio, sig_fin = bloques[b + 1]
+        else:
+            sig_inicio, sig_fin = n - 1, n
+        # endif
+        media_x = (sig_inicio + sig_fin - 1) / 2.0
+        if np is not None:
+            media_y = float(y[sig_inicio:sig_fin].mean())
+            x = np.arange(inicio, fin)
+            areas = np.abs((a - media_x) * (y[inicio:fin] - y[a]) -
+                           (a - x) * (media_y - y[a]))
+            a = inicio + int(areas.argmax())
+        else:
+            media_y = sum(valores[sig_inicio:sig_fin]) / (sig_fin - sig_inicio)
+            # Area (doble) del triangulo entre el punto elegido antes (a), el
+            # punto i y la media del bloque siguiente; gana la primera mayor
+            y_a = valores[a]
+            dx = a - media_x
+            dy = media_y - y_a
+            mejor = -1.0
+            elegido = inicio
+            for i in range(inicio, fin):
+                area = abs(dx * (valores[i] - y_a) - (a - i) * dy)
+                if area > mejor:
+                    mejor = area
+                    elegido = i
+                # endif
+            # endfor
+            a = elegido
+        # endif
+        seleccion.append(a)
+    # endfor
+    seleccion.append(n - 1)
+    return seleccion
+# endfunction
+
+
+def minMax(valores, puntos):
+    # Indices del minimo y el maximo de cada bloque (dos puntos por bloque)
+    n = len(valores)
+    if puntos >= n or puntos < 4:
+        return list(range(n))
+    # endif
+    seleccion = [0, n - 1]
+    bloques = _bloques(n, puntos // 2 + 2)
+    if np is not None:
+        y = np.asarray(valores, dtype=float)
+        for inicio, fin in bloques:
+            seleccion.append(inicio + int(y[inicio:fin].argmin()))
+            seleccion.append(inicio + int(y[inicio:fin].argmax()))
+        # endfor
+    else:
+        for inicio, fin in bloques:
+            bloque = valores[inicio:fin]
+            seleccion.append(inicio + bloque.index(min(bloque)))
+            seleccion.append(inicio + bloque.index(max(bloque)))
+        # endfor
+    # endif
+    return seleccion
+# endfunction
+
+
+def flancos(valores):
+    # Indices de los cambios de estado (el punto anterior y el nuevo estado)
+    if np is not None:
+        y = np.asarray(valores, dtype=float)
+        cambios = np.flatnonzero(y[1:] != y[:-1]) + 1
+        return [int(i) for i in np.concatenate((cambios - 1, cambios))]
+    # endif
+    seleccion = []
+    for i in range(1, len(valores)):
+        if valores[i] != valores[i - 1]:
+            seleccion.append(i - 1)
+            seleccion.append(i)
+        # endif
+    # endfor
+    return seleccion
+# endfunction
+
+
+def seleccionarIndices(columnas, n, max_puntos, binario=False, metodo="LTTB"):
+    # columnas: valores (float) de cada serie del grafico, todas de n filas.
+    # Devuelve los indices de las filas que se conservan, ordenados
+    if not max_puntos or n <= max_puntos:
+        return list(range(n))
+    # endif
+    num_series = max(1, len(columnas))
+    # El presupuesto de puntos se reparte entre las series del grafico
+    puntos = max(max_puntos // num_series, 4)
+    seleccion = {0, n - 1}
+    for valores in columnas:
+        # Maximo y minimo globales (primera aparicion)
+        seleccion.add(valores.index(max(valores)))
+        seleccion.add(valores.index(min(valores)))
+        if binario:
+            seleccion.update(flancos(valores))
+        elif metodo == "MINMAX":
+            seleccion.update(minMax(valores, puntos))
+        else:
+            seleccion.update(lttb(valores, puntos))
+        # endif
+    # endfor
+    return sorted(seleccion)
+# endfunction
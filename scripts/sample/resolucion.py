@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# --------------------------------------------------------------------------------
+#
+#   Planificador de la resolucion de las consultas. A partir del tamano del
+#   grafico del panel (P/M/G) y del rango de tiempo calcula cuantos puntos
+#   tiene sentido pedir y el intervalo de agregacion correspondiente, y ajusta
+#   la consulta para que Grafana devuelva ya los datos reducidos: fija
+#   maxDataPoints/intervalMs y reescribe $__interval, v.windowPeriod y el
+#   "every" de aggregateWindow. En los paneles binarios la agregacion usa el
+#   maximo de cada intervalo para no perder los cambios de estado cortos.
+#
+#   Autor: Marc Llobera Villalonga
+#
+# --------------------------------------------------------------------------------
+
+import re
+
+MS_SEGUNDO = 1000
+MS_MINUTO = 60*MS_SEGUNDO
+MS_HORA = 60*MS_MINUTO
+MS_DIA = 24*MS_HORA
+
+# Intervalos permitidos: todos dividen una hora o un dia exactos para que las
+# ventanas coincidan con las fronteras de los tramos y del almacen
+INTERVALOS = [10*MS_SEGUNDO, 15*MS_SEGUNDO, 30*MS_SEGUNDO, MS_MINUTO, 2*MS_MINUTO, 5*MS_MINUTO,
+              10*MS_MINUTO, 15*MS_MINUTO, 30*MS_MINUTO, MS_HORA, 2*MS_HORA, 3*MS_HORA,
+              6*MS_HORA, 12*MS_HORA, MS_DIA]
+
+UNIDADES = {"ms": 1, "s": MS_SEGUNDO, "m": MS_MINUTO,
+            "h": MS_HORA, "d": MS_DIA, "w": 7*MS_DIA}
+
+RE_DURACION = re.compile(r"(\d+)(ms|s|m|h|d|w)")
+RE_AGGREGATE_WINDOW = re.compile(r"(aggregateWindow\(\s*every:\s*)([^,)]+)")
+RE_FN_AGGREGATE_WINDOW = re.compile(
+    r"(aggregateWindow\([^)]*?\bfn:\s*)([A-Za-z_][\w.]*)")
+
+
+def duracionAMs(texto):
+    # "1h30m" -> 5400000; None si no es una duracion literal (p. ej. v.windowPeriod)
+    texto = texto.strip()
+    if not texto or RE_DURACION.sub("", texto) != "":
+        return None
+    # endif
+    return sum(int(n) * UNIDADES[u] for n, u in RE_DURACION.findall(texto))
+# endfunction
+
+
+def msADuracion(ms):
+    # 5400000 -> "90m" (la unidad mas grande que lo divide exacto)
+    for unidad in ("d", "h", "m", "s"):
+        if ms % UNIDADES[unidad] == 0:
+            return f"{ms // UNIDADES[unidad]}{unidad}"
+        # endif
+    # endfor
+    return f"{ms}ms"
+# endfunction
+
+
+def intervaloObjetivo(rango_ms, puntos):
+    # Menor intervalo permitido con el que el rango no supera los puntos pedidos
+    ideal = rango_ms / max(puntos, 1)
+    for intervalo in INTERVALOS:
+        if intervalo >= ideal:
+            return intervalo
+        # endif
+    # endfor
+    return INTERVALOS[-1] * -(-int(ideal) // INTERVALOS[-1])
+# endfunction
+
+
+def ajustarConsulta(query, rango_ms, puntos, binario=False):
+    # Ajusta una query (target del panel) para pedir como mucho unos "puntos"
+    # por serie en el rango dado. Modifica la query y devuelve el intervalo en ms
+    intervalo = intervaloObjetivo(rango_ms, puntos)
+    texto = query.get("query")
+    if isinstance(texto, str):
+        # Nunca pedir mas resolucion que la ventana original del panel
+        for m in RE_AGGREGATE_WINDOW.finditer(texto):
+            original = duracionAMs(m.group(2))
+            if original is not None and original > intervalo:
+                intervalo = original
+            # endif
+        # endfor
+        duracion = msADuracion(intervalo)
+        texto = RE_AGGREGATE_WINDOW.sub(
+            lambda m: m.group(1) + duracion, texto)
+        texto = texto.replace("v.windowPeriod", duracion)
+        texto = texto.replace("$__interval_ms", str(intervalo))
+        texto = texto.replace("$__interval", duracion)
+        if binario:
+            # Estados 0/1: el maximo conserva los estados activos de cada intervalo
+            texto = RE_FN_AGGREGATE_WINDOW.sub(
+                lambda m: m.group(1) + "max", texto)
+        # endif
+        query["query"] = texto
+    # endif
+    query["maxDataPoints"] = int(puntos)
+    query["intervalMs"] = intervalo
+    return intervalo
+# endfunction
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# --------------------------------------------------------------------------------
+#
+#   Resumenes de series que se calculan en una sola pasada y se pueden unir
+#   (por ejemplo los de varios dias) sin volver a leer los puntos:
+#
+#   - SketchCuantiles: percentiles aproximados con error relativo acotado
+#     (por defecto 1%). Cada valor se cuenta en un bloque logaritmico, asi
+#     que unir dos sketches es sumar sus contadores y el resultado es el mismo
+#     que si se hubiera calculado todo de una vez, en cualquier orden.
+#   - CicloTrabajo: contadores de las series binarias (tiempo en estado activo,
+#     cambios de estado y activaciones). Cada estado dura hasta el punto
+#     siguiente; al unir dos periodos consecutivos se cuenta tambien el tramo
+#     entre el ultimo punto del primero y el primer punto del segundo.
+#
+#   Los dos se guardan como diccionarios JSON (aDict/desdeDict) junto al
+#   almacen de series y a las tablas binarias del informe.
+#
+#   Autor: Marc Llobera Villalonga
+#
+# --------------------------------------------------------------------------------
+
+import heapq
+import math
+
+# Los valores con modulo menor que este cuentan como 0
+MINIMO_SKETCH = 1e-9
+
+
+class SketchCuantiles:
+    def __init__(self, precision=0.01):
+        self.precision = precision
+        self.gamma = (1 + precision) / (1 - precision)
+        self._log_gamma = math.log(self.gamma)
+        self.n = 0
+        self.suma = 0.0
+        self.minimo = None
+        self.maximo = None
+        self.ceros = 0
+        # Indice del bloque -> numero de valores (positivos y negativos)
+        self.positivos = {}
+        self.negativos = {}
+    # endfunction
+
+    def _bloque(self, v):
+        return math.ceil(math.log(v) / self._log_gamma)
+    # endfunction
+
+    def _valorBloque(self, k):
+        # Valor representativo del bloque (error relativo <= precision)
+        return 2 * self.gamma ** k / (self.gamma + 1)
+    # endfunction
+
+    def anadir(self, v, cuenta=1):
+        if v > MINIMO_SKETCH:
+            k = self._bloque(v)
+            self.positivos[k] = self.positivos.get(k, 0) + cuenta
+        elif v < -MINIMO_SKETCH:
+            k = self._bloque(-v)
+            self.negativos[k] = self.negativos.get(k, 0) + cuenta
+        else:
+            self.ceros += cuenta
+        # endif
+        if self.n == 0 or v < self.minimo:
+            self.minimo = v
+        # endif
+        if self.n == 0 or v > self.maximo:
+            self.maximo = v
+        # endif
+        self.n += cuenta
+        self.suma += v * cuenta
+    # endfunction
+
+    def unir(self, otro):
+        if otro.n == 0:
+            return self
+        # endif
+        for k, c in otro.positivos.items():
+            self.positivos[k] = self.positivos.get(k, 0) + c
+        # endfor
+        for k, c in otro.negativos.items():
+            self.negativos[k] = self.negativos.get(k, 0) + c
+        # endfor
+        self.ceros += otro.ceros
+        self.minimo = otro.minimo if self.n == 0 else min(self.minimo, otro.minimo)
+        self.maximo = otro.maximo if self.n == 0 else max(self.maximo, otro.maximo)
+        self.n += otro.n
+        self.suma += otro.suma
+        return self
+    # endfunction
+
+    @property
+    def media(self):
+        return self.suma / self.n if self.n else None
+    # endfunction
+
+    def cuantil(self, q):
+        # Valor aproximado del cuantil q (0..1); None si no hay datos
+        if self.n == 0:
+            return None
+        # endif
+        rango = q * (self.n - 1)
+        acumulado = 0
+        valor = None
+        for k in sorted(self.negativos, reverse=True):
+            acumulado += self.negativos[k]
+            if acumulado > rango:
+                valor = -self._valorBloque(k)
+                break
+            # endif
+        # endfor
+        if valor is None:
+            acumulado += self.ceros
+            if acumulado > rango:
+                valor = 0.0
+            # endif
+        # endif
+        if valor is None:
+            for k in sorted(self.positivos):
+                acumulado += self.positivos[k]
+                if acumulado > rango:
+                    valor = self._valorBloque(k)
+                    break
+                # endif
+            # endfor
+        # endif
+        if valor is None:
+            valor = self.maximo
+        # endif
+        return min(max(valor, self.minimo), self.maximo)
+    # endfunction
+
+    def aDict(self):
+        return {"precision": self.precision, "n": self.n, "suma": self.suma,
+                "minimo": self.minimo, "maximo": self.maximo, "ceros": self.ceros,
+                "positivos": {str(k): c for k, c in self.positivos.items()},
+                "negativos": {str(k): c for k, c in self.negativos.items()}}
+    # endfunction
+
+    @classmethod
+    def desdeDict(cls, datos):
+        sketch = cls(datos["precision"])
+        sketch.n = datos["n"]
+        sketch.suma = datos["suma"]
+        sketch.minimo = datos["minimo"]
+        sketch.maximo = datos["maximo"]
+        sketch.ceros = datos["ceros"]
+        sketch.positivos = {int(k): c for k, c in datos["positivos"].items()}
+        sketch.negativos = {int(k): c for k, c in datos["negativos"].items()}
+        return sketch
+    # endfunction
+# endclass
+
+
+class CicloTrabajo:
+    CAMPOS = ("n", "ms_activo", "ms_total", "cambios", "activaciones",
+              "t_primero", "e_primero", "t_ultimo", "e_ultimo")
+
+    def __init__(self):
+        self.n = 0
+        self.ms_activo = 0
+        self.ms_total = 0
+        self.cambios = 0
+        self.activaciones = 0
+        self.t_primero = self.e_primero = None
+        self.t_ultimo = self.e_ultimo = None
+    # endfunction
+
+    def anadir(self, t, v):
+        # Punto (tiempo en ms, valor) en orden de tiempo; activo si v != 0
+        estado = 1 if v else 0
+        if self.n == 0:
+            self.t_primero = t
+            self.e_primero = estado
+        else:
+            self._tramo(t, estado)
+        # endif
+        self.t_ultimo = t
+        self.e_ultimo = estado
+        self.n += 1
+    # endfunction
+
+    def _tramo(self, t, estado):
+        # Del ultimo punto guardado hasta un punto (t, estado) posterior
+        duracion = t - self.t_ultimo
+        self.ms_total += duracion
+        if self.e_ultimo:
+            self.ms_activo += duracion
+        # endif
+        if estado != self.e_ultimo:
+            self.cambios += 1
+            if estado:
+                self.activaciones += 1
+            # endif
+        # endif
+    # endfunction
+
+    def unir(self, otro):
+        # otro: periodo posterior a este
+        if otro.n == 0:
+            return self
+        # endif
+        if self.n == 0:
+            for campo in self.CAMPOS:
+                setattr(self, campo, getattr(otro, campo))
+            # endfor
+            return self
+        # endif
+        self._tramo(otro.t_primero, otro.e_primero)
+        self.ms_total += otro.ms_total
+        self.ms_activo += otro.ms_activo
+        self.cambios += otro.cambios
+        self.activaciones += otro.activaciones
+        self.t_ultimo = otro.t_ultimo
+        self.e_ultimo = otro.e_ultimo
+        self.n += otro.n
+        return self
+    # endfunction
+
+    @property
+    def porcentaje_activo(self):
+        return 100.0 * self.ms_activo / self.ms_total if self.ms_total else None
+    # endfunction
+
+    def aDict(self):
+        return {campo: getattr(self, campo) for campo in self.CAMPOS}
+    # endfunction
+
+    @classmethod
+    def desdeDict(cls, datos):
+        ciclo = cls()
+        for campo in cls.CAMPOS:
+            setattr(ciclo, campo, datos[campo])
+        # endfor
+        return ciclo
+    # endfunction
+# endclass
+
+
+class ResumenSerie:
+    def __init__(self, cuantiles=None, ciclo=None):
+        self.cuantiles = cuantiles if cuantiles is not None else SketchCuantiles()
+        self.ciclo = ciclo if ciclo is not None else CicloTrabajo()
+    # endfunction
+
+    def anadir(self, t, v):
+        self.cuantiles.anadir(v)
+        self.ciclo.anadir(t, v)
+    # endfunction
+
+    def unir(self, otro):
+        # otro: periodo posterior a este
+        self.cuantiles.unir(otro.cuantiles)
+        self.ciclo.unir(otro.ciclo)
+        return self
+    # endfunction
+
+    def aDict(self):
+        return {"cuantiles": self.cuantiles.aDict(), "ciclo": self.ciclo.aDict()}
+    # endfunction
+
+    @classmethod
+    def desdeDict(cls, datos):
+        return cls(SketchCuantiles.desdeDict(datos["cuantiles"]), CicloTrabajo.desdeDict(datos["ciclo"]))
+    # endfunction
+# endclass
+
+
+def resumirPuntos(puntos, resumen=None):
+    # Anade a un ResumenSerie los puntos (t, v) validos (sin None/NaN), en orden de tiempo
+    resumen = resumen if resumen is not None else ResumenSerie()
+    for t, v in puntos:
+        if v is not None and v == v:
+            resumen.anadir(int(t), v)
+        # endif
+    # endfor
+    return resumen
+# endfunction
+
+
+def resumirSeries(series):
+    # series: [(measurement, tiempos, valores)] -> {measurement: ResumenSerie}.
+    # Si un measurement se repite, sus puntos se recorren juntos en orden de tiempo
+    por_medida = {}
+    for medida, tiempos, valores in series:
+        por_medida.setdefault(medida, []).append(zip(tiempos, valores))
+    # endfor
+    resumenes = {}
+    for medida, partes in por_medida.items():
+        puntos = partes[0] if len(partes) == 1 else heapq.merge(
+            *partes, key=lambda punto: punto[0])
+        resumenes[medida] = resumirPuntos(puntos)
+    # endfor
+    return resumenes
+# endfunction
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# --------------------------------------------------------------------------------
+#
+#   Tabla de datos por columnas de un panel: un indice de tiempos (int64, en
+#   ms, un minuto por fila) ordenado de forma numerica y, por cada
+#   measurement, un array de enteros con su mascara de validez. Sustituye al
+#   diccionario de diccionarios indexado por fechas en texto, que ocupaba
+#   mucha mas memoria y ordenaba mal las filas al cambiar de mes.
+#
+#   Las series se combinan con un merge-join sobre los tiempos ya ordenados, y
+#   la hoja de datos, las estadisticas MAXMIN/TABLA y los graficos leen
+#   directamente de la tabla. Las estadisticas de cada measurement se acumulan
+#   al seleccionar las filas, en la misma pasada.
+#
+#   La tabla se puede guardar en un fichero binario (guardarBinario) con una
+#   cabecera fija y las columnas contiguas en little-endian: tiempos (int64),
+#   valores (int64) y mascaras (uint8). desdeBinario lo abre con mmap y las
+#   columnas son vistas sobre el fichero, sin copiar ni convertir nada, asi
+#   que regenerar un informe desde los datos guardados es casi inmediato y
+#   varios procesos comparten las mismas paginas. Los resumenes de las series
+#   (percentiles y ciclo de trabajo), si los hay, van en un JSON al lado.
+#
+#   Autor: Marc Llobera Villalonga
+#
+# --------------------------------------------------------------------------------
+
+import csv
+import heapq
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import datetime
+from minutos import MS_MINUTO, EPOCH, columnaPorMinuto, etiquetaMinuto
+from estadisticas import EstadisticasSerie
+from resumenes import ResumenSerie
+
+# Cabecera del fichero binario: marca, version, reservado, num. de
+# measurements, num. de filas, inicio y fin del rango consultado (ms)
+MAGICA_BINARIO = b"TBCL"
+VERSION_BINARIO = 1
+CABECERA_BINARIO = struct.Struct("<4sHHIQqq")
+
+
+def unirIndices(indices):
+    # Merge de varios indices de tiempos ordenados en uno solo sin repetidos
+    unido = array("q")
+    for t in heapq.merge(*indices):
+        if not unido or unido[-1] != t:
+            unido.append(t)
+        # endif
+    # endfor
+    return unido
+# endfunction
+
+
+def alinearColumna(indice, tiempos, valores):
+    # Merge-join de una columna (tiempos, valores) sobre el indice unido, que
+    # contiene todos sus tiempos. Devuelve (valores, validos) del tamano del indice
+    columna = array("q", bytes(8 * len(indice)))
+    validos = bytearray(len(indice))
+    i = 0
+    for t, v in zip(tiempos, valores):
+        while indice[i] != t:
+            i += 1
+        # endwhile
+        columna[i] = v
+        validos[i] = 1
+    # endfor
+    return columna, validos
+# endfunction
+
+
+class TablaColumnas:
+    def __init__(self, tiempos=None, medidas=None, valores=None, validos=None):
+        self.tiempos = tiempos if tiempos is not None else array("q")
+        self.medidas = medidas if medidas is not None else []
+        # Una columna y una mascara por measurement, en el orden de medidas
+        self.valores = valores if valores is not None else []
+        self.validos = validos if validos is not None else []
+        # (inicio, fin) en ms del rango del que salen los datos, si se conoce
+        self.rango = None
+        # {measurement: ResumenSerie} de los puntos originales del rango, si se calcularon
+        self.resumenes = None
+        self._estadisticas = None
+    # endfunction
+
+    def __len__(self):
+        return len(self.tiempos)
+    # endfunction
+
+    @classmethod
+    def desdeSeries(cls, series):
+        # series: [(measurement, tiempos en ms, valores)]. Cada serie se agrupa
+        # por minutos; si un measurement se repite, sus puntos se combinan y
+        # en el mismo minuto gana la ultima serie
+        columnas = {}
+        for medida, tiempos, valores in series:
+            minutos, enteros = columnaPorMinuto(tiempos, valores)
+            if medida in columnas:
+                anterior = dict(zip(*columnas[medida]))
+                anterior.update(zip(minutos, enteros))
+                minutos = array("q", sorted(anterior))
+                enteros = array("q", (anterior[m] for m in minutos))
+            # endif
+            columnas[medida] = (minutos, enteros)
+        # endfor
+        indice = unirIndices([minutos for minutos, _ in columnas.values()])
+        tabla = cls(array("q", (m * MS_MINUTO for m in indice)))
+        for medida, (minutos, enteros) in columnas.items():
+            valores, validos = alinearColumna(indice, minutos, enteros)
+            tabla.medidas.append(medida)
+            tabla.valores.append(valores)
+            tabla.validos.append(validos)
+        # endfor
+        return tabla
+    # endfunction
+
+    @classmethod
+    def desdeCSV(cls, ruta):
+        # Carga un CSV de datos guardado con escribirCSV
+        with open(ruta, mode="r", newline="", encoding="utf-8") as archivo_csv:
+            lector_csv = csv.reader(
+                archivo_csv, delimiter=";", quoting=csv.QUOTE_MINIMAL)
+            header = next(lector_csv)
+            series = [(medida, array("q"), []) for medida in header[1:]]
+            for row in lector_csv:
+                t = int((datetime.strptime(row[0], "%d-%m-%Y %H:%M") -
+                         EPOCH).total_seconds()) * 1000
+                for (_, tiempos, valores), valor in zip(series, row[1:]):
+                    if valor not in ["", " "]:
+                        tiempos.append(t)
+                        valores.append(int(valor))
+                    # endif
+                # endfor
+            # endfor
+        # endwith
+        return cls.desdeSeries(series)
+    # endfunction
+
+    @classmethod
+    def desdeBinario(cls, ruta):
+        # Abre un fichero guardado con guardarBinario. Las columnas son vistas
+        # (memoryview) sobre el mmap del fichero, que queda abierto mientras
+        # viva la tabla
+        with open(ruta, "rb") as archivo:
+            mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        # endwith
+        magica, version, _, num_medidas, n, inicio_ms, fin_ms = CABECERA_BINARIO.unpack_from(
+            mapa, 0)
+        if magica != MAGICA_BINARIO or version != VERSION_BINARIO:
+            mapa.close()
+            raise ValueError(f"{ruta} no es una tabla binaria valida")
+        # endif
+        vista = memoryview(mapa)
+        pos = CABECERA_BINARIO.size
+        medidas = []
+        for _ in range(num_medidas):
+            (longitud,) = struct.unpack_from("<H", mapa, pos)
+            medidas.append(bytes(vista[pos + 2:pos + 2 + longitud]).decode("utf-8"))
+            pos += 2 + longitud
+        # endfor
+        pos += -pos % 8
+
+        def columna(pos):
+            trozo = vista[pos:pos + 8 * n]
+            if sys.byteorder == "little":
+                return trozo.cast("q")
+            # endif
+            # En maquinas big-endian no se puede usar la vista tal cual
+            copia = array("q", bytes(trozo))
+            copia.byteswap()
+            return copia
+        # endfunction
+
+        tabla = cls(columna(pos), medidas)
+        pos += 8 * n
+        for _ in range(num_medidas):
+            tabla.valores.append(columna(pos))
+            pos += 8 * n
+        # endfor
+        for _ in range(num_medidas):
+            tabla.validos.append(vista[pos:pos + n])
+            pos += n
+        # endfor
+        tabla.rango = (inicio_ms, fin_ms)
+        tabla._mapa = mapa
+        if os.path.exists(ruta + ".resumenes.json"):
+            with open(ruta + ".resumenes.json", "r") as archivo:
+                tabla.resumenes = {medida: ResumenSerie.desdeDict(datos)
+                                   for medida, datos in json.load(archivo).items()}
+            # endwith
+        # endif
+        return tabla
+    # endfunction
+
+    def guardarBinario(self, ruta, rango=None):
+        # Escribe la tabla en formato binario (a un temporal y luego rename
+        # para que los lectores nunca vean un fichero a medias)
+        inicio_ms, fin_ms = rango or self.rango or (0, 0)
+        n = len(self.tiempos)
+        partes = [CABECERA_BINARIO.pack(MAGICA_BINARIO, VERSION_BINARIO, 0,
+                                        len(self.medidas), n, inicio_ms, fin_ms)]
+        for medida in self.medidas:
+            nombre = medida.encode("utf-8")
+            partes.append(struct.pack("<H", len(nombre)) + nombre)
+        # endfor
+        # Las columnas empiezan alineadas a 8 bytes
+        partes.append(bytes(-sum(len(p) for p in partes) % 8))
+        for columna in [self.tiempos] + list(self.valores):
+            columna = array("q", columna)
+            if sys.byteorder != "little":
+                columna.byteswap()
+            # endif
+            partes.append(columna.tobytes())
+        # endfor
+        for validos in self.validos:
+            partes.append(bytes(validos))
+        # endfor
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, "wb") as archivo:
+            archivo.writelines(partes)
+        # endwith
+        os.replace(temporal, ruta)
+        if self.resumenes is not None:
+            with open(temporal, "w") as archivo:
+                json.dump({medida: resumen.aDict()
+                           for medida, resumen in self.resumenes.items()}, archivo)
+            # endwith
+            os.replace(temporal, ruta + ".resumenes.json")
+        elif os.path.exists(ruta + ".resumenes.json"):
+            os.remove(ruta + ".resumenes.json")
+        # endif
+    # endfunction
+
+    def seleccionar(self, indices, estadisticas=False):
+        # Nueva tabla con solo las filas indicadas (en orden). Los indices se
+        # recorren una sola vez, asi que pueden venir de un generador. Con
+        # estadisticas=True se acumulan tambien las de la nueva tabla
+        tabla = TablaColumnas(array("q"), list(self.medidas), [array("q") for _ in self.valores],
+                              [bytearray() for _ in self.validos])
+        tabla.rango = self.rango
+        tabla.resumenes = self.resumenes
+        columnas = list(zip(self.valores, tabla.valores)) + list(zip(self.validos, tabla.validos))
+        if estadisticas:
+            tabla._estadisticas = [EstadisticasSerie() for _ in self.medidas]
+            acumular = list(zip(self.valores, self.validos, tabla._estadisticas))
+        else:
+            acumular = []
+        # endif
+        for i in indices:
+            t = self.tiempos[i]
+            tabla.tiempos.append(t)
+            for origen, destino in columnas:
+                destino.append(origen[i])
+            # endfor
+            for valores, validos, serie in acumular:
+                # Los huecos cuentan como 0, igual que en la hoja de datos
+                serie.anadir(t, valores[i] if validos[i] else 0)
+            # endfor
+        # endfor
+        return tabla
+    # endfunction
+
+    def etiqueta(self, i):
+        return etiquetaMinuto(self.tiempos[i] // MS_MINUTO)
+    # endfunction
+
+    def columnaNumerica(self, j):
+        # Valores tal y como se escriben en la hoja: los huecos como 0.0
+        return [float(v) if valido else 0.0 for v, valido in zip(self.valores[j], self.validos[j])]
+    # endfunction
+
+    def filasTexto(self):
+        # Filas como en el CSV: [fecha, valor o "", ...]
+        for i in range(len(self.tiempos)):
+            yield [self.etiqueta(i)] + [str(columna[i]) if validos[i] else ""
+                                        for columna, validos in zip(self.valores, self.validos)]
+        # endfor
+    # endfunction
+
+    def filasHoja(self):
+        # Filas para la hoja de datos: [fecha, float, ...]
+        for i in range(len(self.tiempos)):
+            yield [self.etiqueta(i)] + [float(columna[i]) if validos[i] else 0.0
+                                        for columna, validos in zip(self.valores, self.validos)]
+        # endfor
+    # endfunction
+
+    def filasSinHuecos(self):
+        # Genera en orden los indices de las filas con todos los valores
+        # presentes y distintos de 0, mas la fila anterior y la siguiente de
+        # cada una (evitarDatosVacios). Un solo recorrido con una ventana de
+        # tres filas (anterior, actual, siguiente): memoria constante
+        if not self.medidas:
+            yield from range(len(self.tiempos))
+            return
+        # endif
+        completas = map(all, zip(*self.valores, *self.validos))
+        anterior = False
+        actual = next(completas, None)
+        i = 0
+        while actual is not None:
+            siguiente = next(completas, None)
+            if anterior or actual or siguiente:
+                yield i
+            # endif
+            anterior, actual = actual, siguiente
+            i += 1
+        # endwhile
+    # endfunction
+
+    def estadisticas(self):
+        # EstadisticasSerie de cada measurement (en el orden de medidas). Si no
+        # se acumularon al crear la tabla se calculan una vez aqui
+        if self._estadisticas is None:
+            self._estadisticas = [EstadisticasSerie.desdeColumna(self.tiempos, valores, validos)
+                                  for valores, validos in zip(self.valores, self.validos)]
+        # endif
+        return self._estadisticas
+    # endfunction
+# endclass
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# --------------------------------------------------------------------------------
+#
+#   Division de rangos de tiempo largos en tramos alineados (por horas, dias o
+#   semanas) que se consultan en paralelo, y union de las respuestas de cada
+#   tramo en una sola respuesta ordenada y sin puntos repetidos en las fronteras.
+#   El tamano del tramo se adapta al tiempo de respuesta y al tamano de las
+#   respuestas observadas en cada datasource y se recuerda entre ejecuciones,
+#   pero nunca baja del intervalo de agregacion de la consulta (resolucion.py):
+#   un tramo menor cortaria ventanas de aggregateWindow en cada frontera.
+#
+#   Autor: Marc Llobera Villalonga
+#
+# --------------------------------------------------------------------------------
+
+import os
+import json
+import threading
+
+MS_HORA = 60*60*1000
+MS_DIA = 24*MS_HORA
+
+# Tamanos de tramo permitidos; todos son horas o dias exactos para que las
+# fronteras de los tramos coincidan con las ventanas de aggregateWindow
+ESCALONES = [MS_HORA, 2*MS_HORA, 6*MS_HORA, 12*MS_HORA, MS_DIA, 2*MS_DIA, 7*MS_DIA, 14*MS_DIA, 28*MS_DIA]
+
+
+def dividirRango(inicio, fin, tramo):
+    # Devuelve [(inicio, fin)] con fronteras interiores en multiplos de tramo
+    if tramo <= 0 or fin - inicio <= tramo:
+        return [(inicio, fin)]
+    # endif
+    tramos = []
+    actual = inicio
+    frontera = (inicio // tramo + 1) * tramo
+    while frontera < fin:
+        tramos.append((actual, frontera))
+        actual = frontera
+        frontera += tramo
+    # endwhile
+    tramos.append((actual, fin))
+    return tramos
+# endfunction
+
+
+def tramoAlineado(tramo, intervalo):
+    # Menor multiplo del intervalo de agregacion (ms) que no baja del tramo,
+    # para que las fronteras de los tramos caigan en fronteras de ventana
+    if tramo <= 0 or not intervalo or intervalo <= 0:
+        return tramo
+    # endif
+    return -(-tramo // intervalo) * intervalo
+# endfunction
+
+
+def _claveFrame(frame, repeticion):
+    # Identidad de una serie entre tramos: nombre, etiquetas de los campos y
+    # orden de aparicion (la query ejecutada cambia con el rango)
+    schema = frame.get("schema", {})
+    etiquetas = [campo.get("labels") for campo in schema.get("fields", [])]
+    return (schema.get("name"), json.dumps(etiquetas, sort_keys=True), repeticion)
+# endfunction
+
+
+def unirRespuestas(respuestas):
+    # Une las respuestas de /api/ds/query de tramos consecutivos (en orden)
+    if len(respuestas) == 1:
+        return respuestas[0]
+    # endif
+    union = {"results": {}}
+    frames_union = {}
+    for query_data in respuestas:
+        for ref_id, resultado in query_data.get("results", {}).items():
+            destino = union["results"].get(ref_id)
+            if destino is None:
+                destino = {k: v for k, v in resultado.items() if k != "frames"}
+                destino["frames"] = []
+                union["results"][ref_id] = destino
+            # endif
+            vistos = {}
+            for frame in resultado.get("frames", []):
+                base = _claveFrame(frame, 0)[:2]
+                vistos[base] = vistos.get(base, -1) + 1
+                clave = (ref_id,) + _claveFrame(frame, vistos[base])
+                values = frame.get("data", {}).get("values", [])
+                existente = frames_union.get(clave)
+                if existente is None:
+                    # El frame se reutiliza: cada respuesta se decodifica
+                    # una sola vez y nadie mas la modifica
+                    frames_union[clave] = frame
+                    destino["frames"].append(frame)
+                    continue
+                # endif
+                if not values or not values[0]:
+                    continue
+                # endif
+                valores_union = existente["data"]["values"]
+                # Saltar los puntos de la frontera que ya tiene el tramo anterior
+                inicio = 0
+                if valores_union[0]:
+                    ultimo = valores_union[0][-1]
+                    while inicio < len(values[0]) and values[0][inicio] <= ultimo:
+                        inicio += 1
+                    # endwhile
+                # endif
+                for columna, nuevos in zip(valores_union, values):
+                    columna.extend(nuevos[inicio:])
+                # endfor
+            # endfor
+        # endfor
+    # endfor
+    return union
+# endfunction
+
+
+class TamanoTramos:
+    def __init__(self, tramo_inicial, segundos_objetivo=10, bytes_objetivo=20*1024*1024, ruta=None, adaptativo=True):
+        self.tramo_inicial = tramo_inicial
+        self.segundos_objetivo = segundos_objetivo
+        self.bytes_objetivo = bytes_objetivo
+        self.adaptativo = adaptativo
+        self.ruta = ruta
+        self.lock = threading.Lock()
+        self.tramos = {}
+        # Datasources ya observados en esta ejecucion
+        self.observados = set()
+        if self.ruta not in [None, ""] and os.path.exists(self.ruta):
+            try:
+                with open(self.ruta, "r") as archivo:
+                    self.tramos = json.load(archivo)
+                # endwith
+            except (OSError, ValueError):
+                self.tramos = {}
+            # endtry
+        # endif
+    # endfunction
+
+    def tramo(self, datasource):
+        if not self.adaptativo:
+            return self.tramo_inicial
+        # endif
+        with self.lock:
+            return self.tramos.get(str(datasource), self.tramo_inicial)
+        # endwith
+    # endfunction
+
+    def observar(self, datasource, tramo, segundos, num_bytes):
+        # Ajusta el tramo del datasource para acercarse a los objetivos de tiempo
+        # y tamano de respuesta, usando el escalon alineado mas cercano por debajo
+        if not self.adaptativo or tramo <= 0:
+            return
+        # endif
+        factor = min(self.segundos_objetivo / max(segundos, 0.001),
+                     self.bytes_objetivo / max(num_bytes, 1))
+        ideal = tramo * factor
+        nuevo = ESCALONES[0]
+        for escalon in ESCALONES:
+            if escalon <= ideal:
+                nuevo = escalon
+            # endif
+        # endfor
+        with self.lock:
+            clave = str(datasource)
+            # La primera respuesta de la ejecucion fija el tramo; las siguientes
+            # solo pueden reducirlo
+            if clave not in self.observados or nuevo < self.tramos[clave]:
+                self.tramos[clave] = nuevo
+            # endif
+            self.observados.add(clave)
+        # endwith
+    # endfunction
+
+    def guardar(self):
+        if self.ruta in [None, ""] or not self.adaptativo:
+            return
+        # endif
+        with self.lock:
+            with open(self.ruta + ".tmp", "w") as archivo:
+                json.dump(self.tramos, archivo)
+            # endwith
+            os.replace(self.ruta + ".tmp", self.ruta)
+        # endwith
+    # endfunction
+# endclass
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# --------------------------------------------------------------------------------
+#
+#   Cola de trabajos de la API Flask. Cada peticion de informe se convierte en
+#   un trabajo con un id que se ejecuta en un pool de hilos de tamano fijo, de
+#   modo que la peticion HTTP responde al momento y el estado, el avance de
+#   cada etapa y el archivo generado se consultan despues por el id. Si hay
+#   demasiados trabajos esperando no se aceptan mas (ColaLlena) hasta que se
+#   libere sitio. Los trabajos terminados se olvidan pasado un tiempo.
+#
+#   Los trabajos pueden llevar una clave (el mismo informe): mientras uno con
+#   esa clave no ha terminado, las peticiones iguales reciben ese mismo trabajo
+#   en vez de generar otro igual en paralelo.
+#
+#   Autor: Marc Llobera Villalonga
+#
+# --------------------------------------------------------------------------------
+
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+EN_COLA = "en_cola"
+EN_CURSO = "en_curso"
+TERMINADO = "terminado"
+ERROR = "error"
+
+
+class ColaLlena(Exception):
+    pass
+# endclass
+
+
+class Trabajo:
+    def __init__(self, nombre, clave=None):
+        self.id = uuid.uuid4().hex
+        self.nombre = nombre
+        self.clave = clave
+        self.estado = EN_COLA
+        # etapa -> [hechos, total], en el orden en que empiezan
+        self.etapas = {}
+        self.etapa = None
+        self.archivo = None
+        self.error = None
+        self.creado = time.time()
+        self.inicio = None
+        self.fin = None
+        self._terminado = threading.Event()
+    # endfunction
+
+    def progreso(self, etapa, hechos, total):
+        # Se llama desde el hilo del trabajo al avanzar una etapa
+        self.etapa = etapa
+        self.etapas[etapa] = [hechos, total]
+    # endfunction
+
+    def esperar(self, timeout=None):
+        # True si el trabajo ha terminado (bien o con error) antes del timeout
+        return self._terminado.wait(timeout)
+    # endfunction
+
+    @property
+    def terminado(self):
+        return self._terminado.is_set()
+    # endfunction
+
+    def aDict(self):
+        return {"id": self.id, "nombre": self.nombre, "estado": self.estado, "etapa": self.etapa,
+                "etapas": {etapa: {"hechos": hechos, "total": total}
+                           for etapa, (hechos, total) in list(self.etapas.items())},
+                "error": self.error, "creado": self.creado, "inicio": self.inicio, "fin": self.fin}
+    # endfunction
+# endclass
+
+
+class ColaTrabajos:
+    def __init__(self, max_hilos=2, max_cola=10, retencion_s=3600):
+        # max_hilos: trabajos ejecutandose a la vez; max_cola: trabajos que
+        # pueden esperar su turno; retencion_s: segundos que se recuerda un
+        # trabajo terminado
+        self.max_hilos = max(1, max_hilos)
+        self.max_cola = max(0, max_cola)
+        self.retencion_s = retencion_s
+        self._pool = ThreadPoolExecutor(max_workers=self.max_hilos,
+                                        thread_name_prefix="informe")
+        self._trabajos = {}
+        # clave -> trabajo sin terminar con esa clave
+        self._en_vuelo = {}
+        self._lock = threading.Lock()
+    # endfunction
+
+    def enviar(self, nombre, funcion, clave=None):
+        # Crea un trabajo que ejecuta funcion(trabajo) y guarda lo que devuelva
+        # como archivo. Si ya hay uno sin terminar con la misma clave se
+        # devuelve ese. Lanza ColaLlena si todos los hilos estan ocupados y ya
+        # hay max_cola trabajos esperando
+        with self._lock:
+            self._purgar()
+            if clave is not None and clave in self._en_vuelo:
+                return self._en_vuelo[clave]
+            # endif
+            pendientes = sum(1 for trabajo in self._trabajos.values()
+                             if not trabajo.terminado)
+            if pendientes >= self.max_hilos + self.max_cola:
+                raise ColaLlena(
+                    f"Hay {pendientes} trabajos pendientes, no se aceptan mas")
+            # endif
+            trabajo = Trabajo(nombre, clave)
+            self._trabajos[trabajo.id] = trabajo
+            if clave is not None:
+                self._en_vuelo[clave] = trabajo
+            # endif
+        # endwith
+        self._pool.submit(self._ejecutar, trabajo, funcion)
+        return trabajo
+    # endfunction
+
+    def enVuelo(self, clave):
+        # Trabajo sin terminar con la clave (o None)
+        with self._lock:
+            return self._en_vuelo.get(clave)
+        # endwith
+    # endfunction
+
+    def registrarTerminado(self, nombre, archivo, clave=None):
+        # Registra como terminado un trabajo cuyo archivo ya existe (por
+        # ejemplo un informe de la cache) para consultarlo y descargarlo igual
+        trabajo = Trabajo(nombre, clave)
+        trabajo.estado = TERMINADO
+        trabajo.archivo = archivo
+        trabajo.inicio = trabajo.fin = trabajo.creado
+        trabajo._terminado.set()
+        with self._lock:
+            self._purgar()
+            self._trabajos[trabajo.id] = trabajo
+        # endwith
+        return trabajo
+    # endfunction
+
+    def obtener(self, id):
+        with self._lock:
+            return self._trabajos.get(id)
+        # endwith
+    # endfunction
+
+    def resumen(self):
+        with self._lock:
+            estados = [trabajo.estado for trabajo in self._trabajos.values()]
+        # endwith
+        return {estado: estados.count(estado) for estado in (EN_COLA, EN_CURSO, TERMINADO, ERROR)}
+    # endfunction
+
+    def _ejecutar(self, trabajo, funcion):
+        with self._lock:
+            trabajo.estado = EN_CURSO
+            trabajo.inicio = time.time()
+        # endwith
+        try:
+            archivo = funcion(trabajo)
+            estado, error = TERMINADO, None
+        except Exception as e:
+            traceback.print_exc()
+            archivo, estado, error = None, ERROR, f"{type(e).__name__}: {e}"
+        # endtry
+        with self._lock:
+            trabajo.archivo = archivo
+            trabajo.error = error
+            trabajo.estado = estado
+            trabajo.fin = time.time()
+            if self._en_vuelo.get(trabajo.clave) is trabajo:
+                del self._en_vuelo[trabajo.clave]
+            # endif
+        # endwith
+        trabajo._terminado.set()
+    # endfunction
+
+    def _purgar(self):
+        # Olvidar los trabajos terminados hace mas de retencion_s (con el lock)
+        limite = time.time() - self.retencion_s
+        for id in [id for id, trabajo in self._trabajos.items()
+                   if trabajo.fin is not None and trabajo.fin < limite]:
+            del self._trabajos[id]
+        # endfor
+    # endfunction
+# endclass
@@ -0,0 +1,11 @@
+import os
+import sys
+
+# Los modulos de los informes se importan por nombre desde su directorio,
+# como hace flaskserver.py con cada script
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directorio in (os.path.join(RAIZ, "scripts"), os.path.join(RAIZ, "scripts", "sample")):
+    if directorio not in sys.path:
+        sys.path.insert(0, directorio)
+    # endif
+# endfor
@@ -0,0 +1,88 @@
+import os
+import time
+
+from almacen import MS_DIA, AlmacenSeries, restarRangos, unirRangos
+
+AHORA = int(time.time() * 1000) // MS_DIA * MS_DIA
+HORA = 60 * 60 * 1000
+
+
+def series(inicio, fin, paso, valor):
+    tiempos = list(range(inicio + paso, fin + 1, paso))
+    return [("bomba", tiempos, [valor] * len(tiempos))]
+# endfunction
+
+
+def test_unir_y_restar_rangos():
+    assert unirRangos([[5, 8], [0, 2], [2, 4]]) == [[0, 4], [5, 8]]
+    assert restarRangos(0, 10, [[2, 4], [6, 12]]) == [(0, 2), (4, 6)]
+    assert restarRangos(0, 10, []) == [(0, 10)]
+    assert restarRangos(0, 10, [[-5, 20]]) == []
+# endfunction
+
+
+def test_huecos_solo_pide_lo_que_falta(tmp_path):
+    almacen = AlmacenSeries(str(tmp_path), solape_ms=HORA)
+    inicio, fin = AHORA - 10 * HORA, AHORA
+    assert almacen.huecos("uid", 1, "f", inicio, fin) == [(inicio, fin)]
+
+    almacen.anadir("uid", 1, "f", (inicio, fin - 4 * HORA),
+                   series(inicio, fin - 4 * HORA, HORA, 1.0))
+    # El hueco empieza una hora antes (solape) para refrescar el ultimo intervalo
+    assert almacen.huecos("uid", 1, "f", inicio, fin) == [
+        (fin - 5 * HORA, fin)]
+
+    almacen.anadir("uid", 1, "f", (fin - 5 * HORA, fin),
+                   series(fin - 5 * HORA, fin, HORA, 2.0))
+    assert almacen.huecos("uid", 1, "f", inicio, fin) == []
+
+    [(medida, tiempos, valores)] = almacen.leer("uid", 1, "f", inicio, fin)
+    assert medida == "bomba"
+    assert list(tiempos) == list(range(inicio + HORA, fin + 1, HORA))
+    # En el solape gana lo ultimo escrito
+    assert list(valores) == [1.0] * 5 + [2.0] * 5
+# endfunction
+
+
+def test_dos_firmas_del_mismo_panel_se_conservan(tmp_path):
+    almacen = AlmacenSeries(str(tmp_path))
+    inicio, fin = AHORA - 6 * HORA, AHORA
+    # El mismo panel consultado a dos resoluciones (por ejemplo tamanos P y M)
+    almacen.anadir("uid", 7, "firma_p", (inicio, fin),
+                   series(inicio, fin, 3 * HORA, 1.0))
+    almacen.anadir("uid", 7, "firma_m", (inicio, fin),
+                   series(inicio, fin, HORA, 0.0))
+
+    for firma, puntos, valor in (("firma_p", 2, 1.0), ("firma_m", 6, 0.0)):
+        assert almacen.huecos("uid", 7, firma, inicio, fin) == []
+        [(_, tiempos, valores)] = almacen.leer("uid", 7, firma, inicio, fin)
+        assert len(tiempos) == puntos
+        assert set(valores) == {valor}
+        resumen = almacen.resumen("uid", 7, firma, inicio, fin)["bomba"]
+        assert resumen.cuantiles.n == puntos
+        assert resumen.cuantiles.maximo == valor
+    # endfor
+
+    # Volver a escribir una consulta no borra la otra
+    almacen.anadir("uid", 7, "firma_p", (inicio, fin),
+                   series(inicio, fin, 3 * HORA, 1.0))
+    [(_, tiempos, _)] = almacen.leer("uid", 7, "firma_m", inicio, fin)
+    assert len(tiempos) == 6
+# endfunction
+
+
+def test_consultas_sin_actualizar_en_la_retencion_se_borran(tmp_path):
+    almacen = AlmacenSeries(str(tmp_path), retencion_dias=1)
+    inicio, fin = AHORA - 6 * HORA, AHORA
+    almacen.anadir("uid", 7, "vieja", (inicio, fin),
+                   series(inicio, fin, HORA, 1.0))
+    dir_vieja = almacen._dirPanel("uid", 7, "vieja")
+    indice = almacen._leerIndice(dir_vieja)
+    indice["actualizado"] = time.time() - 2 * 24 * 60 * 60
+    almacen._guardarIndice(dir_vieja, indice)
+
+    almacen.anadir("uid", 7, "nueva", (inicio, fin),
+                   series(inicio, fin, HORA, 1.0))
+    assert not os.path.exists(dir_vieja)
+    assert almacen.huecos("uid", 7, "nueva", inicio, fin) == []
+# endfunction
@@ -0,0 +1,85 @@
+import os
+
+import cache_consultas
+from cache_consultas import CacheConsultas, claveConsulta
+
+PAYLOAD = {"queries": [{"refId": "A", "query": "from(bucket: \"b\")", "maxDataPoints": 600}]}
+
+
+def respuesta(valor):
+    return {"results": {"A": {"status": 200, "frames": [
+        {"schema": {"refId": "A"}, "data": {"values": [[1, 2], [valor, None]]}}]}}}
+# endfunction
+
+
+def test_clave_estable_y_sensible_al_contenido():
+    desordenado = {"queries": [{"maxDataPoints": 600, "query": "from(bucket: \"b\")", "refId": "A"}]}
+    clave = claveConsulta("influx", PAYLOAD, (0, 1000))
+    assert clave == claveConsulta("influx", desordenado, [0, 1000])
+    assert clave != claveConsulta("influx", PAYLOAD, (0, 2000))
+    assert clave != claveConsulta("otro", PAYLOAD, (0, 1000))
+# endfunction
+
+
+def test_guardar_y_obtener(tmp_path):
+    cache = CacheConsultas(str(tmp_path), margen_reciente_ms=0)
+    cache.guardar("ab" * 32, respuesta(1.5), 0)
+    datos = cache.obtener("ab" * 32)
+    valores = datos["results"]["A"]["frames"][0]["data"]["values"]
+    assert list(valores[0]) == [1, 2] and valores[1][0] == 1.5 and valores[1][1] != valores[1][1]
+    assert cache.obtener("cd" * 32) is None
+    assert cache.resumen()["aciertos"] == 1 and cache.resumen()["fallos"] == 1
+# endfunction
+
+
+def test_expulsion_lru_hasta_el_90_por_ciento(tmp_path, monkeypatch):
+    # Misma fecha de guardado: todas las entradas ocupan lo mismo
+    monkeypatch.setattr(cache_consultas.time, "time", lambda: 1000000.0)
+    cache = CacheConsultas(str(tmp_path), margen_reciente_ms=0)
+    claves = [f"{i:02d}" * 32 for i in range(5)]
+    for i, clave in enumerate(claves):
+        cache.guardar(clave, respuesta(float(i)), 0)
+        # Ultimo uso en orden de guardado
+        os.utime(cache._ruta(clave), (100 + i, 100 + i))
+    # endfor
+    tamano = os.path.getsize(cache._ruta(claves[0]))
+    # La primera entrada se vuelve a usar y pasa a ser la mas reciente
+    assert cache.obtener(claves[0]) is not None
+
+    cache.max_bytes = tamano * 5.5
+    cache.guardar("99" * 32, respuesta(9.0), 0)
+    # Seis entradas en un limite de 5.5: se expulsan las menos usadas
+    # hasta no superar el 90% (4.95 entradas)
+    presentes = [clave for clave in claves + ["99" * 32] if os.path.exists(cache._ruta(clave))]
+    assert presentes == [claves[0], claves[3], claves[4], "99" * 32]
+    assert cache.bytes_totales <= cache.max_bytes * 0.9
+    assert cache.resumen()["expulsados"] == 2
+# endfunction
+
+
+def test_las_entradas_recientes_caducan(tmp_path, monkeypatch):
+    ahora = [1000000.0]
+    monkeypatch.setattr(cache_consultas.time, "time", lambda: ahora[0])
+    cache = CacheConsultas(str(tmp_path))
+    # Rango que termina ahora: puede estar incompleto
+    cache.guardar("aa" * 32, respuesta(1.0), ahora[0] * 1000)
+    # Rango antiguo: no caduca
+    cache.guardar("bb" * 32, respuesta(2.0), ahora[0] * 1000 - 3600 * 1000)
+    ahora[0] += 299
+    assert cache.obtener("aa" * 32) is not None
+    ahora[0] += 2
+    assert cache.obtener("aa" * 32) is None
+    assert cache.obtener("bb" * 32) is not None
+# endfunction
+
+
+def test_omitir_no_lee_pero_guarda(tmp_path):
+    cache = CacheConsultas(str(tmp_path), margen_reciente_ms=0)
+    cache.guardar("aa" * 32, respuesta(1.0), 0)
+    omitida = cache_consultas.obtenerCache(str(tmp_path), omitir=True)
+    assert omitida.obtener("aa" * 32) is None
+    omitida.guardar("bb" * 32, respuesta(2.0), 0)
+    assert os.path.exists(omitida._ruta("bb" * 32))
+    # La misma cache compartida vuelve a leer al quitar omitir
+    assert cache_consultas.obtenerCache(str(tmp_path), omitir=False).obtener("bb" * 32) is not None
+# endfunction
@@ -0,0 +1,80 @@
+import os
+import time
+
+from catalogo_informes import CatalogoInformes
+
+
+def nuevoCatalogo(directorio, **politicas):
+    # Sin hilo de limpieza: los tests llaman a limpiar() directamente
+    catalogo = CatalogoInformes(directorio, **politicas)
+    catalogo.limpiarEnSegundoPlano = lambda: None
+    return catalogo
+# endfunction
+
+
+def informe(directorio, nombre, tamano=100):
+    ruta = os.path.join(directorio, nombre, "informe.xlsx")
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(ruta, "wb") as archivo:
+        archivo.write(b"x" * tamano)
+    # endwith
+    return ruta
+# endfunction
+
+
+def registrar(catalogo, clave, dashboard, tamano=100):
+    ruta = informe(catalogo.directorio, clave, tamano)
+    catalogo.registrar(clave, ruta, dashboard, "2026-10-01T00:00:00Z", "2026-10-08T00:00:00Z")
+    # Fechas de creacion distintas y archivo no mas nuevo que su entrada
+    catalogo._informes[clave]["creado"] = time.time() + len(catalogo._informes)
+    os.utime(ruta, (0, 0))
+    return ruta
+# endfunction
+
+
+def test_se_conservan_los_ultimos_de_cada_dashboard(tmp_path):
+    catalogo = nuevoCatalogo(str(tmp_path), max_por_dashboard=2)
+    rutas = [registrar(catalogo, f"a{i}", "a") for i in range(3)]
+    registrar(catalogo, "b0", "b")
+    assert catalogo.limpiar() == 1
+    assert catalogo.obtener("a0") is None and not os.path.exists(rutas[0])
+    assert {clave for clave in ("a1", "a2", "b0") if catalogo.obtener(clave)} == {"a1", "a2", "b0"}
+# endfunction
+
+
+def test_tamano_total_y_catalogo_persistente(tmp_path):
+    catalogo = nuevoCatalogo(str(tmp_path), max_bytes=250)
+    for i in range(3):
+        registrar(catalogo, f"a{i}", "a")
+    # endfor
+    catalogo.limpiar()
+    assert catalogo.resumen()["bytes"] <= 250
+    assert catalogo.obtener("a0") is None and catalogo.obtener("a2") is not None
+    # El manifiesto se vuelve a leer al arrancar
+    otro = CatalogoInformes(str(tmp_path))
+    assert otro.obtener("a2")["dashboard"] == "a"
+    assert otro.resumen()["informes"] == 2
+# endfunction
+
+
+def test_no_se_borra_un_informe_regenerado_ni_uno_fuera_del_directorio(tmp_path):
+    catalogo = nuevoCatalogo(str(tmp_path / "cache"), retencion_s=1)
+    regenerado = registrar(catalogo, "a0", "a")
+    os.utime(regenerado, None)
+    catalogo._informes["a0"]["creado"] = time.time() - 10
+    fuera = informe(str(tmp_path), "fuera")
+    catalogo.registrar("f", fuera, "f", "", "")
+    catalogo._informes["f"]["creado"] = time.time() - 10
+    assert catalogo.limpiar() == 2
+    # Salen del catalogo pero sus archivos siguen en disco
+    assert os.path.exists(regenerado) and os.path.exists(fuera)
+# endfunction
+
+
+def test_un_archivo_borrado_sale_del_catalogo(tmp_path):
+    catalogo = nuevoCatalogo(str(tmp_path))
+    ruta = registrar(catalogo, "a0", "a")
+    os.remove(ruta)
+    assert catalogo.obtener("a0") is None
+    assert catalogo.resumen() == {"informes": 0, "bytes": 0, "expulsados": 0}
+# endfunction
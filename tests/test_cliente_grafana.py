@@ -0,0 +1,69 @@
+import threading
+
+from cliente_grafana import ClienteGrafana
+
+
+class RespuestaFalsa:
+    def __init__(self, contenido):
+        self.status_code = 200
+        self.headers = {}
+        self.content = contenido
+        self.raw = None
+    # endfunction
+
+    def iter_content(self, tamano):
+        yield self.content
+    # endfunction
+
+    def close(self):
+        pass
+    # endfunction
+# endclass
+
+
+class SesionFalsa:
+    def request(self, metodo, url, **kwargs):
+        return RespuestaFalsa(b"x" * 10)
+    # endfunction
+# endclass
+
+
+def clienteFalso():
+    cliente = ClienteGrafana("http://grafana", "clave")
+    cliente.sesion = SesionFalsa()
+    return cliente
+# endfunction
+
+
+def test_cada_ejecucion_cuenta_sus_peticiones():
+    cliente = clienteFalso()
+    primera = cliente.ejecucion()
+    segunda = cliente.ejecucion()
+    primera.get("/api/health")
+    segunda.get("/api/health")
+    respuesta = segunda.post("/api/ds/query", stream=True)
+    assert b"".join(segunda.trozos(respuesta)) == b"x" * 10
+
+    # Empezar otra ejecucion no borra las estadisticas de las que siguen en curso
+    cliente.ejecucion()
+    assert primera.resumen()["peticiones"] == 1
+    assert segunda.resumen()["peticiones"] == 2
+    assert segunda.resumen()["bytes"] == 20
+    assert cliente.resumen()["peticiones"] == 3
+# endfunction
+
+
+def test_las_estadisticas_no_crecen_con_las_peticiones():
+    cliente = clienteFalso()
+    ejecucion = cliente.ejecucion()
+    hilos = [threading.Thread(target=lambda: [ejecucion.get("/api/health") for _ in range(250)])
+             for _ in range(4)]
+    for hilo in hilos:
+        hilo.start()
+    # endfor
+    for hilo in hilos:
+        hilo.join()
+    # endfor
+    assert ejecucion.resumen()["peticiones"] == 1000
+    assert cliente.resumen()["bytes"] == 10000
+# endfunction
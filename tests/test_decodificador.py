@@ -0,0 +1,67 @@
+import json
+import math
+import random
+from array import array
+
+import pytest
+
+from decodificador import columnaAJson, decodificarRespuesta
+
+DOCUMENTO = {
+    "results": {
+        "A": {"status": 200, "frames": [
+            {"schema": {"name": 'x"{[\\ é', "meta": {"executedQueryString": 'r._measurement == "t\\"a") {'},
+                        "fields": [{"name": "Time"}, {"name": "v", "labels": {"a": "b}"}}]},
+             "data": {"values": [[1, 2, 3], [1.5, None, 3]]}},
+            {"schema": {"meta": {"executedQueryString": "q"}},
+             "data": {"values": [[4], [5]]}},
+        ]},
+        "B": {"status": 400, "error": "boom ]}", "frames": []},
+        "C": {"status": 200},
+    },
+    "extra": [{"a": 1}],
+}
+
+
+def trocear(datos, aleatorio):
+    cortes = sorted(aleatorio.sample(range(1, len(datos)), aleatorio.randint(0, 40)))
+    return [datos[i:j] for i, j in zip([0] + cortes, cortes + [len(datos)])]
+# endfunction
+
+
+@pytest.mark.parametrize("indentacion", [None, 2])
+def test_decodifica_igual_con_cualquier_division_en_trozos(indentacion):
+    datos = json.dumps(DOCUMENTO, indent=indentacion, ensure_ascii=False).encode("utf-8")
+    aleatorio = random.Random(indentacion)
+    for _ in range(200):
+        resultado = decodificarRespuesta(trocear(datos, aleatorio))
+        assert list(resultado["results"]) == ["A", "B", "C"]
+        primero, segundo = resultado["results"]["A"]["frames"]
+        # Las cadenas con comillas, llaves o caracteres multibyte partidos se conservan
+        assert primero["schema"] == DOCUMENTO["results"]["A"]["frames"][0]["schema"]
+        tiempos, valores = primero["data"]["values"]
+        assert isinstance(tiempos, array) and tiempos.typecode == "q"
+        assert list(tiempos) == [1, 2, 3]
+        assert valores[0] == 1.5 and math.isnan(valores[1]) and valores[2] == 3
+        assert list(segundo["data"]["values"][1]) == [5]
+        assert resultado["results"]["B"]["frames"] == []
+        assert resultado["results"]["B"]["status"] == 400
+        assert resultado["results"]["C"]["frames"] == []
+    # endfor
+# endfunction
+
+
+def test_el_resultado_vuelve_a_json_con_null():
+    datos = json.dumps(DOCUMENTO).encode("utf-8")
+    resultado = decodificarRespuesta([datos])
+    texto = json.dumps(resultado["results"]["A"]["frames"][0]["data"], default=columnaAJson)
+    assert json.loads(texto) == {"values": [[1, 2, 3], [1.5, None, 3]]}
+# endfunction
+
+
+def test_columnas_no_numericas_se_dejan_como_lista():
+    documento = {"results": {"A": {"frames": [
+        {"schema": {}, "data": {"values": [[1, 2], ["on", "off"]]}}]}}}
+    resultado = decodificarRespuesta([json.dumps(documento).encode("utf-8")])
+    assert resultado["results"]["A"]["frames"][0]["data"]["values"][1] == ["on", "off"]
+# endfunction
@@ -0,0 +1,78 @@
+import io
+import threading
+
+import pytest
+
+import flujo_respuesta
+from flujo_respuesta import ClienteDesconectado, FlujoTrozos
+
+
+@pytest.fixture(autouse=True)
+def trozosPequenos(monkeypatch):
+    monkeypatch.setattr(flujo_respuesta, "TAMANO_TROZO", 4)
+    monkeypatch.setattr(flujo_respuesta, "ESPERA_COLA", 0.01)
+# endfunction
+
+
+def test_trozos_de_tamano_fijo_y_copia():
+    copia = io.BytesIO()
+    flujo = FlujoTrozos(copia)
+    flujo.write(b"abcdef")
+    flujo.write(b"ghij")
+    flujo.terminar()
+    assert list(flujo.trozos()) == [b"abcd", b"efgh", b"ij"]
+    assert copia.getvalue() == b"abcdefghij" and flujo.bytes == 10
+    flujo.close()
+    assert copia.closed
+# endfunction
+
+
+def test_un_error_del_informe_corta_la_respuesta():
+    flujo = FlujoTrozos()
+    flujo.write(b"abcd")
+    flujo.terminar(ValueError("fallo"))
+    trozos = flujo.trozos()
+    assert next(trozos) == b"abcd"
+    with pytest.raises(ValueError):
+        next(trozos)
+    # endwith
+# endfunction
+
+
+def test_la_cola_limitada_frena_al_informe(monkeypatch):
+    monkeypatch.setattr(flujo_respuesta, "MAX_TROZOS_COLA", 2)
+    flujo = FlujoTrozos()
+    hilo = threading.Thread(target=lambda: (flujo.write(b"x" * 16), flujo.terminar()))
+    hilo.start()
+    hilo.join(0.2)
+    # Dos trozos en la cola y el tercero esperando a que el cliente lea
+    assert hilo.is_alive() and flujo._cola.qsize() == 2
+    assert b"".join(flujo.trozos()) == b"x" * 16
+    hilo.join()
+# endfunction
+
+
+def test_desconexion_sin_copia_interrumpe_el_informe():
+    flujo = FlujoTrozos()
+    flujo.write(b"abcd")
+    trozos = flujo.trozos()
+    next(trozos)
+    trozos.close()
+    with pytest.raises(ClienteDesconectado):
+        flujo.write(b"efgh")
+    # endwith
+    flujo.terminar()
+# endfunction
+
+
+def test_desconexion_con_copia_completa_la_copia():
+    copia = io.BytesIO()
+    flujo = FlujoTrozos(copia)
+    flujo.write(b"abcd")
+    trozos = flujo.trozos()
+    next(trozos)
+    trozos.close()
+    flujo.write(b"efghij")
+    flujo.terminar()
+    assert copia.getvalue() == b"abcdefghij"
+# endfunction
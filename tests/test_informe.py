@@ -0,0 +1,221 @@
+import json
+
+import pytest
+
+import config
+
+# La imagen del informe no existe en el entorno de los tests
+config.IMG = ""
+import informe  # noqa: E402
+from almacen import AlmacenSeries  # noqa: E402
+from planificador import PlanificadorConsultas  # noqa: E402
+
+INICIO = "2026-10-01T00:00:00Z"
+FIN = "2026-10-01T06:00:00Z"
+PANELES = {1: ["Temperatura", "L", "G", False, False, "", ""]}
+
+
+class RespuestaFalsa:
+    def __init__(self, status_code, cuerpo):
+        self.status_code = status_code
+        self.cuerpo = json.dumps(cuerpo).encode("utf-8")
+        self.bytes_leidos = len(self.cuerpo)
+    # endfunction
+# endclass
+
+
+class ClienteFalso:
+    # Grafana falso: responder(payload) -> (status, cuerpo JSON)
+    def __init__(self, responder):
+        self.responder = responder
+        self.posts = 0
+    # endfunction
+
+    def post(self, ruta, json=None, **kwargs):
+        self.posts += 1
+        return RespuestaFalsa(*self.responder(json))
+    # endfunction
+
+    def trozos(self, response):
+        yield response.cuerpo
+    # endfunction
+# endclass
+
+
+class DashboardsFalsos:
+    def obtener(self, dashboard_uid):
+        return {"uid": dashboard_uid}
+    # endfunction
+
+    def panel(self, dashboard_uid, panel_id):
+        return {"datasource": {"uid": "influx"},
+                "targets": [{"refId": "A", "query": 'from(bucket: "b") |> range(start: v.timeRangeStart, stop:v.timeRangeStop) |> filter(fn: (r) => r._measurement == "temp")'},
+                            {"refId": "B", "query": 'from(bucket: "b") |> range(start: v.timeRangeStart, stop:v.timeRangeStop) |> filter(fn: (r) => r._measurement == "hum")'}]}
+    # endfunction
+# endclass
+
+
+def frame(ref_id, medida, inicio_ms):
+    return {"schema": {"refId": ref_id, "meta": {"executedQueryString": f'r._measurement == "{medida}")'}},
+            "data": {"values": [[inicio_ms, inicio_ms + 60000], [1.0, 2.0]]}}
+# endfunction
+
+
+def correcta(payload):
+    inicio_ms = informe.isoAMs(INICIO)
+    return 200, {"results": {q["refId"]: {"status": 200, "frames": [frame(q["refId"], q["refId"], inicio_ms)]}
+                             for q in payload["queries"]}}
+# endfunction
+
+
+def erronea(payload):
+    return 400, {"results": {q["refId"]: {"status": 400, "error": "query timeout"}
+                             for q in payload["queries"]}}
+# endfunction
+
+
+def refIdFallido(payload):
+    status, cuerpo = correcta(payload)
+    cuerpo["results"]["B"] = {"status": 500, "error": "fallo parcial"}
+    return status, cuerpo
+# endfunction
+
+
+@pytest.fixture
+def ventana(monkeypatch):
+    monkeypatch.setattr(informe, "TIME_START", INICIO)
+    monkeypatch.setattr(informe, "TIME_FINISH", FIN)
+    monkeypatch.setattr(informe, "GRAFANA_AGRUPAR_CONSULTAS", False)
+# endfunction
+
+
+def consultar(cliente, almacen, tmp_path):
+    firmas = {}
+    trabajos = [(str(tmp_path), "dash", PANELES)]
+    datos = informe.obtenerDatosDashboards(trabajos, cliente, DashboardsFalsos(),
+                                           PlanificadorConsultas(2, 2), almacen, firmas=firmas)
+    return datos, firmas
+# endfunction
+
+
+@pytest.mark.parametrize("fallo", [erronea, refIdFallido])
+def test_una_respuesta_fallida_no_cubre_el_rango_del_almacen(ventana, tmp_path, fallo):
+    almacen = AlmacenSeries(str(tmp_path / "almacen"))
+    consultar(ClienteFalso(fallo), almacen, tmp_path)
+
+    # La siguiente ejecucion vuelve a pedir el rango y lo guarda
+    cliente = ClienteFalso(correcta)
+    _, firmas = consultar(cliente, almacen, tmp_path)
+    assert cliente.posts == 1
+    series = almacen.leer("dash", 1, firmas[(str(tmp_path), 1)],
+                          informe.isoAMs(INICIO), informe.isoAMs(FIN))
+    assert sorted(medida for medida, _, _ in series) == ["A", "B"]
+
+    # Y una vez cubierto ya no se pide
+    cliente = ClienteFalso(correcta)
+    consultar(cliente, almacen, tmp_path)
+    assert cliente.posts == 0
+# endfunction
+
+
+def test_respuesta_completa():
+    assert informe.respuestaCompleta(*correcta({"queries": [{"refId": "A"}]}))
+    assert not informe.respuestaCompleta(*erronea({"queries": [{"refId": "A"}]}))
+    assert not informe.respuestaCompleta(*refIdFallido({"queries": [{"refId": "A"}, {"refId": "B"}]}))
+    assert not informe.respuestaCompleta(200, None)
+# endfunction
+
+
+def test_sin_disco_no_escribe_archivos_intermedios(ventana, tmp_path, monkeypatch):
+    monkeypatch.setattr(informe, "GUARDAR_TABLAS", True)
+    monkeypatch.setattr(informe, "GUARDAR_CSV", True)
+    datos = {(str(tmp_path), 1): correcta({"queries": [{"refId": "A"}]})[1]}
+    monkeypatch.setattr(informe, "SIN_DISCO", True)
+    tablas = informe.excelDeDatos(str(tmp_path), PANELES, "dash", datos=datos)
+    assert len(tablas[1]) == 2 and list(tmp_path.iterdir()) == []
+
+    # Las hojas de datos se quedan en memoria en vez de en temporales
+    monkeypatch.setattr(informe, "HOJAS_DATOS_STREAMING", True)
+    hoja, _, _ = informe.nuevaHoja(informe.Workbook(), tablas[1], "Raw Data")
+    assert hoja.__class__.__name__ == "Worksheet"
+
+    monkeypatch.setattr(informe, "SIN_DISCO", False)
+    informe.excelDeDatos(str(tmp_path), PANELES, "dash", datos=datos)
+    assert sorted(p.suffix for p in tmp_path.iterdir()) == [".csv", ".tbl"]
+# endfunction
+
+
+def pendiente(data_dir, datasource, panel_id, consultas):
+    return {"data_dir": data_dir, "datasource": datasource, "panel_id": panel_id,
+            "payload": {"queries": [{"refId": ref, "query": f"{panel_id}.{ref}"} for ref in consultas]}}
+# endfunction
+
+
+def test_agrupar_consultas_por_dashboard_datasource_y_limite():
+    pendientes = [pendiente("d1", "influx", 1, "AB"), pendiente("d1", "influx", 2, "AB"),
+                  pendiente("d1", "otro", 3, "A"), pendiente("d2", "influx", 4, "A"),
+                  pendiente("d1", "influx", 5, "ABC")]
+    lotes = informe.agruparConsultas(pendientes, 4)
+    assert [[p["panel_id"] for p in lote] for lote in lotes] == [[1, 2], [3], [4], [5]]
+    # Un panel con mas consultas que el limite va solo, sin dividirse
+    lotes = informe.agruparConsultas([pendiente("d1", "influx", 1, "ABCDE")], 2)
+    assert [[p["panel_id"] for p in lote] for lote in lotes] == [[1]]
+# endfunction
+
+
+def test_combinar_y_repartir_lote():
+    lote = [pendiente("d1", "influx", 1, "AB"), pendiente("d1", "influx", 2, "A")]
+    payload, mapeo = informe.combinarLote(lote)
+    assert [q["refId"] for q in payload["queries"]] == ["P0_A", "P0_B", "P1_A"]
+    assert [q["query"] for q in payload["queries"]] == ["1.A", "1.B", "2.A"]
+    # Las queries originales no se modifican
+    assert lote[0]["payload"]["queries"][0]["refId"] == "A"
+
+    respuesta = {"results": {ref: {"status": 200, "frames": [{"schema": {"refId": ref}, "data": {"values": []}}]}
+                             for ref in ("P1_A", "P0_B", "P0_A", "X")}}
+    por_panel = informe.repartirLote(lote, mapeo, respuesta)
+    assert sorted(por_panel[0]["results"]) == ["A", "B"] and list(por_panel[1]["results"]) == ["A"]
+    assert por_panel[0]["results"]["B"] is respuesta["results"]["P0_B"]
+    assert por_panel[1]["results"]["A"]["frames"][0]["schema"]["refId"] == "A"
+
+    # Un lote de un solo panel se envia tal cual
+    solo = [pendiente("d1", "influx", 1, "AB")]
+    assert informe.combinarLote(solo) == (solo[0]["payload"], None)
+    assert informe.repartirLote(solo, None, respuesta) == [respuesta]
+# endfunction
+
+
+class DashboardsPorPanel(DashboardsFalsos):
+    # Cada panel consulta measurements propios: "<panel>_<refId>"
+    def panel(self, dashboard_uid, panel_id):
+        return {"datasource": {"uid": "influx"},
+                "targets": [{"refId": ref, "query": f'from(bucket: "b") |> range(start: v.timeRangeStart, stop:v.timeRangeStop) |> filter(fn: (r) => r._measurement == "{panel_id}_{ref}")'}
+                            for ref in "AB"]}
+    # endfunction
+# endclass
+
+
+def eco(payload):
+    # Grafana falso que devuelve, por refId, el measurement de su query
+    inicio_ms = informe.isoAMs(INICIO)
+    return 200, {"results": {q["refId"]: {"status": 200, "frames": [
+        frame(q["refId"], q["query"].split('r._measurement == "')[1].split('"')[0], inicio_ms)]}
+        for q in payload["queries"]}}
+# endfunction
+
+
+def test_consultas_agrupadas_vuelven_a_su_panel(ventana, tmp_path, monkeypatch):
+    monkeypatch.setattr(informe, "GRAFANA_AGRUPAR_CONSULTAS", True)
+    # Dos consultas por panel y como mucho cinco por lote: 2 + 2 y 2
+    monkeypatch.setattr(informe, "GRAFANA_MAX_CONSULTAS_LOTE", 5)
+    paneles = {i: ["Panel%d" % i, "L", "G", False, False, "", ""] for i in (1, 2, 3)}
+    cliente = ClienteFalso(eco)
+    datos = informe.obtenerDatosDashboards([(str(tmp_path), "dash", paneles)], cliente,
+                                           DashboardsPorPanel(), PlanificadorConsultas(2, 2))
+    assert cliente.posts == 2
+    for panel_id in paneles:
+        series = informe.seriesDeRespuesta(datos[(str(tmp_path), panel_id)])
+        assert sorted(medida for medida, _, _ in series) == [f"{panel_id}_A", f"{panel_id}_B"]
+        assert sorted(datos[(str(tmp_path), panel_id)]["results"]) == ["A", "B"]
+    # endfor
+# endfunction
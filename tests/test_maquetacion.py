@@ -0,0 +1,78 @@
+from openpyxl.utils.units import pixels_to_EMU
+
+import maquetacion
+from maquetacion import FILA_INICIAL, FILAS_GRANDE, FILAS_PEQUENO, planificarInforme
+
+DASHBOARDS = {
+    ("D1", "Uno"): {1: ["Temp", "L", "P", False, False, "", ""],
+                    2: ["Hum", "L", "P", False, False, "", ""],
+                    3: ["Pq", "L", "G", False, True, "TABLA", "Pq"]},
+    ("D2", "Dos"): {4: ["Bomba", "B", "M", True, False, "INFO", "Sin datos"]},
+}
+
+
+def fila(registro):
+    # Fila en la que empieza el grafico (a partir de su posicion en EMU)
+    return (registro["y"] - pixels_to_EMU(20 / 4)) // pixels_to_EMU(20)
+# endfunction
+
+
+def test_posiciones_de_los_paneles():
+    plan = planificarInforme(DASHBOARDS, {("D1", 3): 3})
+    assert [r["tipo"] for r in plan] == ["dashboard", "panel", "panel", "panel", "dashboard", "panel"]
+    titulo, temp, hum, pq, titulo2, bomba = plan
+    assert titulo["fila"] == FILA_INICIAL + 1
+    # Dos graficos pequenos seguidos van en la misma fila, izquierda y derecha
+    assert fila(temp) == fila(hum) == titulo["fila"] + 1
+    assert (temp["derecha"], hum["derecha"]) == (False, True)
+    assert hum["x"] > temp["x"] and temp["ancho"] == hum["ancho"] == pq["ancho"] / 2
+    # El grande va debajo y su tabla (titulos + 3 measurements) justo despues
+    assert fila(pq) == fila(temp) + FILAS_PEQUENO
+    assert pq["fila_extra"] == fila(pq) + FILAS_GRANDE + 1
+    assert titulo2["fila"] > pq["fila_extra"] + 3
+    assert bomba["fila_extra"] is not None and bomba["dashboard"] == ("D2", "Dos")
+# endfunction
+
+
+def test_las_filas_de_la_tabla_desplazan_lo_que_sigue():
+    corto = planificarInforme(DASHBOARDS, {("D1", 3): 1})
+    largo = planificarInforme(DASHBOARDS, {("D1", 3): 4})
+    assert largo[4]["fila"] - corto[4]["fila"] == 3
+    assert largo[:4] == corto[:4]
+# endfunction
+
+
+def test_los_graficos_no_se_solapan_y_saltan_de_pagina():
+    paneles = {i: ["Panel", "L", "G", False, False, "", ""] for i in range(12)}
+    plan = planificarInforme({("D", "Largo"): paneles}, {}, filas_pagina=48)
+    filas = [fila(registro) for registro in plan[1:]]
+    # Cada grafico empieza despues de acabar el anterior (mas las filas saltadas)
+    for anterior, registro, inicio in zip(filas, plan[2:], filas[1:]):
+        assert inicio == anterior + FILAS_GRANDE + registro["salto"]
+    # endfor
+    # Con 12 graficos grandes alguno tiene que bajar a la pagina siguiente
+    assert any(registro["salto"] > 0 for registro in plan[1:])
+# endfunction
+
+
+def test_el_plan_se_reutiliza_mientras_no_cambia_la_configuracion():
+    plan = planificarInforme(DASHBOARDS, {("D1", 3): 3})
+    assert planificarInforme(DASHBOARDS, {("D1", 3): 3}) is plan
+    assert planificarInforme(DASHBOARDS, {("D1", 3): 3}, filas_pagina=40) is not plan
+# endfunction
+
+
+def test_la_cache_de_planes_esta_limitada(monkeypatch):
+    monkeypatch.setattr(maquetacion, "MAX_PLANES", 3)
+    monkeypatch.setattr(maquetacion, "_planes", maquetacion.OrderedDict())
+    primero = planificarInforme(DASHBOARDS, {("D1", 3): 1})
+    for filas in range(2, 5):
+        planificarInforme(DASHBOARDS, {("D1", 3): filas})
+        # El primero se sigue usando y no sale
+        assert planificarInforme(DASHBOARDS, {("D1", 3): 1}) is primero
+    # endfor
+    assert len(maquetacion._planes) == 3
+    # El plan de 2 filas era el menos usado: se ha vuelto a calcular
+    assert planificarInforme(DASHBOARDS, {("D1", 3): 4}) is planificarInforme(DASHBOARDS, {("D1", 3): 4})
+    assert maquetacion.claveMaquetacion(DASHBOARDS, {("D1", 3): 2}, 18, 20, 48) not in maquetacion._planes
+# endfunction
@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+from planificador import PlanificadorConsultas
+
+
+class Contador:
+    # Consultas simultaneas en total y por datasource, y sus maximos
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.activas = {}
+        self.pico = {}
+        self.total = 0
+        self.pico_total = 0
+    # endfunction
+
+    def consulta(self, datasource, resultado, segundos):
+        with self.lock:
+            self.activas[datasource] = self.activas.get(datasource, 0) + 1
+            self.pico[datasource] = max(self.pico.get(datasource, 0), self.activas[datasource])
+            self.total += 1
+            self.pico_total = max(self.pico_total, self.total)
+        # endwith
+        time.sleep(segundos)
+        with self.lock:
+            self.activas[datasource] -= 1
+            self.total -= 1
+        # endwith
+        return resultado
+    # endfunction
+# endclass
+
+
+def test_resultados_en_el_orden_de_las_tareas():
+    contador = Contador()
+    # Las primeras tareas tardan mas: terminan despues que las ultimas
+    tareas = [("ds", contador.consulta, ("ds", i, 0.02 * (6 - i))) for i in range(6)]
+    assert PlanificadorConsultas(6, 6).ejecutar(tareas) == list(range(6))
+    assert PlanificadorConsultas().ejecutar([]) == []
+# endfunction
+
+
+def test_limites_global_y_por_datasource():
+    contador = Contador()
+    tareas = [(ds, contador.consulta, (ds, (ds, i), 0.02))
+              for i in range(8) for ds in ("lento", "rapido", "otro")]
+    avances = []
+    resultados = PlanificadorConsultas(4, 2).ejecutar(
+        tareas, lambda hechas, total: avances.append((hechas, total)))
+    assert resultados == [(ds, i) for i in range(8) for ds in ("lento", "rapido", "otro")]
+    assert max(contador.pico.values()) <= 2
+    assert 2 < contador.pico_total <= 4
+    assert avances == [(i, len(tareas)) for i in range(1, len(tareas) + 1)]
+# endfunction
+
+
+def test_un_datasource_lento_no_bloquea_a_los_demas():
+    contador = Contador()
+    tareas = [("lento", contador.consulta, ("lento", "l", 0.2)) for _ in range(3)]
+    tareas += [("rapido", contador.consulta, ("rapido", "r", 0.01)) for _ in range(6)]
+    inicio = time.perf_counter()
+    PlanificadorConsultas(4, 1).ejecutar(tareas)
+    # El lento va de uno en uno (0.6 s) y el rapido en paralelo con el
+    assert time.perf_counter() - inicio < 0.9
+    assert contador.pico == {"lento": 1, "rapido": 1}
+# endfunction
+
+
+def test_un_error_se_propaga():
+    def falla():
+        raise ValueError("consulta fallida")
+    # endfunction
+    with pytest.raises(ValueError):
+        PlanificadorConsultas(2, 2).ejecutar([("ds", falla, ()), ("ds", time.sleep, (0.01,))])
+    # endwith
+# endfunction
@@ -0,0 +1,72 @@
+import math
+import random
+
+import pytest
+
+from reduccion import flancos, lttb, minMax, seleccionarIndices
+
+
+def lttbReferencia(valores, puntos):
+    # LTTB tal y como se describe: bloques interiores de igual tamano y, en
+    # cada uno, el punto del triangulo de mayor area con el elegido antes y
+    # la media del bloque siguiente
+    n = len(valores)
+    tamano = (n - 2) / (puntos - 2)
+    limites = [(int(i * tamano) + 1, int((i + 1) * tamano) + 1) for i in range(puntos - 2)]
+    limites.append((n - 1, n))
+    seleccion = [0]
+    for (inicio, fin), (sig_inicio, sig_fin) in zip(limites, limites[1:]):
+        a = seleccion[-1]
+        mx = (sig_inicio + sig_fin - 1) / 2.0
+        my = sum(valores[sig_inicio:sig_fin]) / (sig_fin - sig_inicio)
+        areas = [abs((a - mx) * (valores[i] - valores[a]) - (a - i) * (my - valores[a]))
+                 for i in range(inicio, fin)]
+        seleccion.append(inicio + areas.index(max(areas)))
+    # endfor
+    return seleccion + [n - 1]
+# endfunction
+
+
+@pytest.mark.parametrize("semilla", range(20))
+def test_lttb_coincide_con_la_referencia(semilla):
+    aleatorio = random.Random(semilla)
+    n = aleatorio.randint(10, 2000)
+    valores = [math.sin(i / 30) * 10 + aleatorio.random() for i in range(n)]
+    puntos = aleatorio.randint(3, n - 1)
+    seleccion = lttb(valores, puntos)
+    assert seleccion == lttbReferencia(valores, puntos)
+    assert len(seleccion) == puntos
+# endfunction
+
+
+def test_lttb_con_pocos_puntos_devuelve_todo():
+    assert lttb([1.0, 2.0, 3.0], 10) == [0, 1, 2]
+    assert lttb([1.0, 2.0, 3.0, 4.0], 2) == [0, 1, 2, 3]
+# endfunction
+
+
+def test_min_max_de_cada_bloque():
+    valores = [0.0, 5.0, 1.0, 9.0, 2.0, 3.0, 7.0, 0.0, 4.0, 6.0]
+    seleccion = minMax(valores, 6)
+    assert seleccion[:2] == [0, len(valores) - 1]
+    # Tres bloques interiores, [1, 3), [3, 6) y [6, 9), con su minimo y su maximo
+    assert sorted(seleccion[2:]) == [1, 2, 3, 4, 6, 7]
+    assert len(seleccion) == 8
+# endfunction
+
+
+def test_flancos_marca_cada_cambio_de_estado():
+    assert sorted(flancos([0, 0, 1, 1, 1, 0, 0])) == [1, 2, 4, 5]
+    assert flancos([1, 1, 1]) == []
+# endfunction
+
+
+def test_seleccion_conserva_extremos_y_flancos():
+    valores = [0.0] * 500 + [1.0] * 500 + [0.0] * 500
+    valores[700] = 5.0
+    valores[1200] = -1.0
+    seleccion = seleccionarIndices([valores], len(valores), 20, binario=True)
+    assert {0, 499, 500, 999, 1000, 1499, 700, 1200} <= set(seleccion)
+    assert seleccion == sorted(seleccion)
+    assert seleccionarIndices([valores], len(valores), 0) == list(range(len(valores)))
+# endfunction
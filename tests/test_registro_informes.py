@@ -0,0 +1,86 @@
+import os
+import sys
+
+import pytest
+
+from registro_informes import RegistroInformes
+
+SCRIPT = '''import config
+import auxiliar_registro
+
+VALOR = config.VALOR
+
+
+def ventanaInforme(alineacion=0):
+    return ("inicio", "fin")
+
+
+def main(directorio=None):
+    return VALOR, auxiliar_registro.VERSION
+'''
+
+
+@pytest.fixture(autouse=True)
+def aislarImportaciones(monkeypatch):
+    # El registro cambia sys.path y carga modulos auxiliares
+    monkeypatch.setattr(sys, "path", list(sys.path))
+    yield
+    sys.modules.pop("auxiliar_registro", None)
+# endfunction
+
+
+def crearInforme(directorio, valor, version=1):
+    os.makedirs(directorio, exist_ok=True)
+    for nombre, contenido in (("informe.py", SCRIPT), ("config.py", f"VALOR = {valor!r}\n"),
+                              ("auxiliar_registro.py", f"VERSION = {version}\n")):
+        with open(os.path.join(directorio, nombre), "w") as archivo:
+            archivo.write(contenido)
+        # endwith
+    # endfor
+    return os.path.join(directorio, "informe.py")
+# endfunction
+
+
+def test_cada_informe_usa_su_config(tmp_path):
+    registro = RegistroInformes({"a": crearInforme(str(tmp_path / "a"), "uno"),
+                                 "b": crearInforme(str(tmp_path / "b"), "dos")})
+    registro.cargarTodos()
+    assert registro.obtener("a").generar(directorio="x") == ("uno", 1)
+    assert registro.obtener("b").generar(directorio="x", destino="ignorado") == ("dos", 1)
+    assert registro.obtener("c") is None
+    # Se cargan una sola vez y la config del proceso no cambia
+    assert registro.cargas == 2
+    assert getattr(sys.modules.get("config"), "VALOR", None) is None
+# endfunction
+
+
+def test_recarga_al_cambiar_la_config(tmp_path):
+    ruta = crearInforme(str(tmp_path / "a"), "uno")
+    registro = RegistroInformes({"a": ruta})
+    primero = registro.obtener("a")
+    assert registro.obtener("a") is primero
+
+    ruta_config = os.path.join(os.path.dirname(ruta), "config.py")
+    with open(ruta_config, "w") as archivo:
+        archivo.write("VALOR = 'nuevo'\n")
+    # endwith
+    estado = os.stat(ruta_config)
+    os.utime(ruta_config, ns=(estado.st_atime_ns, estado.st_mtime_ns + 10**9))
+    segundo = registro.obtener("a")
+    assert segundo is not primero and segundo.generar() == ("nuevo", 1)
+    assert registro.cargas == 2
+# endfunction
+
+
+def test_aviso_si_un_modulo_auxiliar_es_distinto(tmp_path):
+    registro = RegistroInformes({"a": crearInforme(str(tmp_path / "a"), "uno"),
+                                 "b": crearInforme(str(tmp_path / "b"), "dos", version=2),
+                                 "c": crearInforme(str(tmp_path / "c"), "tres")})
+    assert registro.obtener("a").auxiliares_distintos == []
+    # El auxiliar ya cargado es el de "a": "b" lo usa y se avisa
+    distinto = registro.obtener("b")
+    assert distinto.generar() == ("dos", 1)
+    assert [nombre for nombre, _ in distinto.auxiliares_distintos] == ["auxiliar_registro"]
+    # Una copia igual no es un aviso
+    assert registro.obtener("c").auxiliares_distintos == []
+# endfunction
@@ -0,0 +1,62 @@
+from resolucion import (MS_DIA, MS_HORA, MS_MINUTO, MS_SEGUNDO, ajustarConsulta, duracionAMs,
+                        intervaloObjetivo, msADuracion)
+
+FLUX = ('from(bucket: "b") |> range(start: v.timeRangeStart, stop: v.timeRangeStop)'
+        ' |> filter(fn: (r) => r._measurement == "bomba")'
+        ' |> aggregateWindow(every: 10s, fn: last, createEmpty: false)')
+
+
+def test_duraciones():
+    assert duracionAMs("1h30m") == 90 * MS_MINUTO
+    assert duracionAMs("250ms") == 250
+    assert duracionAMs("v.windowPeriod") is None
+    assert msADuracion(90 * MS_MINUTO) == "90m"
+    assert msADuracion(2 * MS_DIA) == "2d"
+    assert msADuracion(1500) == "1500ms"
+# endfunction
+
+
+def test_intervalo_objetivo_no_supera_los_puntos():
+    semana = 7 * MS_DIA
+    intervalo = intervaloObjetivo(semana, 1000)
+    assert intervalo == 15 * MS_MINUTO
+    assert semana / intervalo <= 1000
+    # Rangos muy largos: multiplos de un dia
+    assert intervaloObjetivo(3650 * MS_DIA, 100) == 37 * MS_DIA
+    assert intervaloObjetivo(MS_HORA, 10**6) == 10 * MS_SEGUNDO
+# endfunction
+
+
+def test_ajustar_consulta_reescribe_la_ventana():
+    query = {"refId": "A", "query": FLUX}
+    intervalo = ajustarConsulta(query, 7 * MS_DIA, 1000)
+    assert intervalo == 15 * MS_MINUTO
+    assert "aggregateWindow(every: 15m, fn: last" in query["query"]
+    assert query["maxDataPoints"] == 1000
+    assert query["intervalMs"] == 15 * MS_MINUTO
+# endfunction
+
+
+def test_ajustar_consulta_binaria_usa_el_maximo():
+    query = {"query": FLUX}
+    ajustarConsulta(query, 7 * MS_DIA, 1000, binario=True)
+    assert "aggregateWindow(every: 15m, fn: max" in query["query"]
+# endfunction
+
+
+def test_nunca_pide_mas_resolucion_que_el_panel():
+    query = {"query": FLUX.replace("every: 10s", "every: 1h")}
+    assert ajustarConsulta(query, MS_DIA, 1000) == MS_HORA
+    assert "every: 1h" in query["query"]
+# endfunction
+
+
+def test_variables_de_intervalo():
+    query = {"query": "SELECT mean(v) WHERE $timeFilter GROUP BY time($__interval) -- $__interval_ms / v.windowPeriod"}
+    ajustarConsulta(query, MS_DIA, 144)
+    assert query["query"] == "SELECT mean(v) WHERE $timeFilter GROUP BY time(10m) -- 600000 / 10m"
+    # Sin texto de consulta solo se fijan maxDataPoints e intervalMs
+    query = {"refId": "B"}
+    ajustarConsulta(query, MS_DIA, 144)
+    assert query == {"refId": "B", "maxDataPoints": 144, "intervalMs": 10 * MS_MINUTO}
+# endfunction
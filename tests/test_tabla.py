@@ -0,0 +1,101 @@
+import csv
+
+import pytest
+
+from minutos import MS_MINUTO
+from resumenes import resumirPuntos
+from tabla import TablaColumnas
+
+T0 = 1759276800000  # 2025-10-01 00:00 UTC
+
+
+def minutos(*indices):
+    return [T0 + i * MS_MINUTO for i in indices]
+# endfunction
+
+
+def tablaConHueco():
+    # "hum" no tiene dato en el minuto 2: la fila es un hueco
+    return TablaColumnas.desdeSeries([
+        ("temp", minutos(0, 1, 2, 3), [20, 22, 25, 21]),
+        ("hum", minutos(0, 1, 3), [45, 40, 50]),
+    ])
+# endfunction
+
+
+def test_las_estadisticas_cuentan_los_huecos_como_cero():
+    tabla = tablaConHueco()
+    filtrada = tabla.seleccionar(tabla.filasSinHuecos(), estadisticas=True)
+    # La fila del hueco esta junto a filas completas: se incluye en la hoja
+    assert len(filtrada) == 4
+    assert [fila[2] for fila in filtrada.filasHoja()] == [45.0, 40.0, 0.0, 50.0]
+    temp, hum = filtrada.estadisticas()
+    assert (hum.minimo, hum.t_minimo) == (0, T0 + 2 * MS_MINUTO)
+    assert (hum.maximo, hum.n) == (50, 4)
+    assert (temp.minimo, temp.maximo) == (20, 25)
+# endfunction
+
+
+def test_estadisticas_calculadas_despues_coinciden():
+    tabla = tablaConHueco()
+    acumuladas = tabla.seleccionar(tabla.filasSinHuecos(), estadisticas=True)
+    despues = tabla.seleccionar(tabla.filasSinHuecos())
+    for a, b in zip(acumuladas.estadisticas(), despues.estadisticas()):
+        assert (a.n, a.suma, a.minimo, a.t_minimo, a.maximo, a.t_maximo) == \
+            (b.n, b.suma, b.minimo, b.t_minimo, b.maximo, b.t_maximo)
+    # endfor
+# endfunction
+
+
+def contenido(tabla):
+    return (list(tabla.tiempos), tabla.medidas, [list(v) for v in tabla.valores],
+            [bytes(v) for v in tabla.validos])
+# endfunction
+
+
+def test_binario_ida_y_vuelta(tmp_path):
+    tabla = TablaColumnas.desdeSeries([
+        ("temp", minutos(0, 1, 2, 3), [20, -22, 2**40, 21]),
+        ("humedad relativa é", minutos(1, 3, 5), [45, 40, 50]),
+    ])
+    tabla.resumenes = {"temp": resumirPuntos(zip(minutos(0, 1), [20, 22]))}
+    ruta = str(tmp_path / "panel.tbl")
+    tabla.guardarBinario(ruta, (T0, T0 + 10 * MS_MINUTO))
+
+    leida = TablaColumnas.desdeBinario(ruta)
+    assert contenido(leida) == contenido(tabla)
+    assert leida.rango == (T0, T0 + 10 * MS_MINUTO)
+    assert leida.resumenes["temp"].aDict() == tabla.resumenes["temp"].aDict()
+    # La tabla leida se usa igual que la original
+    assert list(leida.filasHoja()) == list(tabla.filasHoja())
+    assert list(leida.filasSinHuecos()) == list(tabla.filasSinHuecos())
+# endfunction
+
+
+def test_binario_de_tabla_vacia(tmp_path):
+    ruta = str(tmp_path / "vacia.tbl")
+    TablaColumnas.desdeSeries([]).guardarBinario(ruta)
+    leida = TablaColumnas.desdeBinario(ruta)
+    assert len(leida) == 0 and leida.medidas == [] and leida.resumenes is None
+# endfunction
+
+
+def test_binario_invalido(tmp_path):
+    ruta = tmp_path / "otro.tbl"
+    ruta.write_bytes(b"no es una tabla" * 10)
+    with pytest.raises(ValueError):
+        TablaColumnas.desdeBinario(str(ruta))
+    # endwith
+# endfunction
+
+
+def test_csv_ida_y_vuelta(tmp_path):
+    tabla = tablaConHueco()
+    ruta = tmp_path / "panel.csv"
+    with open(ruta, "w", newline="", encoding="utf-8") as archivo:
+        escritor = csv.writer(archivo, delimiter=";")
+        escritor.writerow(["Time"] + tabla.medidas)
+        escritor.writerows(tabla.filasTexto())
+    # endwith
+    assert contenido(TablaColumnas.desdeCSV(str(ruta))) == contenido(tabla)
+# endfunction
@@ -0,0 +1,107 @@
+import threading
+
+import pytest
+
+from trabajos import EN_COLA, ERROR, TERMINADO, ColaLlena, ColaTrabajos
+
+
+def bloqueada(evento, resultado="informe.xlsx"):
+    # Funcion de trabajo que no termina hasta que se activa el evento
+    def funcion(trabajo):
+        trabajo.progreso("consultas", 0, 1)
+        evento.wait(5)
+        trabajo.progreso("consultas", 1, 1)
+        return resultado
+    # endfunction
+    return funcion
+# endfunction
+
+
+def test_el_trabajo_guarda_el_archivo_y_el_avance():
+    cola = ColaTrabajos(max_hilos=1, max_cola=0)
+    trabajo = cola.enviar("s", lambda trabajo: trabajo.progreso("informe", 3, 3) or "a.xlsx")
+    assert trabajo.esperar(5)
+    assert trabajo.estado == TERMINADO and trabajo.archivo == "a.xlsx"
+    assert trabajo.aDict()["etapas"] == {"informe": {"hechos": 3, "total": 3}}
+    assert cola.obtener(trabajo.id) is trabajo
+# endfunction
+
+
+def test_los_errores_quedan_en_el_trabajo():
+    cola = ColaTrabajos()
+
+    def falla(trabajo):
+        raise ValueError("sin datos")
+    # endfunction
+
+    trabajo = cola.enviar("s", falla)
+    assert trabajo.esperar(5)
+    assert trabajo.estado == ERROR and trabajo.error == "ValueError: sin datos"
+    assert trabajo.archivo is None
+# endfunction
+
+
+def test_con_la_cola_llena_no_se_aceptan_mas():
+    cola = ColaTrabajos(max_hilos=1, max_cola=1)
+    evento = threading.Event()
+    primero = cola.enviar("a", bloqueada(evento))
+    segundo = cola.enviar("b", bloqueada(evento))
+    assert segundo.estado == EN_COLA
+    with pytest.raises(ColaLlena):
+        cola.enviar("c", bloqueada(evento))
+    # endwith
+    evento.set()
+    assert primero.esperar(5) and segundo.esperar(5)
+    # Al terminar se libera sitio
+    assert cola.enviar("c", bloqueada(evento)).esperar(5)
+    assert cola.resumen()[TERMINADO] == 3
+# endfunction
+
+
+def test_los_terminados_se_olvidan_pasada_la_retencion():
+    cola = ColaTrabajos(retencion_s=-1)
+    viejo = cola.registrarTerminado("s", "a.xlsx")
+    assert viejo.estado == TERMINADO
+    cola.registrarTerminado("s", "b.xlsx")
+    assert cola.obtener(viejo.id) is None
+# endfunction
+
+
+def test_peticiones_iguales_comparten_el_trabajo():
+    cola = ColaTrabajos(max_hilos=1, max_cola=0)
+    evento = threading.Event()
+    llamadas = []
+
+    def funcion(trabajo):
+        llamadas.append(trabajo.id)
+        return bloqueada(evento)(trabajo)
+    # endfunction
+
+    primero = cola.enviar("s", funcion, clave="k")
+    # Misma clave: el mismo trabajo, aunque la cola este llena
+    assert cola.enviar("s", funcion, clave="k") is primero
+    assert cola.enVuelo("k") is primero
+    with pytest.raises(ColaLlena):
+        cola.enviar("s", funcion, clave="otra")
+    # endwith
+    evento.set()
+    assert primero.esperar(5)
+    assert llamadas == [primero.id]
+    # Terminado el trabajo, la clave vuelve a generar uno nuevo
+    assert cola.enVuelo("k") is None
+    segundo = cola.enviar("s", funcion, clave="k")
+    assert segundo is not primero and segundo.esperar(5)
+# endfunction
+
+
+def test_un_trabajo_con_error_libera_su_clave():
+    cola = ColaTrabajos()
+
+    def falla(trabajo):
+        raise RuntimeError("Grafana no responde")
+    # endfunction
+
+    trabajo = cola.enviar("s", falla, clave="k")
+    assert trabajo.esperar(5) and trabajo.estado == ERROR
+    assert cola.enVuelo("k") is None
+# endfunction
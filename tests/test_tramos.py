@@ -0,0 +1,101 @@
+from array import array
+
+from resolucion import ajustarConsulta
+from tramos import MS_DIA, MS_HORA, TamanoTramos, dividirRango, tramoAlineado, unirRespuestas
+
+
+def respuesta(*frames):
+    return {"results": {"A": {"status": 200, "frames": list(frames)}}}
+# endfunction
+
+
+def frame(nombre, tiempos, valores, etiquetas=None):
+    return {"schema": {"name": nombre, "fields": [{"name": "Time"}, {"name": "v", "labels": etiquetas}]},
+            "data": {"values": [array("q", tiempos), array("d", valores)]}}
+# endfunction
+
+
+def test_dividir_rango_alinea_las_fronteras_interiores():
+    inicio = 5 * MS_HORA + 123
+    fin = 2 * MS_DIA + 7 * MS_HORA
+    tramos = dividirRango(inicio, fin, MS_DIA)
+    assert tramos == [(inicio, MS_DIA), (MS_DIA, 2 * MS_DIA), (2 * MS_DIA, fin)]
+    # Sin huecos ni solapes entre tramos
+    assert all(a[1] == b[0] for a, b in zip(tramos, tramos[1:]))
+# endfunction
+
+
+def test_dividir_rango_corto_o_sin_tramo():
+    assert dividirRango(0, MS_HORA, MS_DIA) == [(0, MS_HORA)]
+    assert dividirRango(0, 10 * MS_DIA, 0) == [(0, 10 * MS_DIA)]
+    # Una frontera exacta en el fin no crea un tramo vacio
+    assert dividirRango(0, 2 * MS_DIA, MS_DIA) == [(0, MS_DIA), (MS_DIA, 2 * MS_DIA)]
+# endfunction
+
+
+def test_unir_respuestas_quita_los_puntos_repetidos_en_las_fronteras():
+    primera = respuesta(frame("temp", [1, 2, 3], [10, 20, 30]))
+    # El punto 3 es la frontera y vuelve a venir en el tramo siguiente
+    segunda = respuesta(frame("temp", [3, 4, 5], [31, 40, 50]))
+    tercera = respuesta(frame("temp", [6], [60]))
+    union = unirRespuestas([primera, segunda, tercera])
+    [unido] = union["results"]["A"]["frames"]
+    assert list(unido["data"]["values"][0]) == [1, 2, 3, 4, 5, 6]
+    # En la frontera se queda el valor del primer tramo
+    assert list(unido["data"]["values"][1]) == [10, 20, 30, 40, 50, 60]
+    assert union["results"]["A"]["status"] == 200
+# endfunction
+
+
+def test_unir_respuestas_separa_series_por_nombre_y_etiquetas():
+    primera = respuesta(frame("temp", [1], [1], {"sala": "a"}), frame("temp", [1], [2], {"sala": "b"}),
+                        frame("hum", [1], [3]))
+    segunda = respuesta(frame("hum", [2], [30]), frame("temp", [2], [20], {"sala": "b"}),
+                        frame("temp", [2], [10], {"sala": "a"}))
+    frames = unirRespuestas([primera, segunda])["results"]["A"]["frames"]
+    series = {(f["schema"]["name"], (f["schema"]["fields"][1]["labels"] or {}).get("sala")):
+              list(f["data"]["values"][1]) for f in frames}
+    assert series == {("temp", "a"): [1, 10], ("temp", "b"): [2, 20], ("hum", None): [3, 30]}
+# endfunction
+
+
+def test_unir_respuestas_con_tramos_vacios_o_series_nuevas():
+    primera = respuesta(frame("temp", [1, 2], [1, 2]))
+    vacia = respuesta(frame("temp", [], []))
+    nueva = {"results": {"A": {"frames": [frame("temp", [3], [3])]},
+                         "B": {"frames": [frame("bomba", [3], [1])]}}}
+    union = unirRespuestas([primera, vacia, nueva])
+    assert list(union["results"]["A"]["frames"][0]["data"]["values"][0]) == [1, 2, 3]
+    assert list(union["results"]["B"]["frames"][0]["data"]["values"][1]) == [1]
+    # Con una sola respuesta se devuelve tal cual
+    assert unirRespuestas([primera]) is primera
+# endfunction
+
+
+def test_el_tramo_no_parte_las_ventanas_de_agregacion():
+    # Un año a 600 puntos: resolucion.py agrega por dias
+    query = {"refId": "A", "query": 'from(bucket: "b") |> aggregateWindow(every: v.windowPeriod, fn: mean)'}
+    intervalo = ajustarConsulta(query, 365 * MS_DIA, 600)
+    assert intervalo == MS_DIA
+    # Respuestas lentas: el tramo adaptativo baja al escalon mas pequeno
+    tamanos = TamanoTramos(MS_DIA)
+    tamanos.observar("influx", MS_DIA, 1000, 1)
+    assert tamanos.tramo("influx") == MS_HORA
+
+    tramo = tramoAlineado(tamanos.tramo("influx"), query["intervalMs"])
+    assert tramo == MS_DIA
+    inicio = 3 * MS_HORA
+    tramos = dividirRango(inicio, inicio + 10 * MS_DIA, tramo)
+    # Cada frontera interior es una frontera de ventana de aggregateWindow
+    assert all(fin % intervalo == 0 for _, fin in tramos[:-1])
+    assert len(tramos) == 11
+# endfunction
+
+
+def test_tramo_alineado():
+    assert tramoAlineado(MS_HORA, 0) == MS_HORA
+    assert tramoAlineado(0, MS_DIA) == 0
+    assert tramoAlineado(2 * MS_HORA, 3 * MS_HORA) == 3 * MS_HORA
+    assert tramoAlineado(7 * MS_DIA, MS_DIA) == 7 * MS_DIA
+    assert tramoAlineado(2 * MS_DIA, 12 * MS_HORA) == 2 * MS_DIA
+# endfunction